@@ -1,10 +1,20 @@
-from typing import NewType, Sequence, Mapping, Optional, Dict, List, Tuple, Set, Union
+from typing import (NewType, Sequence, Mapping, Optional, Dict, List, Tuple, Set, Union, Iterable, Callable,
+                    TYPE_CHECKING)
 from numbers import Real
 from mypy_extensions import TypedDict
 import logging
 from fractions import Fraction
+from functools import reduce
+from math import gcd
 from abc import ABC, abstractmethod
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+import heapq
+import time
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .blocked import BlockedFloydWarshall
 
 SourceObject = NewType('SourceObject', str)
 TargetObject = NewType('TargetObject', str)
@@ -12,15 +22,31 @@ TargetObject = NewType('TargetObject', str)
 Switch = TypedDict('Switch', {'object': Optional[SourceObject], 'to': Optional[TargetObject]})
 Path = List[Switch]
 DiffPath = TypedDict('DiffPath', {'diff': float, 'path': Path})
-Differences = Dict[Tuple[Optional[TargetObject], Optional[TargetObject]], DiffPath]
 
 WeightedNode = TypedDict('WeightedNode', {'from': Optional[SourceObject],
                                           'to': Optional[TargetObject],
                                           'weight': float})
+Changes = TypedDict('Changes', {'weights': List[WeightedNode],
+                                'removed_weights': List[Tuple[Optional[SourceObject], Optional[TargetObject]]],
+                                'sources': Dict[Optional[SourceObject], int],
+                                'targets': Dict[Optional[TargetObject], int]},
+                    total=False)
 
 
 logger = logging.getLogger(__name__)
 
+# below DEBUG: logs every middle target of every Floyd-Warshall pass
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+
+
+def _lcm(a: int, b: int) -> int:
+    return a * b // gcd(a, b)
+
+
+def _to_python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
 
 class WeightedMap(ABC):
     '''
@@ -50,6 +76,14 @@ class WeightedMap(ABC):
     def add_weight(self, w: WeightedNode) -> None:
         '''adds the node to the map'''
 
+    @abstractmethod
+    def set_weight(self, w: WeightedNode) -> None:
+        '''sets the weight of (w['from'], w['to']), adding the node if it is not in the map'''
+
+    @abstractmethod
+    def remove_weight(self, source: Optional[SourceObject], target: Optional[TargetObject]) -> None:
+        '''removes (source, target) from the map, if it is there'''
+
 
 class ListWeightedMap(list, WeightedMap):
 
@@ -73,6 +107,16 @@ class ListWeightedMap(list, WeightedMap):
     def add_weight(self, w):
         self.append(w)
 
+    def set_weight(self, w):
+        for stw in self:
+            if stw['from'] == w['from'] and stw['to'] == w['to']:
+                stw['weight'] = w['weight']
+                return
+        self.append(w)
+
+    def remove_weight(self, source, target):
+        self[:] = [stw for stw in self if stw['from'] != source or stw['to'] != target]
+
     def total_weight(self):
         return sum(w['weight'] for w in self)
 
@@ -112,6 +156,12 @@ class DictWeightedMap(WeightedMap):
         self.targets.add(w['to'])
         self.weights[(w['from'], w['to'])] = w['weight']
 
+    def set_weight(self, w):
+        self.add_weight(w)
+
+    def remove_weight(self, source, target):
+        self.weights.pop((source, target), None)
+
     def total_weight(self):
         return sum(self.weights.values())
 
@@ -123,9 +173,268 @@ class DictWeightedMap(WeightedMap):
             self.weights[ft] = fun(w)
 
 
+class ArrayWeightedMap(WeightedMap):
+    '''Weighted map stored as compressed sparse rows.
+
+    Sources and targets are interned to integer ids. The targets of the source
+    with id `i` are `target_ids_array[offsets[i]:offsets[i + 1]]`, sorted, and their weights
+    are the same slice of `weights`. If a (source, target) pair is repeated,
+    the first weight is kept.
+    Nodes added or changed later are kept apart in `extra` and take precedence over
+    the arrays; removed nodes are kept there with weight None.
+    '''
+
+    def __init__(self, nodes: Sequence[WeightedNode]):
+        self._build([w['from'] for w in nodes], [w['to'] for w in nodes], [w['weight'] for w in nodes])
+
+    @classmethod
+    def from_arrays(cls, sources: Sequence, targets: Sequence, weights: Sequence) -> 'ArrayWeightedMap':
+        '''Builds the map from three parallel sequences, without building a WeightedNode per edge'''
+        wmap = cls.__new__(cls)
+        wmap._build(sources, targets, weights)
+        return wmap
+
+    @classmethod
+    def from_csr(cls, source_names: Sequence, target_names: Sequence,
+                 offsets: np.ndarray, target_ids: np.ndarray, weights: np.ndarray,
+                 files: Optional[Dict[str, str]] = None) -> 'ArrayWeightedMap':
+        '''Builds the map from its arrays, which are used without copying them.
+        `files` maps the name of the arrays that are memory mapped to their file,
+        so that pickled copies map the files again instead of copying the arrays.
+        '''
+        wmap = cls.__new__(cls)
+        wmap.source_names = list(source_names)
+        wmap.target_names = list(target_names)
+        wmap.source_ids = {s: i for i, s in enumerate(wmap.source_names)}
+        wmap.target_ids = {t: i for i, t in enumerate(wmap.target_names)}
+        wmap.extra = dict()
+        wmap.offsets = offsets
+        wmap.target_ids_array = target_ids
+        wmap.weights = weights
+        wmap.files = dict(files or {})
+        return wmap
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for name in self.files:
+            state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, filename in self.files.items():
+            setattr(self, name, np.load(filename, mmap_mode='r'))
+
+    def _build(self, sources, targets, weights) -> None:
+        self.source_names: List[Optional[SourceObject]] = []
+        self.target_names: List[Optional[TargetObject]] = []
+        self.source_ids: Dict[Optional[SourceObject], int] = dict()
+        self.target_ids: Dict[Optional[TargetObject], int] = dict()
+        self.extra: Dict[int, Dict[int, Optional[float]]] = dict()
+        self.files: Dict[str, str] = dict()
+
+        sids = np.fromiter((self._intern(self.source_ids, self.source_names, s) for s in sources),
+                           dtype=np.int64, count=len(sources))
+        tids = np.fromiter((self._intern(self.target_ids, self.target_names, t) for t in targets),
+                           dtype=np.int64, count=len(targets))
+        weights = np.asarray(weights) if len(weights) else np.zeros(0)
+        keys = sids * max(len(self.target_names), 1) + tids
+        _, first = np.unique(keys, return_index=True)
+
+        self.target_ids_array = tids[first]
+        self.weights = weights[first]
+        self.offsets = np.searchsorted(sids[first], np.arange(len(self.source_names) + 1))
+
+    @staticmethod
+    def _intern(ids, names, name) -> int:
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def _row(self, sid: int) -> Tuple[np.ndarray, np.ndarray]:
+        if sid + 1 >= len(self.offsets):
+            return self.target_ids_array[:0], self.weights[:0]
+        lo, hi = self.offsets[sid], self.offsets[sid + 1]
+        return self.target_ids_array[lo:hi], self.weights[lo:hi]
+
+    def _array_weight(self, sid: int, tid: int):
+        tids, weights = self._row(sid)
+        pos = np.searchsorted(tids, tid)
+        if pos < len(tids) and tids[pos] == tid:
+            return _to_python(weights[pos])
+        return None
+
+    def __getitem__(self, key):
+
+        if isinstance(key, str) or key is None:
+            sid = self.source_ids.get(key)
+            if sid is None:
+                return []
+            extra = self.extra.get(sid, {})
+            tids, weights = self._row(sid)
+            nodes = [{'from': key, 'to': self.target_names[tid], 'weight': w}
+                     for tid, w in zip(tids.tolist(), weights.tolist())
+                     if tid not in extra]
+            nodes.extend({'from': key, 'to': self.target_names[tid], 'weight': w}
+                         for tid, w in extra.items() if w is not None)
+            return nodes
+
+        elif isinstance(key, tuple):
+            source, target = key
+            sid, tid = self.source_ids.get(source), self.target_ids.get(target)
+            if sid is None or tid is None:
+                return None
+            if tid in self.extra.get(sid, {}):
+                return self.extra[sid][tid]
+            return self._array_weight(sid, tid)
+
+        raise KeyError(f"Can't get item, argument must be str, None or tuple. Got {key}")
+
+    def add_weight(self, w):
+        sid = self._intern(self.source_ids, self.source_names, w['from'])
+        tid = self._intern(self.target_ids, self.target_names, w['to'])
+        self.extra.setdefault(sid, {})[tid] = w['weight']
+
+    def set_weight(self, w):
+        self.add_weight(w)
+
+    def remove_weight(self, source, target):
+        sid, tid = self.source_ids.get(source), self.target_ids.get(target)
+        if sid is not None and tid is not None:
+            self.extra.setdefault(sid, {})[tid] = None
+
+    def total_weight(self):
+        total = _to_python(self.weights.sum()) if len(self.weights) else 0
+        for sid, extra in self.extra.items():
+            for tid, w in extra.items():
+                overridden = self._array_weight(sid, tid)
+                total += (w or 0) - (overridden or 0)
+        return total
+
+    def get_sources(self):
+        return set(self.source_names)
+
+    def apply(self, fun):
+        weights = [fun(w) for w in self.weights.tolist()]
+        # integers out of the int64 range would be silently converted to floats
+        big = any(isinstance(w, int) and not -2 ** 63 <= w < 2 ** 63 for w in weights)
+        self.weights = np.array(weights, dtype=object if big else None)
+        self.files.pop('weights', None)
+        for extra in self.extra.values():
+            for tid, w in extra.items():
+                if w is not None:
+                    extra[tid] = fun(w)
+
+
+class LazyWeightedMap(WeightedMap):
+    '''Weighted map computing its weights on demand.
+
+    `candidates(source)` returns the acceptable targets of `source`, and
+    `weight(source, target)` the weight of one of them. Weights are computed on
+    first access and kept in a least recently used cache of `maxsize` entries
+    (unbounded if None); `hits` and `misses` count the cache lookups.
+    Functions given to `apply` are applied to the computed weights, in order.
+    Nodes added or changed later, like the None weights of an Allocator, are kept
+    apart in `extra` and take precedence; removed nodes are kept there with weight None.
+
+    An Allocator computes its sentinel weights from `total_weight`, which reads every
+    weight unless an upper bound `total` of the sum of the computed weights is given.
+    Then a solve computes each weight once, in a single pass over the weights and when
+    it reads the rows of the sources. A solve keeps the rows it reads, so `maxsize`
+    does not bound the memory of a solve: it only bounds what the map keeps between
+    solves, at the cost of computing again the weights it evicted.
+    '''
+
+    def __init__(self, sources: Iterable[SourceObject],
+                 candidates: Callable[[SourceObject], Iterable[TargetObject]],
+                 weight: Callable[[SourceObject, TargetObject], float],
+                 maxsize: Optional[int] = None, total: Optional[float] = None):
+        self.sources: Set[Optional[SourceObject]] = set(sources)
+        self.candidates = candidates
+        self.weight = weight
+        self.maxsize = maxsize
+        self.total = total
+        self.functions: List[Callable] = []
+        self.extra: Dict[Optional[SourceObject], Dict[Optional[TargetObject], Optional[float]]] = dict()
+        self.cache: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._candidates: Dict[Optional[SourceObject], Dict[TargetObject, None]] = dict()
+
+    def _targets(self, source) -> Dict[TargetObject, None]:
+        if source not in self.sources:
+            return {}
+        if source not in self._candidates:
+            self._candidates[source] = dict.fromkeys(self.candidates(source))
+        return self._candidates[source]
+
+    def _weight(self, source, target):
+        key = (source, target)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        w = self.weight(source, target)
+        for fun in self.functions:
+            w = fun(w)
+        self.cache[key] = w
+        if self.maxsize is not None and len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return w
+
+    def __getitem__(self, key):
+
+        if isinstance(key, str) or key is None:
+            extra = self.extra.get(key, {})
+            nodes = [{'from': key, 'to': t, 'weight': self._weight(key, t)}
+                     for t in self._targets(key) if t not in extra]
+            nodes.extend({'from': key, 'to': t, 'weight': w} for t, w in extra.items() if w is not None)
+            return nodes
+
+        elif isinstance(key, tuple):
+            source, target = key
+            if target in self.extra.get(source, {}):
+                return self.extra[source][target]
+            if target in self._targets(source):
+                return self._weight(source, target)
+            return None
+
+        raise KeyError(f"Can't get item, argument must be str, None or tuple. Got {key}")
+
+    def add_weight(self, w):
+        self.extra.setdefault(w['from'], {})[w['to']] = w['weight']
+
+    def set_weight(self, w):
+        self.add_weight(w)
+
+    def remove_weight(self, source, target):
+        self.extra.setdefault(source, {})[target] = None
+
+    def total_weight(self):
+        if self.total is None:
+            return sum(stw['weight'] for s in self.get_sources() for stw in self[s])
+        return self.total + sum(w for extra in self.extra.values() for w in extra.values() if w is not None)
+
+    def get_sources(self):
+        return self.sources | set(self.extra)
+
+    def apply(self, fun):
+        self.functions.append(fun)
+        if self.total is not None:
+            self.total = fun(self.total)
+        for key, w in self.cache.items():
+            self.cache[key] = fun(w)
+        for extra in self.extra.values():
+            for t, w in extra.items():
+                if w is not None:
+                    extra[t] = fun(w)
+
+
 class Source:
 
-    def __init__(self, wmap: WeightedMap, instances: Mapping[Optional[SourceObject], int]):
+    def __init__(self, wmap: WeightedMap, instances: Dict[Optional[SourceObject], int]):
         self.collection = wmap.get_sources()
         self.wmap = wmap
         self.instances = instances
@@ -136,19 +445,18 @@ class Source:
             return self.instances[s]
 
         elif isinstance(s, tuple) and len(s) == 2:
-            records = [r for r in self.wmap if r['from'] == s[0] and r['to'] == s[1]]
-            if not records:
-                return None
             # TODO: what if more than one record? Sanitize input
-            return records[0]['weight']
+            return self.wmap[s]
 
     def get_weight(self, allocation) -> float:
+        if isinstance(allocation, Allocation):
+            return sum(self[s, t] * count for s, t, count in allocation.pairs())
         return sum(self[s, t] for s, t in allocation)
 
 
 class Target:
 
-    def __init__(self, capacities: Mapping[Optional[TargetObject], int]):
+    def __init__(self, capacities: Dict[Optional[TargetObject], int]):
         self.collection = capacities.keys()
         self.capacities = capacities
 
@@ -156,10 +464,85 @@ class Target:
         return self.capacities[t]
 
 
-class Allocation(list):
+class Allocation:
+    '''Multiset of (source, target) pairs, indexed both by source and by target.
+
+    It iterates like the list of its pairs, where each pair is repeated as many
+    times as it was added, and `allocation[source]` is the set of targets of `source`.
+    '''
+
+    def __init__(self, pairs: Iterable[Tuple[Optional[SourceObject], Optional[TargetObject]]] = ()):
+        self.by_source: Dict[Optional[SourceObject], Counter] = dict()
+        self.by_target: Dict[Optional[TargetObject], Counter] = dict()
+        self._real = 0
+        self.extend(pairs)
+
+    def add(self, source: Optional[SourceObject], target: Optional[TargetObject], count: int = 1) -> None:
+        if count <= 0:
+            return
+        self.by_source.setdefault(source, Counter())[target] += count
+        self.by_target.setdefault(target, Counter())[source] += count
+        if source is not None and target is not None:
+            self._real += count
+
+    def remove(self, source: Optional[SourceObject], target: Optional[TargetObject], count: int = 1) -> None:
+        if self.count(source, target) < count:
+            raise ValueError(f'({source}, {target}) is not allocated {count} times')
+        self._discard(self.by_source, source, target, count)
+        self._discard(self.by_target, target, source, count)
+        if source is not None and target is not None:
+            self._real -= count
+
+    @staticmethod
+    def _discard(index: Dict, key, value, count: int) -> None:
+        index[key][value] -= count
+        if not index[key][value]:
+            del index[key][value]
+            if not index[key]:
+                del index[key]
+
+    def move(self, obj: Optional[SourceObject], frm: Optional[TargetObject], to: Optional[TargetObject]) -> None:
+        '''Moves one instance of `obj` from `frm` to `to`'''
+        self.remove(obj, frm)
+        self.add(obj, to)
+
+    def count(self, source: Optional[SourceObject], target: Optional[TargetObject]) -> int:
+        targets = self.by_source.get(source)
+        return targets[target] if targets else 0
+
+    def at(self, target: Optional[TargetObject]) -> Counter:
+        '''Returns the sources allocated to `target`, with their multiplicities'''
+        sources = self.by_target.get(target)
+        return sources if sources is not None else Counter()
+
+    def pairs(self) -> Iterable[Tuple[Optional[SourceObject], Optional[TargetObject], int]]:
+        '''Yields each distinct (source, target) pair with its multiplicity'''
+        for source, targets in self.by_source.items():
+            for target, count in targets.items():
+                yield source, target, count
+
+    def append(self, pair: Tuple[Optional[SourceObject], Optional[TargetObject]]) -> None:
+        self.add(*pair)
+
+    def extend(self, pairs: Iterable[Tuple[Optional[SourceObject], Optional[TargetObject]]]) -> None:
+        for source, target in pairs:
+            self.add(source, target)
+
+    def __iter__(self):
+        for source, target, count in self.pairs():
+            for _ in range(count):
+                yield source, target
+
+    def __contains__(self, pair) -> bool:
+        return self.count(*pair) > 0
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Allocation):
+            return NotImplemented
+        return self.by_source == other.by_source
 
     def __getitem__(self, i):
-        result = {a[1] for a in self if a[0] == i}
+        result = set(self.by_source.get(i, ()))
         if not result:
             raise KeyError(f'No {i} in source')
         return result
@@ -168,12 +551,216 @@ class Allocation(list):
         return ', '.join([f'{f} -> {t}' for f, t in self._really_allocated()])
 
     def _really_allocated(self):
-        return [a for a in self if a[0] is not None and a[1] is not None]
+        return [(s, t) for s, t, _ in self.pairs() if s is not None and t is not None]
 
     def __len__(self):
         '''Returns the number of "real" allocations.'''
 
-        return len(self._really_allocated())
+        return self._real
+
+
+class DifferenceMatrix:
+    '''Dense matrix of first differences between targets.
+
+    `diff[i, j]` is the lowest change in weight obtained by moving one object
+    allocated to `targets[i]` to `targets[j]`, and `objects[i, j]` is that object.
+    '''
+
+    def __init__(self, targets: Sequence[Optional[TargetObject]], dtype=float):
+        self.targets = list(targets)
+        self.index = {t: i for i, t in enumerate(self.targets)}
+        self.diff = np.full((len(self.targets),) * 2, float('inf'), dtype=dtype)
+        self.objects = np.full((len(self.targets),) * 2, None, dtype=object)
+
+    def update(self, target_0, target, obj, diff) -> None:
+        '''Keeps the move of `obj` from `target_0` to `target` if it is better than the current one'''
+        i, j = self.index[target_0], self.index[target]
+        if diff < self.diff[i, j]:
+            self.diff[i, j] = diff
+            self.objects[i, j] = obj
+
+    def set_row(self, target_0, moves: Dict) -> None:
+        '''Sets the (diff, object) moves from `target_0` by target, in a cleared row'''
+        i = self.index[target_0]
+        columns = [self.index[t] for t in moves]
+        self.diff[i, columns] = [diff for diff, _ in moves.values()]
+        for j, (_, obj) in zip(columns, moves.values()):
+            self.objects[i, j] = obj
+
+    def update_row(self, target_0, columns: np.ndarray, obj, diffs: np.ndarray) -> None:
+        '''Like `update`, for the moves of `obj` to each target index in `columns`'''
+        i = self.index[target_0]
+        better = diffs < self.diff[i, columns]
+        self.diff[i, columns[better]] = diffs[better]
+        self.objects[i, columns[better]] = obj
+
+    def clear(self, targets: Set[Optional[TargetObject]]) -> None:
+        '''Forgets the moves of the objects allocated to `targets`'''
+        rows = sorted(self.index[t] for t in targets)
+        self.diff[rows] = float('inf')
+        self.objects[rows] = None
+
+    def switch(self, i: int, j: int) -> Switch:
+        return {'object': self.objects[i, j], 'to': self.targets[j]}
+
+    def path(self, cycle: Sequence[int]) -> Path:
+        '''Returns the path of `cycle`, a list of target indices each one linked to the next'''
+        return [self.switch(cycle[k - 1], cycle[k]) for k in range(len(cycle))]
+
+    def cycle_diff(self, cycle: Sequence[int]):
+        return sum(_to_python(self.diff[cycle[k - 1], cycle[k]]) for k in range(len(cycle)))
+
+    def rebuild_path(self, path_id: int, joined: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Path:
+        '''Rebuilds a path from the ids recorded by Floyd - Warshall.
+        Ids lower than size * size are the one-step paths from `i` to `j` encoded as `i * size + j`.
+        Higher ids are paths joining two previous paths, as recorded in `joined`.
+        '''
+        size = len(self.targets)
+        firsts = np.concatenate([f for f, _ in joined])
+        lasts = np.concatenate([last for _, last in joined])
+        path: Path = []
+        pending = [int(path_id)]
+        while pending:
+            current = pending.pop()
+            if current < size * size:
+                path.append(self.switch(*divmod(current, size)))
+            else:
+                pending.append(int(lasts[current - size * size]))
+                pending.append(int(firsts[current - size * size]))
+        return path
+
+
+class DifferenceGraph:
+    '''Sparse first differences between targets, as adjacency lists.
+
+    `edges[i][j]` is the (diff, object) pair of the lowest change in weight obtained by
+    moving one object allocated to `targets[i]` to `targets[j]`. Only the moves found
+    by the first differences pass are kept, so memory is linear in their number.
+
+    Unallocated slots (None objects) can move from any target to any other, which would
+    make the graph dense. Instead, they go through a hub node, `len(targets)`: a None
+    object leaves target i for the hub with difference -weight(None, targets[i]) and
+    goes from the hub to target j with difference weight(None, targets[j]).
+    '''
+
+    def __init__(self, targets: Sequence[Optional[TargetObject]]):
+        self.targets = list(targets)
+        self.index = {t: i for i, t in enumerate(self.targets)}
+        self.hub = len(self.targets)
+        self.edges: List[Dict[int, Tuple[float, Optional[SourceObject]]]] = [dict() for _ in range(self.hub + 1)]
+
+    def update(self, target_0, target, obj, diff) -> None:
+        '''Keeps the move of `obj` from `target_0` to `target` if it is better than the current one'''
+        self._update(self.index[target_0], self.index[target], obj, diff)
+
+    def _update(self, i: int, j: int, obj, diff) -> None:
+        row = self.edges[i]
+        if j not in row or diff < row[j][0]:
+            row[j] = (diff, obj)
+
+    def set_row(self, target_0, moves: Dict) -> None:
+        '''Sets the (diff, object) moves from `target_0` by target, in a cleared row'''
+        self.edges[self.index[target_0]] = {self.index[t]: move for t, move in moves.items()}
+
+    def to_hub(self, target_0, weight) -> None:
+        '''Adds the move of a None object allocated to `target_0` with `weight` to the hub'''
+        self._update(self.index[target_0], self.hub, None, -weight)
+
+    def from_hub(self, target, weight) -> None:
+        '''Adds the move of a None object from the hub to `target`, with `weight`'''
+        self._update(self.hub, self.index[target], None, weight)
+
+    def clear(self, targets: Set[Optional[TargetObject]]) -> None:
+        '''Forgets the moves of the objects allocated to `targets`'''
+        for t in targets:
+            self.edges[self.index[t]] = dict()
+
+    def switch(self, i: int, j: int) -> Switch:
+        return {'object': self.edges[i][j][1], 'to': self.targets[j]}
+
+    def path(self, cycle: Sequence[int]) -> Path:
+        '''Returns the path of `cycle`, a list of nodes each one linked to the next'''
+        return [self.switch(cycle[k - 1], cycle[k]) for k in range(len(cycle)) if cycle[k] != self.hub]
+
+    def cycle_diff(self, cycle: Sequence[int]):
+        return sum(self.edges[cycle[k - 1]][cycle[k]][0] for k in range(len(cycle)))
+
+    def weights(self) -> Iterable[Tuple[int, int, float]]:
+        for i, row in enumerate(self.edges):
+            for j, (diff, _) in row.items():
+                yield i, j, diff
+
+    def to_matrix(self, dtype=float) -> DifferenceMatrix:
+        matrix = DifferenceMatrix(self.targets, dtype)
+        for i, row in enumerate(self.edges[:self.hub]):
+            moves = [(j, diff, obj) for j, (diff, obj) in row.items() if j != self.hub]
+            if self.hub in row:
+                moves.extend((j, row[self.hub][0] + diff, None) for j, (diff, _) in self.edges[self.hub].items())
+            for j, diff, obj in moves:
+                if diff < matrix.diff[i, j]:
+                    matrix.diff[i, j] = diff
+                    matrix.objects[i, j] = obj
+        return matrix
+
+
+class _DeadlineExceeded(Exception):
+    pass
+
+
+class SolveStats:
+    '''Statistics of a solve: one entry per rotation in `cycle_lengths`, `diffs`
+    and `objectives` (which starts with the objective of the initial allocation),
+    and the seconds spent building the initial allocation, computing first differences,
+    searching cycles and rotating.
+    Differences are in the units of the weights used by the Allocator, including
+    the cost of unallocated slots; objectives are as returned by `Allocator.objective`.
+
+    `optimal` tells whether the allocation was proven optimal, and `stopped` why
+    the solve ended: 'optimal', 'deadline', 'max_iterations' or 'min_improvement',
+    or 'cached' for an allocation read from a `cache.ResultCache`.
+    When targets are pruned, `pruned` is the number of weights left out at the start
+    and `restored` the number of them added back. When interchangeable sources and
+    targets are merged, `merged_sources` and `merged_targets` are how many of them
+    were left out of the solve, and the reduction is part of the 'init' seconds.
+    '''
+
+    def __init__(self, initial_objective=0):
+        self.optimal = False
+        self.stopped: Optional[str] = None
+        self.iterations = 0
+        self.cycle_lengths: List[int] = []
+        self.diffs: list = []
+        self.objectives: list = [initial_objective]
+        self.seconds: Dict[str, float] = {'init': 0., 'first_differences': 0., 'cycle_search': 0., 'rotate': 0.}
+        self.pruned = 0
+        self.restored = 0
+        self.merged_sources = 0
+        self.merged_targets = 0
+
+    @property
+    def objective(self):
+        return self.objectives[-1]
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def add_rotation(self, cycle: DiffPath, objective) -> None:
+        self.iterations += 1
+        self.cycle_lengths.append(len(cycle['path']))
+        self.diffs.append(cycle['diff'])
+        self.objectives.append(objective)
+
+    def __str__(self):
+        mean_length = sum(self.cycle_lengths) / self.iterations if self.iterations else 0
+        seconds = ', '.join(f'{k}: {v:.3f}s' for k, v in self.seconds.items())
+        return (f'stopped: {self.stopped}, optimal: {self.optimal}\n'
+                f'iterations: {self.iterations}, mean cycle length: {mean_length:.2f}\n'
+                f'objective: {self.objectives[0]} -> {self.objective}\n'
+                + (f'pruned weights: {self.pruned}, restored: {self.restored}\n' if self.pruned else '')
+                + (f'merged sources: {self.merged_sources}, targets: {self.merged_targets}\n'
+                   if self.merged_sources or self.merged_targets else '')
+                + seconds)
 
 
 class Allocator:
@@ -182,13 +769,28 @@ class Allocator:
                  sources: Dict[Optional[SourceObject], int],
                  wmap: WeightedMap,
                  targets: Dict[Optional[TargetObject], int],
-                 limit_denominator=None):
+                 limit_denominator=None,
+                 weight_scale: Union[int, str, None] = None):
         '''If limit_denominator is a positive number, weights are converted
         to fractions with denominator <= limit_denominator.
+        If weight_scale is a positive integer, weights are multiplied by it and
+        rounded to integers, so that the whole computation is done in exact integer
+        arithmetic. If it is 'auto', the least common denominator of the weights is used.
         '''
 
         if limit_denominator:
             wmap.apply(lambda w: Fraction(w).limit_denominator(limit_denominator))
+        scale: Optional[int]
+        if weight_scale == 'auto':
+            scale = reduce(_lcm, (Fraction(ftw['weight']).denominator
+                                  for s in wmap.get_sources()
+                                  for ftw in wmap[s]), 1)
+        else:
+            scale = int(weight_scale) if weight_scale else None
+        if scale:
+            wmap.apply(lambda w: round(Fraction(w) * scale))
+        self.weight_scale = scale
+        self.limit_denominator = limit_denominator
         sources_total_qty = sum(sources.values())
         targets_total_qty = sum(targets.values())
 
@@ -204,82 +806,470 @@ class Allocator:
 
         self.sources = Source(wmap, sources)
         self.targets = Target(targets)
+        self._order: Optional[List[Optional[TargetObject]]] = None
+        self.stats: Optional[SolveStats] = None
+        self._dtype: Optional[type] = None
+        self._tolerance: Optional[float] = None
+        self._blocked: Optional['BlockedFloydWarshall'] = None
+        # members of the classes of interchangeable sources and targets merged into each one, see `allocation.symmetry`
+        self.source_sizes: Dict[Optional[SourceObject], int] = dict()
+        self.target_sizes: Dict[Optional[TargetObject], int] = dict()
+        self._forget_rows()
+
+    def _convert(self, weight):
+        '''Converts a new weight the same way the original weights were converted'''
+        if self.limit_denominator:
+            weight = Fraction(weight).limit_denominator(self.limit_denominator)
+        if self.weight_scale:
+            weight = round(Fraction(weight) * self.weight_scale)
+        return weight
+
+    def pair_limit(self, source: Optional[SourceObject], target: Optional[TargetObject]) -> int:
+        '''Returns how many times (source, target) can be allocated: once, unless they merge classes'''
+        return self.source_sizes.get(source, 1) * self.target_sizes.get(target, 1)
 
     def init_allocation(self) -> Allocation:
-        first: List[Tuple[Optional[SourceObject], Optional[TargetObject]]]
-        second: List[Tuple[Optional[SourceObject], Optional[TargetObject]]]
-        first = [(s, None) for s, k in self.sources.instances.items() for i in range(k) if s is not None]
-        second = [(None, t) for t, k in self.targets.capacities.items() for i in range(k) if t is not None]
-        return Allocation(first + second)
+        allocation = Allocation()
+        for s, k in self.sources.instances.items():
+            if s is not None:
+                allocation.add(s, None, k)
+        for t, k in self.targets.capacities.items():
+            if t is not None:
+                allocation.add(None, t, k)
+        return allocation
 
-    def _floyd_warshall(self, differences):
+    def objective(self, allocation: Allocation):
+        '''Returns the sum of the weights of the real allocations, in the units of the
+        original weights. If weights were scaled, the result is an exact Fraction.
+        '''
+        total = sum(self.sources[s, t] * count
+                    for s, targets in allocation.by_source.items() if s is not None
+                    for t, count in targets.items() if t is not None)
+        if self.weight_scale:
+            return Fraction(total, self.weight_scale)
+        return total
+
+    def _scan_weights(self) -> None:
+        '''Reads every weight once, for the order of the targets, the dtype of the
+        difference matrices and the tolerance of SPFA'''
+        wanted: Counter = Counter()
+        exact = False
+        integers = True
+        floats = False
+        largest = 0
+        for s in self.sources.collection:
+            for ftw in self.sources.wmap[s]:
+                wanted[ftw['to']] += 1
+                w = ftw['weight']
+                exact = exact or not isinstance(w, (int, float))
+                integers = integers and isinstance(w, int)
+                floats = floats or isinstance(w, float)
+                largest = max(largest, abs(w))
         # Sort the targets by the number of times they appear in wmap
         # This is an optimization that seems to get a 2x performance.
-        wanted = Counter(ftw['to']
-                         for s in self.sources.collection
-                         for ftw in self.sources.wmap[s])
-        targets_coll = sorted(self.targets.collection,
-                              key=lambda t: wanted[t], reverse=True)
-        # now, do Floyd - Warshall. Stop as soon as a cycle has difference < 0.
-        for middle in targets_coll:
-            logger.debug('middle: %s', middle)
-
-            for first in targets_coll:
-                for last in targets_coll:
-
-                    diff_through = differences[(first, middle)]['diff'] + differences[(middle, last)]['diff']
-
-                    if diff_through < differences[(first, last)]['diff']:
-                        first_path = differences[(first, middle)]['path']
-                        last_path = differences[(middle, last)]['path']
-                        differences[(first, last)] = {'path': first_path + last_path, 'diff': diff_through}
-                        logger.debug('  found better path from %s to %s: %s',
-                                     first, last, differences[(first, last)])
-
-                    if last == first and differences[(first, last)]['diff'] < 0:
-                        return differences[(first, last)]
+        self._order = sorted(self.targets.collection, key=lambda t: wanted[t], reverse=True)
+        # exact weights (e.g., Fractions) must not be cast to floats.
+        # Integer weights are exact in a float matrix as long as sums stay below 2 ** 53
+        if integers:
+            exact = largest * 2 * len(self.targets.collection) ** 2 >= 2 ** 53
+        self._dtype = object if exact else float
+        # float sums of differences around the sentinel weights lose their last bits,
+        # and SPFA would take the rounding errors for improvements
+        self._tolerance = largest * len(self.targets.collection) * 1e-12 if floats else 0
+
+    def _targets_order(self) -> List[Optional[TargetObject]]:
+        if self._order is None:
+            self._scan_weights()
+        assert self._order is not None
+        return self._order
+
+    def _weights_dtype(self):
+        if self._dtype is None:
+            self._scan_weights()
+        return self._dtype
+
+    def _forget_rows(self) -> None:
+        self._rows: Dict[Optional[SourceObject], dict] = dict()
+        self._none_columns: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # targets kept by source when pruning, None if all of them are used
+        self._kept: Optional[Dict[Optional[SourceObject], Set[Optional[TargetObject]]]] = None
+
+    def tolerance(self) -> float:
+        '''Returns the rounding error allowed in sums of float weights: differences of cycles
+        and reduced costs above -tolerance are taken as zero. It is 0 for exact weights.'''
+        if self._tolerance is None:
+            self._scan_weights()
+        assert self._tolerance is not None
+        return self._tolerance
+
+    def _floyd_warshall(self, differences: 'DifferenceMatrix', stop_at: Optional[float] = None,
+                        most_negative: bool = False) -> Optional[DiffPath]:
+        # Floyd - Warshall, relaxing a whole row and column of the matrix for each middle target.
+        # Stop as soon as a cycle has difference < 0, returning the first one or, if most_negative,
+        # the most negative of those found for the same middle target.
+        # Instead of copying paths, every improvement records the two paths it joins,
+        # so that the path of the cycle found can be rebuilt at the end.
+        diff = differences.diff.copy()
+        size = len(differences.targets)
+        paths = np.arange(size * size).reshape(size, size)
+        joined: List[Tuple[np.ndarray, np.ndarray]] = []
+        next_path = size * size
+
+        trace = logger.isEnabledFor(TRACE)
+        for middle in range(size):
+            if stop_at is not None and time.monotonic() > stop_at:
+                raise _DeadlineExceeded()
+            if trace:
+                logger.log(TRACE, 'middle: %s', differences.targets[middle])
+
+            through = diff[:, middle, None] + diff[None, middle, :]
+            better = through < diff
+            if not better.any():
+                continue
+
+            firsts, lasts = np.nonzero(better)
+            joined.append((paths[firsts, middle], paths[middle, lasts]))
+            diff[firsts, lasts] = through[firsts, lasts]
+            paths[firsts, lasts] = np.arange(next_path, next_path + len(firsts))
+            next_path += len(firsts)
+
+            negative = np.flatnonzero(np.diagonal(diff) < 0)
+            if len(negative):
+                first = negative[np.argmin(np.diagonal(diff)[negative])] if most_negative else negative[0]
+                return {'diff': _to_python(diff[first, first]),
+                        'path': differences.rebuild_path(paths[first, first], joined)}
 
         return None
 
-    def get_first_cycle(self, allocation: Allocation) -> Optional[DiffPath]:
-        inf = float('inf')
-
-        differences: Differences = dict()
-        targets_coll = self.targets.collection
-        for t1 in targets_coll:
-            for t2 in targets_coll:
-                differences[(t1, t2)] = {'path': [], 'diff': inf}
-
-        # first differences
-        NoneSet = {None}
-        for source, target_0 in allocation:
+    def _blocked_floyd_warshall(self, differences: 'DifferenceMatrix', stop_at: Optional[float] = None,
+                                most_negative: bool = False) -> Optional[DiffPath]:
+        blocked = self._blocked
+        assert blocked is not None
+        # exact weights, matrices of a single block and single processes are left to the serial search,
+        # which is faster without processes to share the tiles
+        if (differences.diff.dtype != np.float64 or len(differences.targets) <= blocked.block_size
+                or blocked.workers <= 1):
+            return self._floyd_warshall(differences, stop_at, most_negative)
+
+        def check():
+            if stop_at is not None and time.monotonic() > stop_at:
+                raise _DeadlineExceeded()
+
+        cycle = blocked.search(differences.diff, most_negative, check)
+        if cycle is None:
+            return None
+        if not cycle:
+            logger.debug('no negative cycle found by the blocked search, falling back to Floyd-Warshall')
+            return self._floyd_warshall(differences, stop_at, most_negative)
+        return self._cycle_path(differences, cycle)
+
+    def _spfa(self, graph: DifferenceGraph, stop_at: Optional[float] = None,
+              most_negative: bool = False) -> Optional[DiffPath]:
+        # Bellman - Ford with a FIFO queue (SPFA) from a virtual root linked to every node.
+        # Every `size` relaxations, look for cycles in the parents: they exist as soon as
+        # a negative cycle is reachable, and they are negative cycles.
+        size = len(graph.edges)
+        tolerance = self.tolerance()
+        dist: list = [0] * size
+        parent = [-1] * size
+        queue = deque(range(size))
+        queued = [True] * size
+        relaxations = 0
+        while queue:
+            i = queue.popleft()
+            queued[i] = False
+            for j, (diff, _) in graph.edges[i].items():
+                if dist[i] + diff < dist[j] - tolerance:
+                    dist[j] = dist[i] + diff
+                    parent[j] = i
+                    relaxations += 1
+                    if relaxations % size == 0:
+                        if stop_at is not None and time.monotonic() > stop_at:
+                            raise _DeadlineExceeded()
+                        cycles = self._parents_cycles(parent)
+                        if cycles:
+                            cycle = min(cycles, key=graph.cycle_diff) if most_negative else cycles[0]
+                            return self._cycle_path(graph, cycle)
+                    if not queued[j]:
+                        queue.append(j)
+                        queued[j] = True
+        return None
 
-            current_weight = self.sources.wmap[(source, target_0)]
-            sweights = self.sources.wmap[source]
-            this_source_allocations = allocation[source] - NoneSet
+    @staticmethod
+    def _parents_cycles(parent: List[int]) -> List[List[int]]:
+        '''Returns the cycles of the `parent` pointers, in the direction of the edges'''
+        cycles = []
+        seen = [-1] * len(parent)
+        for start in range(len(parent)):
+            node = start
+            while node >= 0 and seen[node] < 0:
+                seen[node] = start
+                node = parent[node]
+            if node >= 0 and seen[node] == start:
+                cycle = [node]
+                while parent[cycle[-1]] != node:
+                    cycle.append(parent[cycle[-1]])
+                cycle.reverse()
+                cycles.append(cycle)
+        return cycles
+
+    def _cycle_path(self, differences: Union[DifferenceMatrix, DifferenceGraph],
+                    cycle: Sequence[int]) -> Optional[DiffPath]:
+        '''Returns the DiffPath of `cycle`. If it is not negative because of rounding,
+        falls back to the first cycle found by Floyd - Warshall'''
+        diff = differences.cycle_diff(cycle)
+        if not diff < 0:
+            logger.warning('cycle with difference %s, falling back to Floyd-Warshall', diff)
+            if isinstance(differences, DifferenceGraph):
+                differences = differences.to_matrix(self._weights_dtype())
+            return self._floyd_warshall(differences)
+        return {'diff': diff, 'path': differences.path(cycle)}
+
+    def _min_mean_cycle(self, differences: Union[DifferenceMatrix, DifferenceGraph],
+                        stop_at: Optional[float] = None) -> Optional[DiffPath]:
+        # Karp: dist[k][v] is the lowest difference of a walk of k moves ending at v
+        # (from a virtual root linked to every node). The minimum mean of a cycle is
+        # min over v of max over k < n of (dist[n][v] - dist[k][v]) / (n - k), and the
+        # walk of n moves ending at the minimizing v goes around such a cycle.
+        if isinstance(differences, DifferenceGraph):
+            dist, parent = self._karp_sparse(differences, stop_at)
+        else:
+            dist, parent = self._karp_dense(differences, stop_at)
+        size = len(parent) - 1
+
+        best, best_mean = -1, float('inf')
+        for v in range(len(dist[size])):
+            if dist[size][v] == float('inf'):
+                continue
+            mean = max((dist[size][v] - dist[k][v]) / (size - k)
+                       for k in range(size) if dist[k][v] != float('inf'))
+            if mean < best_mean:
+                best, best_mean = v, mean
+        if not best_mean < 0:
+            return None
 
-            for stw in sweights:
+        walk = [best]
+        for k in range(size, 0, -1):
+            walk.append(parent[k][walk[-1]])
+        position: Dict[int, int] = dict()
+        for i, node in enumerate(walk):
+            if node in position:
+                # walk goes backwards along the moves
+                return self._cycle_path(differences, walk[i:position[node]:-1])
+            position[node] = i
+        return None
 
-                target, weight = stw['to'], stw['weight']
-                # if source already allocated to target, don't consider moving it there again.
-                if target in this_source_allocations:
+    def _karp_dense(self, differences: DifferenceMatrix, stop_at: Optional[float] = None):
+        # the walks are only used to choose the cycle, whose difference is then computed
+        # exactly, so exact weights are approximated by floats, which is much faster
+        diff = differences.diff.astype(float)
+        size = len(differences.targets)
+        dist = np.empty((size + 1, size))
+        dist[0] = 0
+        parent = np.zeros((size + 1, size), dtype=np.int64)
+        columns = np.arange(size)
+        for k in range(1, size + 1):
+            if stop_at is not None and time.monotonic() > stop_at:
+                raise _DeadlineExceeded()
+            walks = dist[k - 1][:, None] + diff
+            parent[k] = np.argmin(walks, axis=0)
+            dist[k] = walks[parent[k], columns]
+        return dist.tolist(), parent.tolist()
+
+    def _karp_sparse(self, graph: DifferenceGraph, stop_at: Optional[float] = None):
+        size = len(graph.edges)
+        inf = float('inf')
+        dist: List[list] = [[0] * size]
+        parent: List[List[int]] = [[-1] * size]
+        # as in _karp_dense, floats are enough to choose the cycle
+        edges = [(i, j, float(diff)) for i, j, diff in graph.weights()]
+        for k in range(1, size + 1):
+            if stop_at is not None and time.monotonic() > stop_at:
+                raise _DeadlineExceeded()
+            previous = dist[-1]
+            current: list = [inf] * size
+            parents = [-1] * size
+            for i, j, diff in edges:
+                if previous[i] + diff < current[j]:
+                    current[j] = previous[i] + diff
+                    parents[j] = i
+            dist.append(current)
+            parent.append(parents)
+        return dist, parent
+
+    def _find_cycle(self, differences: Union[DifferenceMatrix, DifferenceGraph],
+                    stop_at: Optional[float] = None, policy: str = 'first') -> Optional[DiffPath]:
+        if policy == 'min_mean':
+            return self._min_mean_cycle(differences, stop_at)
+        if isinstance(differences, DifferenceGraph):
+            return self._spfa(differences, stop_at, policy == 'most_negative')
+        if self._blocked is not None:
+            return self._blocked_floyd_warshall(differences, stop_at, policy == 'most_negative')
+        return self._floyd_warshall(differences, stop_at, policy == 'most_negative')
+
+    def _full_row(self, source: Optional[SourceObject]) -> dict:
+        row: dict = dict()
+        for stw in self.sources.wmap[source]:
+            row.setdefault(stw['to'], stw['weight'])
+        return row
+
+    def _row(self, source: Optional[SourceObject]) -> dict:
+        '''Returns the weights of `source` by target, read from the map once per solve.
+        When pruning, only the kept targets and None are returned.'''
+        if source not in self._rows:
+            row = self._full_row(source)
+            if self._kept is not None and source is not None:
+                kept = self._kept[source]
+                row = {t: w for t, w in row.items() if t is None or t in kept}
+            self._rows[source] = row
+        return self._rows[source]
+
+    def _prune(self, k: int, allocation: Allocation) -> int:
+        '''Keeps the `k` targets with the lowest weights of each source, and the targets
+        where `allocation` already puts it. Returns the number of weights left out'''
+        self._kept = dict()
+        pruned = 0
+        for source in self.sources.collection:
+            if source is None:
+                continue
+            row = [(w, t) for t, w in self._full_row(source).items() if t is not None]
+            self._kept[source] = {t for _, t in heapq.nsmallest(k, row, key=lambda wt: wt[0])}
+            self._kept[source].update(t for t in allocation.by_source.get(source, ()) if t is not None)
+            pruned += len(row) - len(self._kept[source])
+        return pruned
+
+    def _potentials(self, differences) -> list:
+        '''Returns the lengths of the shortest paths to each node of `differences` from a
+        virtual root linked to all of them with length 0 (Bellman - Ford), assuming that
+        there are no negative cycles. Moves between nodes never have a negative reduced cost
+        difference + potential[i] - potential[j], up to rounding errors.'''
+        if isinstance(differences, DifferenceMatrix):
+            potentials = np.zeros(len(differences.targets), dtype=differences.diff.dtype)
+            for _ in range(len(differences.targets)):
+                relaxed = np.minimum(potentials, (potentials[:, None] + differences.diff).min(axis=0))
+                if (relaxed == potentials).all():
+                    break
+                potentials = relaxed
+            return potentials.tolist()
+
+        lengths: list = [0] * len(differences.edges)
+        queue = deque(range(len(differences.edges)))
+        queued = [True] * len(differences.edges)
+        relaxations = 0
+        while queue and relaxations <= len(differences.edges) ** 2:
+            i = queue.popleft()
+            queued[i] = False
+            for j, (diff, _) in differences.edges[i].items():
+                if lengths[i] + diff < lengths[j]:
+                    lengths[j] = lengths[i] + diff
+                    relaxations += 1
+                    if not queued[j]:
+                        queued[j] = True
+                        queue.append(j)
+        return lengths
+
+    def _restore(self, allocation: Allocation, differences) -> Tuple[int, Set[Optional[TargetObject]]]:
+        '''Adds back the pruned targets which could be part of a negative cycle: the moves
+        of the objects of `allocation` to them have a negative reduced cost with the potentials
+        of `differences`. Returns the number of targets added back and the targets whose
+        first differences must be computed again.'''
+        assert self._kept is not None
+        potentials = self._potentials(differences)
+        tolerance = self.tolerance()
+        index = differences.index
+        restored = 0
+        touched: Set[Optional[TargetObject]] = set()
+        for source, kept in self._kept.items():
+            allocated = allocation.by_source.get(source)
+            if not allocated:
+                continue
+            row = self._row(source)
+            # with a tolerance, rounding errors can only restore more targets
+            added = [target for target, weight in self._full_row(source).items()
+                     if target is not None and target not in kept
+                     and any(weight - row[t] + potentials[index[t]] - potentials[index[target]] < tolerance
+                             for t in allocated)]
+            if added:
+                kept.update(added)
+                restored += len(added)
+                del self._rows[source]
+                touched.update(allocated)
+        return restored, touched
+
+    def _none_row(self, differences: DifferenceMatrix) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns the indices in `differences` of the targets of None and their weights'''
+        if self._none_columns is None:
+            row = self._row(None)
+            self._none_columns = (np.array([differences.index[t] for t in row], dtype=np.int64),
+                                  np.array(list(row.values()), dtype=differences.diff.dtype))
+        return self._none_columns
+
+    def _first_differences(self, allocation: Allocation, differences=None,
+                           targets: Optional[Set[Optional[TargetObject]]] = None, sparse: bool = False):
+        '''Computes the first differences of `allocation`, in a DifferenceGraph if `sparse`
+        or else in a DifferenceMatrix. If `differences` and `targets` are given, only the
+        rows of `differences` corresponding to `targets` are recomputed.
+        '''
+        if differences is None or targets is None:
+            if sparse:
+                differences = DifferenceGraph(self._targets_order())
+                for stw in self.sources.wmap[None]:
+                    differences.from_hub(stw['to'], stw['weight'])
+            else:
+                differences = DifferenceMatrix(self._targets_order(), self._weights_dtype())
+            targets = None
+        else:
+            differences.clear(targets)
+        merged = bool(self.source_sizes or self.target_sizes)
+
+        for target_0 in (differences.targets if targets is None else targets):
+            # best move to each target of the objects allocated to target_0, and its object
+            moves: Dict[Optional[TargetObject], tuple] = dict()
+            none_weight = None
+            for source in allocation.at(target_0):
+
+                row = self._row(source)
+                current_weight = row[target_0]
+                # unallocated slots are interchangeable, so None can be moved anywhere
+                if source is None:
+                    none_weight = current_weight
                     continue
+                this_source_allocations = allocation.by_source[source]
+
+                for target, weight in row.items():
+                    # if source already allocated to target, don't consider moving it there again,
+                    # unless it is a class with slots left there.
+                    if target is not None and target in this_source_allocations and (
+                            not merged or this_source_allocations[target] >= self.pair_limit(source, target)):
+                        continue
+
+                    diff = weight - current_weight
+                    if target not in moves or diff < moves[target][0]:
+                        moves[target] = (diff, source)
+
+            differences.set_row(target_0, moves)
+            if none_weight is None:
+                continue
+            if isinstance(differences, DifferenceGraph):
+                differences.to_hub(target_0, none_weight)
+            else:
+                columns, weights = self._none_row(differences)
+                differences.update_row(target_0, columns, None, weights - none_weight)
+
+        return differences
 
-                diff = weight - current_weight
-                if diff < differences[(target_0, target)]['diff']:
-                    differences[(target_0, target)] = {'path': [{'object': stw['from'], 'to': target}], 'diff': diff}
-
-        return self._floyd_warshall(differences)
-
-    def has_cycle(self, differences: Differences) -> bool:
-        return self.get_cycle(differences) is not None
+    def get_first_cycle(self, allocation: Allocation) -> Optional[DiffPath]:
+        self._forget_rows()
+        return self._floyd_warshall(self._first_differences(allocation))
 
-    def get_cycle(self, differences: Differences) -> Optional[DiffPath]:
-        for t in self.targets.collection:
-            pd = differences[(t, t)]
-            if pd['diff'] < 0:
-                return pd
-        return None
+    def _touched_targets(self, allocation: Allocation, path: Path) -> Set[Optional[TargetObject]]:
+        '''Returns the targets whose first differences may change after rotating `path`:
+        the targets in the path and every target where a moved object is allocated.
+        '''
+        touched = {ot['to'] for ot in path}
+        for ot in path:
+            touched |= allocation[ot['object']]
+        return touched
 
     def rotate(self, allocation: Allocation, path: Path) -> None:
         s = path[-1]['to']
@@ -287,19 +1277,288 @@ class Allocator:
             t = ot['to']
             o = ot['object']
             # must move o from s to t
-            idx = allocation.index((o, s))
-            allocation.pop(idx)
-            allocation.append((o, t))
+            allocation.move(o, s, t)
             s = t
 
-    def get_best(self) -> Allocation:
-        allocation = self.init_allocation()
-        cycle = self.get_first_cycle(allocation)
+    def reoptimize(self, previous: Allocation, changes: Changes, incremental: bool = True) -> Allocation:
+        '''Applies `changes` to the problem and returns an optimal allocation for it,
+        starting from `previous`, which should be an allocation of the problem before the changes.
 
-        while cycle is not None:
-            logger.info('perform rotation. Difference: %s, path: %s', cycle['diff'], cycle['path'])
-            self.rotate(allocation, cycle['path'])
-            logger.debug('current: %s', allocation)
-            cycle = self.get_first_cycle(allocation)
+        The real allocations of `previous` that are still possible are kept and
+        the rest of the slots are left unallocated. Then cycles are canceled as in `get_best`.
+        '''
+        wmap = self.sources.wmap
+        instances, capacities = self.sources.instances, self.targets.capacities
+        for w in changes.get('weights', []):
+            wmap.set_weight({'from': w['from'], 'to': w['to'], 'weight': self._convert(w['weight'])})
+        for source, target in changes.get('removed_weights', []):
+            wmap.remove_weight(source, target)
+        instances.update(changes.get('sources', {}))
+        capacities.update(changes.get('targets', {}))
+
+        # None quantities and weights, as in __init__
+        instances[None] = sum(k for t, k in capacities.items() if t is not None)
+        capacities[None] = sum(k for s, k in instances.items() if s is not None)
+        self.sources.collection = wmap.get_sources()
+        if isinstance(wmap, LazyWeightedMap) and wmap.total is not None:
+            # the bound of the computed weights, plus the weights added or changed since, without the sentinels
+            max_val = wmap.total + sum(w for s, extra in wmap.extra.items() if s is not None
+                                       for t, w in extra.items() if t is not None and w is not None)
+        else:
+            max_val = sum(ftw['weight']
+                          for s in self.sources.collection if s is not None
+                          for ftw in wmap[s] if ftw['to'] is not None)
+        for t in capacities.keys():
+            if t is not None:
+                wmap.set_weight({'from': None, 'to': t, 'weight': max_val + 1})
+        for s in instances.keys():
+            if s is not None:
+                wmap.set_weight({'from': s, 'to': None, 'weight': max_val + 1})
+        self._order = None
+        self._dtype = None
+        self._tolerance = None
+        self._forget_rows()
+
+        # keep the real allocations that are still feasible
+        allocation = Allocation()
+        for s, t in previous:
+            if s is None or t is None or allocation.count(s, t) or wmap[(s, t)] is None:
+                continue
+            if sum(allocation.by_source.get(s, {}).values()) < instances.get(s, 0) \
+                    and sum(allocation.at(t).values()) < capacities.get(t, 0):
+                allocation.add(s, t)
+        for s, k in instances.items():
+            if s is not None:
+                allocation.add(s, None, k - sum(allocation.by_source.get(s, {}).values()))
+        for t, k in capacities.items():
+            if t is not None:
+                allocation.add(None, t, k - sum(allocation.at(t).values()))
+        allocation.add(None, None, len(allocation))
+
+        return self._improve(allocation, incremental)
+
+    def get_best(self, incremental: bool = True, engine: str = 'cycles',
+                 on_iteration: Optional[Callable[[Allocation, SolveStats], None]] = None,
+                 return_stats: bool = False, deadline: Optional[float] = None,
+                 max_iterations: Optional[int] = None, min_improvement: Optional[float] = None,
+                 cycle_finder: str = 'floyd_warshall', policy: str = 'first', prune: Optional[int] = None,
+                 init: str = 'empty', workers: Optional[int] = None, symmetry: bool = False,
+                 return_potentials: bool = False):
+        '''Returns an optimal allocation.
+
+        engine is either 'cycles', which starts from `init_allocation` and
+        performs rotations while there are cycles with negative difference,
+        or 'ssp', which solves the problem as a min-cost flow by successive shortest paths.
+        If incremental is True, the first differences are kept between rotations
+        and only the rows of the targets touched by each rotation are recomputed.
+
+        The SolveStats of the solve are kept in `self.stats` and, if return_stats
+        is True, an (allocation, stats) pair is returned. on_iteration, if given,
+        is called with the current allocation and stats after each rotation.
+
+        With the 'cycles' engine, the solve can be stopped early, returning the
+        best allocation found so far: after `deadline` seconds, after `max_iterations`
+        rotations or after a rotation whose difference is smaller than `min_improvement`
+        (in the units of the original weights). Then `stats.optimal` is False.
+
+        cycle_finder is the search for negative cycles of the 'cycles' engine: 'floyd_warshall',
+        dense over all pairs of targets, 'spfa', a queue based Bellman - Ford over the
+        moves between targets that are actually possible, which is faster for sparse weights,
+        or 'blocked_floyd_warshall', which splits the float matrix of large sets of targets
+        in tiles relaxed by `workers` processes (as many as CPUs if None), see `allocation.blocked`;
+        with a single worker, it is the same as 'floyd_warshall'.
+        policy chooses the cycle to rotate: 'first', the first one found, 'most_negative',
+        the one with the lowest difference among those found in the same step of the search,
+        or 'min_mean', the one with the lowest mean difference (Karp), which bounds the
+        number of rotations.
+
+        If prune is a positive integer, the 'cycles' engine starts with the `prune`
+        targets with the lowest weights of each source. Once there are no more negative
+        cycles, the pruned targets which could be part of one are added back and the
+        rotations go on, so that the allocation is as optimal as without pruning.
+
+        init is the allocation the 'cycles' engine starts from: 'empty', where
+        nothing is allocated, or one built by the 'greedy' or 'regret' heuristics
+        of `allocation.initial`, which saves most of the rotations.
+
+        If symmetry is True, sources with the same instances and weights, and targets
+        with the same capacity and weights, are merged into classes before solving,
+        see `allocation.symmetry`, and the allocation of the classes is dealt back
+        to their members.
+
+        If return_potentials is True, the `potentials` of the allocation, which
+        certify that it is optimal with `allocation.certificate.verify`, are
+        returned after it (and after the stats, if return_stats is True).
+        '''
+        if symmetry:
+            from .symmetry import reduce
+            start = time.perf_counter()
+            reduction = reduce(self)
+            if reduction is not None:
+                reduce_seconds = time.perf_counter() - start
+                callback = on_iteration and (lambda a, stats: on_iteration(reduction.expand(a), stats))
+                reduced = reduction.allocator.get_best(
+                    incremental=incremental, engine=engine, on_iteration=callback, deadline=deadline,
+                    max_iterations=max_iterations, min_improvement=min_improvement, cycle_finder=cycle_finder,
+                    policy=policy, prune=prune, init=init, workers=workers)
+                start = time.perf_counter()
+                allocation = reduction.expand(reduced)
+                stats = self.stats = reduction.allocator.stats
+                assert stats is not None
+                stats.seconds['init'] += reduce_seconds + time.perf_counter() - start
+                stats.merged_sources = reduction.merged_sources
+                stats.merged_targets = reduction.merged_targets
+                return self._result(allocation, return_stats, return_potentials)
+
+        if engine == 'ssp':
+            from .flow import successive_shortest_paths
+            start = time.perf_counter()
+            allocation = successive_shortest_paths(self)
+            self.stats = SolveStats(self.objective(allocation))
+            self.stats.seconds['cycle_search'] = time.perf_counter() - start
+            self.stats.optimal = True
+            self.stats.stopped = 'optimal'
+        elif engine == 'cycles':
+            stop_at = time.monotonic() + deadline if deadline is not None else None
+            start = time.perf_counter()
+            allocation = self._initial_allocation(init)
+            init_seconds = time.perf_counter() - start
+            allocation = self._improve(allocation, incremental, on_iteration=on_iteration, stop_at=stop_at,
+                                       max_iterations=max_iterations, min_improvement=min_improvement,
+                                       cycle_finder=cycle_finder, policy=policy, prune=prune, workers=workers)
+            assert self.stats is not None
+            self.stats.seconds['init'] = init_seconds
+        else:
+            raise ValueError(f'Unknown engine {engine}')
+        return self._result(allocation, return_stats, return_potentials)
+
+    def _result(self, allocation: Allocation, return_stats: bool, return_potentials: bool):
+        if not return_stats and not return_potentials:
+            return allocation
+        result: tuple = (allocation, self.stats) if return_stats else (allocation,)
+        if return_potentials:
+            result += (self.potentials(allocation),)
+        return result
+
+    def potentials(self, allocation: Allocation) -> Dict[Optional[TargetObject], Real]:
+        '''Returns the potential (dual price) of each target for `allocation`, such that no
+        move of an allocated object from target t0 to target t has a negative reduced cost
+        weight(t) - weight(t0) + potential[t0] - potential[t], up to rounding errors, which
+        proves that there are no negative cycles, if `allocation` is optimal.
+        Potentials are in the units of the weights used by the Allocator.'''
+        self._forget_rows()
+        graph = self._first_differences(allocation, sparse=True)
+        lengths = self._potentials(graph)
+        self._forget_rows()
+        return {t: lengths[i] for i, t in enumerate(graph.targets)}
+
+    def _initial_allocation(self, init: str) -> Allocation:
+        if init == 'empty':
+            return self.init_allocation()
+        if init in ('greedy', 'regret'):
+            from . import initial
+            return getattr(initial, init)(self)
+        raise ValueError(f'Unknown init {init}')
+
+    def _objective_change(self, path: Path):
+        '''Returns how much rotating `path` changes the objective'''
+        change = 0
+        s = path[-1]['to']
+        for ot in path:
+            o, t = ot['object'], ot['to']
+            if o is not None:
+                change += (self.sources[o, t] if t is not None else 0) - (self.sources[o, s] if s is not None else 0)
+            s = t
+        if self.weight_scale:
+            return Fraction(change, self.weight_scale)
+        return change
+
+    def _improve(self, allocation: Allocation, incremental: bool = True,
+                 on_iteration: Optional[Callable[[Allocation, SolveStats], None]] = None,
+                 stop_at: Optional[float] = None, max_iterations: Optional[int] = None,
+                 min_improvement: Optional[float] = None, cycle_finder: str = 'floyd_warshall',
+                 policy: str = 'first', prune: Optional[int] = None,
+                 workers: Optional[int] = None) -> Allocation:
+        '''Performs rotations on `allocation` while there are cycles with negative difference,
+        until time.monotonic() reaches `stop_at` or one of the other limits is hit'''
+        if cycle_finder not in ('floyd_warshall', 'spfa', 'blocked_floyd_warshall'):
+            raise ValueError(f'Unknown cycle finder {cycle_finder}')
+        if policy not in ('first', 'most_negative', 'min_mean'):
+            raise ValueError(f'Unknown policy {policy}')
+        sparse = cycle_finder == 'spfa'
+        if prune is not None and prune <= 0:
+            raise ValueError(f'prune must be a positive number of targets, got {prune}')
+        if cycle_finder == 'blocked_floyd_warshall':
+            from .blocked import BlockedFloydWarshall
+            self._blocked = BlockedFloydWarshall(workers)
+        self._forget_rows()
+        stats = self.stats = SolveStats(self.objective(allocation))
+        clock = time.perf_counter
+        try:
+            start = clock()
+            if prune:
+                stats.pruned = self._prune(prune, allocation)
+            differences = self._first_differences(allocation, sparse=sparse)
+            found = clock()
+            cycle = self._find_cycle(differences, stop_at, policy)
+            stats.seconds['first_differences'] += found - start
+            stats.seconds['cycle_search'] += clock() - found
+
+            while True:
+                if cycle is None:
+                    if not prune:
+                        break
+                    start = clock()
+                    restored, touched = self._restore(allocation, differences)
+                    if not restored:
+                        break
+                    logger.info('restored %d pruned targets', restored)
+                    stats.restored += restored
+                    differences = self._first_differences(allocation, differences, touched, sparse)
+                    found = clock()
+                    cycle = self._find_cycle(differences, stop_at, policy)
+                    stats.seconds['first_differences'] += found - start
+                    stats.seconds['cycle_search'] += clock() - found
+                    continue
 
+                if max_iterations is not None and stats.iterations >= max_iterations:
+                    stats.stopped = 'max_iterations'
+                    return allocation
+                logger.info('perform rotation. Difference: %s, path: %s', cycle['diff'], cycle['path'])
+                start = clock()
+                objective = stats.objective + self._objective_change(cycle['path'])
+                self.rotate(allocation, cycle['path'])
+                stats.add_rotation(cycle, objective)
+                stats.seconds['rotate'] += clock() - start
+                logger.debug('current: %s', allocation)
+                if on_iteration is not None:
+                    on_iteration(allocation, stats)
+
+                improvement = -cycle['diff'] / (self.weight_scale or 1)
+                if min_improvement is not None and improvement < min_improvement:
+                    stats.stopped = 'min_improvement'
+                    return allocation
+
+                rotated = clock()
+                if incremental:
+                    touched = self._touched_targets(allocation, cycle['path'])
+                    differences = self._first_differences(allocation, differences, touched, sparse)
+                else:
+                    differences = self._first_differences(allocation, sparse=sparse)
+                found = clock()
+                cycle = self._find_cycle(differences, stop_at, policy)
+                stats.seconds['first_differences'] += found - rotated
+                stats.seconds['cycle_search'] += clock() - found
+
+        except _DeadlineExceeded:
+            logger.info('deadline reached after %d rotations', stats.iterations)
+            stats.stopped = 'deadline'
+            return allocation
+        finally:
+            if self._blocked is not None:
+                self._blocked.close()
+                self._blocked = None
+
+        stats.optimal = True
+        stats.stopped = 'optimal'
         return allocation
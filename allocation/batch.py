@@ -0,0 +1,114 @@
+'''Solves many problem files in a pool of worker processes.'''
+from typing import Any, Dict, Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from glob import glob
+from pathlib import Path
+import logging
+import signal
+import time
+
+
+logger = logging.getLogger(__name__)
+
+RESULT_SUFFIX = '.allocation.yml'
+
+
+class SolveTimeout(TimeoutError):
+    pass
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]):
+    '''Raises SolveTimeout if the body takes more than `seconds`.
+    It uses SIGALRM, so it only works in the main thread of a process.
+    '''
+    if not seconds:
+        yield
+        return
+
+    def handler(signum, frame):
+        raise SolveTimeout(f'took more than {seconds} seconds')
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def find_problems(pattern: str) -> List[Path]:
+    '''Returns the yaml files and the saved problems in directory `pattern`,
+    or the files matching the glob `pattern`, leaving out the results of previous runs'''
+    path = Path(pattern)
+    if path.is_dir():
+        problems = [p for p in path.iterdir() if p.suffix in ('.yml', '.yaml') or (p / 'meta.json').is_file()]
+    else:
+        problems = [Path(p) for p in glob(pattern)]
+    return sorted(p for p in problems if not p.name.endswith(RESULT_SUFFIX))
+
+
+def result_path(problem: Path, out_dir: Optional[Path] = None) -> Path:
+    return (out_dir or problem.parent) / f'{problem.stem}{RESULT_SUFFIX}'
+
+
+def solve_file(problem: Path, out_dir: Optional[Path] = None, timeout: Optional[float] = None,
+               cache_dir: Optional[Path] = None, cache_bytes: Optional[int] = None, trust_cache: bool = False) -> dict:
+    '''Solves `problem` and writes its allocation next to it, or in `out_dir`.
+    With a `cache_dir`, the allocation is read from or added to a ResultCache there.
+    Returns a report with the status, the time spent, the error, if any, and the cache lookup.
+    '''
+    from .cache import MAX_BYTES, ResultCache
+    from .main import load, save_yaml
+
+    start = time.monotonic()
+    report: Dict[str, Any] = {'problem': str(problem), 'status': 'ok', 'error': None, 'cache': None}
+    try:
+        with time_limit(timeout):
+            allocator = load(problem)
+            if cache_dir is None:
+                allocation = allocator.get_best()
+            else:
+                cache = ResultCache(cache_dir, cache_bytes or MAX_BYTES)
+                allocation = cache.get_best(allocator, trust=trust_cache)
+                report['cache'] = 'hit' if cache.hits else 'miss'
+        pairs = sorted(([s, t] for s, t in allocation if s is not None and t is not None), key=str)
+        save_yaml(result_path(problem, out_dir),
+                  {'allocation': pairs, 'weight': float(allocator.objective(allocation))})
+    except SolveTimeout as e:
+        report.update(status='timeout', error=str(e))
+    except Exception as e:
+        logger.exception('error solving %s', problem)
+        report.update(status='error', error=f'{type(e).__name__}: {e}')
+    report['seconds'] = time.monotonic() - start
+    return report
+
+
+def solve_files(problems: Iterable[Path], jobs: Optional[int] = None,
+                timeout: Optional[float] = None, out_dir: Optional[Path] = None,
+                cache_dir: Optional[Path] = None, cache_bytes: Optional[int] = None,
+                trust_cache: bool = False) -> List[dict]:
+    '''Solves `problems` in a pool of `jobs` processes, each one within `timeout` seconds'''
+    problems = list(problems)
+    n = len(problems)
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(solve_file, problems, [out_dir] * n, [timeout] * n,
+                                 [cache_dir] * n, [cache_bytes] * n, [trust_cache] * n))
+
+
+def summary(reports: List[dict]) -> str:
+    lines = [f"{r['problem']}: {r['status']} in {r['seconds']:.3f}s" for r in reports]
+    failed = [r for r in reports if r['status'] != 'ok']
+    lines.append(f'{len(reports) - len(failed)} solved, {len(failed)} failed')
+    lookups = [r.get('cache') for r in reports if r.get('cache')]
+    if lookups:
+        lines.append(f"cache: {lookups.count('hit')} hits, {lookups.count('miss')} misses")
+    lines.extend(f"  {r['problem']}: {r['error']}" for r in failed)
+    return '\n'.join(lines)
+
+
+def exit_status(reports: List[dict]) -> int:
+    '''Returns the exit status of a batch: 1 if any problem failed, else 0'''
+    return int(any(r['status'] != 'ok' for r in reports))
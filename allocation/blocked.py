@@ -0,0 +1,255 @@
+'''Blocked Floyd - Warshall over shared memory, for large sets of targets.
+
+The matrix of first differences is split into square tiles of `block_size`
+targets. Round k relaxes every tile with the middle targets of block k, in three
+phases: the diagonal tile (k, k), then the tiles of row and column k, which only
+depend on it, then all the others, which only depend on row and column k. Tiles
+of the same phase are independent, so they are split among worker processes,
+which relax them in place in two `multiprocessing.shared_memory` buffers: the
+differences and, for each (i, j), the target before j on the path from i.
+
+Like `Allocator._floyd_warshall`, the search stops as soon as a round leaves a
+negative difference on the diagonal, and the cycle is read from the predecessors.
+Since the round goes on relaxing after a negative cycle appears, and zero
+differences make ties, the predecessors may hold no negative cycle (a few
+searches in a hundred). The cycle is then found by a vectorized Bellman - Ford
+from a target with a negative difference on the diagonal, which usually stops
+after a few passes over the matrix.
+
+Splitting the matrix in tiles only pays off with several processes: a round
+relaxes every tile once, like the serial search, but in more and smaller NumPy
+operations. The Allocator uses the serial search for a single worker, for exact
+weights and for matrices of a single block, so at least a few hundred targets
+and as many processes as CPUs are needed to gain anything.
+'''
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+
+
+BLOCK_SIZE = 128
+# elements of the temporary (rows, middles, columns) sums of a tile product
+PRODUCT_SIZE = 2 ** 20
+
+Tile = Tuple[int, int]
+
+# arrays of the worker processes, attached to the shared buffers by `_attach`
+_arrays: Dict[str, np.ndarray] = dict()
+_buffers: List[shared_memory.SharedMemory] = []
+
+
+def _attach(names: Tuple[str, ...], size: int) -> None:
+    _buffers.clear()
+    for key, name, dtype in (('diff', names[0], np.float64), ('pred', names[1], np.int32)):
+        # workers share the resource tracker of the parent process, which unlinks the buffers
+        buffer = shared_memory.SharedMemory(name=name)
+        _buffers.append(buffer)
+        _arrays[key] = np.ndarray((size, size), dtype=dtype, buffer=buffer.buf)
+
+
+def _block(k: int, size: int, block_size: int) -> slice:
+    return slice(k * block_size, min((k + 1) * block_size, size))
+
+
+def relax_in_order(diff: np.ndarray, pred: np.ndarray, rows: slice, cols: slice, middles: slice) -> None:
+    '''Relaxes tile (rows, cols) with each middle target in turn, for tiles containing them'''
+    tile, tile_pred = diff[rows, cols], pred[rows, cols]
+    for m in range(middles.start, middles.stop):
+        through = diff[rows, m][:, None] + diff[m, cols][None, :]
+        r, c = np.nonzero(through < tile)
+        if len(r):
+            tile[r, c] = through[r, c]
+            tile_pred[r, c] = pred[m, cols][c]
+
+
+def relax_product(diff: np.ndarray, pred: np.ndarray, rows: slice, cols: slice, middles: slice) -> None:
+    '''Relaxes tile (rows, cols) with the min-plus product of its tiles in the columns and
+    the rows of `middles`, which must be final'''
+    tile, tile_pred = diff[rows, cols], pred[rows, cols]
+    height, width = tile.shape
+    step = max(1, PRODUCT_SIZE // max(1, height * width))
+    for start in range(middles.start, middles.stop, step):
+        stop = min(start + step, middles.stop)
+        through = diff[rows, start:stop][:, :, None] + diff[start:stop, cols][None, :, :]
+        best = through.argmin(axis=1)
+        values = np.take_along_axis(through, best[:, None, :], axis=1)[:, 0, :]
+        r, c = np.nonzero(values < tile)
+        if len(r):
+            tile[r, c] = values[r, c]
+            tile_pred[r, c] = pred[start + best[r, c], cols.start + c]
+
+
+def _relax_tiles(k: int, tiles: Sequence[Tile], product: bool, block_size: int) -> None:
+    diff, pred = _arrays['diff'], _arrays['pred']
+    size = len(diff)
+    relax = relax_product if product else relax_in_order
+    middles = _block(k, size, block_size)
+    for i, j in tiles:
+        relax(diff, pred, _block(i, size, block_size), _block(j, size, block_size), middles)
+
+
+def bellman_ford_cycle(diff: np.ndarray, start: int) -> List[int]:
+    '''Returns a negative cycle of `diff` reachable from `start`, a list of targets each
+    one moving to the next, read from the parents of the shortest paths from `start`,
+    or an empty list if none was found within len(diff) passes'''
+    size = len(diff)
+    diff = diff.copy()
+    np.fill_diagonal(diff, np.inf)
+    dist = np.full(size, np.inf)
+    dist[start] = 0
+    parent = np.full(size, -1, dtype=np.int64)
+    columns = np.arange(size)
+    for _ in range(size):
+        through = dist[:, None] + diff
+        best = through.argmin(axis=0)
+        values = through[best, columns]
+        improved = values < dist
+        if not improved.any():
+            return []
+        dist[improved] = values[improved]
+        parent[improved] = best[improved]
+        for cycle in _parent_cycles(parent, np.flatnonzero(improved).tolist()):
+            if sum(diff[cycle[k - 1], cycle[k]] for k in range(len(cycle))) < 0:
+                return cycle
+    return []
+
+
+def _parent_cycles(parent: np.ndarray, starts: List[int]) -> Iterator[List[int]]:
+    '''Yields the cycles of the `parent` pointers reached from `starts`, in the direction of the moves'''
+    seen: Dict[int, int] = dict()
+    for start in starts:
+        node = start
+        walk: List[int] = []
+        while node >= 0 and node not in seen:
+            seen[node] = start
+            walk.append(node)
+            node = int(parent[node])
+        if node >= 0 and seen[node] == start:
+            yield walk[walk.index(node):][::-1]
+
+
+class BlockedFloydWarshall:
+    '''Runs blocked Floyd - Warshall on float64 matrices with `workers` processes
+    (as many as CPUs if None) and tiles of `block_size` targets (BLOCK_SIZE if None).
+    With one worker, tiles are relaxed in this process.
+    Buffers and processes are kept between searches, until `close`.
+    '''
+
+    def __init__(self, workers: Optional[int] = None, block_size: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size or BLOCK_SIZE
+        self.size = 0
+        self.diff = np.zeros((0, 0))
+        self.pred = np.zeros((0, 0), dtype=np.int32)
+        self._buffers: List[shared_memory.SharedMemory] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _allocate(self, size: int) -> None:
+        self.close()
+        self.size = size
+        if self.workers == 1:
+            self.diff = np.empty((size, size))
+            self.pred = np.empty((size, size), dtype=np.int32)
+            return
+        for dtype in (np.float64, np.int32):
+            nbytes = max(1, size * size * np.dtype(dtype).itemsize)
+            self._buffers.append(shared_memory.SharedMemory(create=True, size=nbytes))
+        self.diff = np.ndarray((size, size), dtype=np.float64, buffer=self._buffers[0].buf)
+        self.pred = np.ndarray((size, size), dtype=np.int32, buffer=self._buffers[1].buf)
+        self._executor = ProcessPoolExecutor(self.workers, initializer=_attach,
+                                             initargs=(tuple(b.name for b in self._buffers), size))
+
+    def load(self, diff: np.ndarray) -> None:
+        '''Copies the one-move differences `diff` to the buffers'''
+        if len(diff) != self.size:
+            self._allocate(len(diff))
+        self.diff[:] = diff
+        # moves from a target to itself can only make cycles of zero difference
+        np.fill_diagonal(self.diff, np.inf)
+        self.pred[:] = np.where(np.isfinite(self.diff), np.arange(self.size, dtype=np.int32)[:, None], -1)
+
+    def _run(self, k: int, tiles: List[Tile], product: bool) -> None:
+        if self._executor is None:
+            relax = relax_product if product else relax_in_order
+            middles = _block(k, self.size, self.block_size)
+            for i, j in tiles:
+                relax(self.diff, self.pred, _block(i, self.size, self.block_size),
+                      _block(j, self.size, self.block_size), middles)
+            return
+        chunks = [tiles[w::self.workers] for w in range(self.workers)]
+        list(self._executor.map(_relax_tiles, [k] * len(chunks), chunks, [product] * len(chunks),
+                                [self.block_size] * len(chunks)))
+
+    def rounds(self) -> Iterator[int]:
+        '''Relaxes the loaded matrix, yielding the index of each block of middle targets once done'''
+        blocks = -(-self.size // self.block_size)
+        for k in range(blocks):
+            self._run(k, [(k, k)], False)
+            self._run(k, [(k, j) for j in range(blocks) if j != k] + [(i, k) for i in range(blocks) if i != k],
+                      False)
+            self._run(k, [(i, j) for i in range(blocks) for j in range(blocks) if i != k and j != k], True)
+            yield k
+
+    def search(self, diff: np.ndarray, most_negative: bool = False,
+               check: Optional[Callable[[], None]] = None) -> Optional[List[int]]:
+        '''Returns a negative cycle of `diff`, a list of targets each one moving to the next, read
+        from the predecessors of the targets with a negative difference on the diagonal after the
+        first round leaving one: the first one or, if most_negative, the lowest. If the predecessors
+        hold none, the cycle is found with `bellman_ford_cycle`. Returns None if there is no
+        negative cycle, and an empty list if none could be found.
+        `check` is called after each round.'''
+        self.load(diff)
+        for _ in self.rounds():
+            if check is not None:
+                check()
+            diagonal = np.diagonal(self.diff)
+            negative = np.flatnonzero(diagonal < 0)
+            if not len(negative):
+                continue
+            found: List[int] = []
+            lowest = 0.
+            for i in negative.tolist():
+                cycle = self.cycle(i)
+                weight = sum(diff[cycle[k - 1], cycle[k]] for k in range(len(cycle)))
+                if weight < lowest:
+                    found, lowest = cycle, weight
+                    if not most_negative:
+                        break
+            return found or bellman_ford_cycle(diff, int(negative[0]))
+        return None
+
+    def cycle(self, i: int) -> List[int]:
+        '''Returns the cycle found by following the predecessors on the paths from `i`,
+        backwards from `i`, or an empty list if they don't lead to one'''
+        row = self.pred[i]
+        position = {i: 0}
+        walk = [i]
+        node = int(row[i])
+        while node >= 0 and node not in position:
+            position[node] = len(walk)
+            walk.append(node)
+            node = int(row[node])
+        if node < 0:
+            return []
+        return walk[position[node]:][::-1]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.diff = np.zeros((0, 0))
+        self.pred = np.zeros((0, 0), dtype=np.int32)
+        for buffer in self._buffers:
+            buffer.close()
+            buffer.unlink()
+        self._buffers = []
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
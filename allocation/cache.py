@@ -0,0 +1,153 @@
+'''Keeps the solved allocations of problems in a directory, by content.
+
+A problem is keyed by the sha256 of its canonical form: the instances of the
+sources, the capacities of the targets, the weights of the (source, target)
+pairs, each line sorted so that the order of the sources, targets or weights
+does not matter, and the `limit_denominator` and `weight_scale` of the
+Allocator. Its optimal allocation is pickled, together with its potentials,
+in `<key>.pickle`.
+
+A hit refreshes the modification time of its file, and files are removed
+from the least recently used while the directory holds more than `max_bytes`.
+Files are written to a temporary name and then renamed, so that processes
+sharing the directory never read a partial one.
+
+Before a hit is returned, `verify` checks in one pass over the weights that
+the allocation is still feasible and optimal, unless it is trusted.
+'''
+from typing import Any, Callable, Dict, Optional, Tuple
+from pathlib import Path
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+from .allocating import Allocation, Allocator, SolveStats, TargetObject, _to_python
+from .certificate import verify
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = 2 ** 28
+VERSION = 1
+
+
+def default_directory() -> Path:
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'allocation'
+
+
+def problem_key(allocator: Allocator) -> str:
+    '''Returns the sha256 of the canonical form of the problem of `allocator`'''
+    lines = [repr(('source', s, k)) for s, k in allocator.sources.instances.items() if s is not None]
+    lines.extend(repr(('target', t, k)) for t, k in allocator.targets.capacities.items() if t is not None)
+    wmap = allocator.sources.wmap
+    for s in allocator.sources.collection:
+        if s is None:
+            continue
+        row: Dict[Optional[TargetObject], Any] = dict()
+        for stw in wmap[s]:
+            if stw['to'] is not None and stw['weight'] is not None:
+                row.setdefault(stw['to'], _to_python(stw['weight']))
+        lines.extend(repr(('weight', s, t, w)) for t, w in row.items())
+    lines.sort()
+    lines.append(repr(('limit_denominator', allocator.limit_denominator, 'weight_scale', allocator.weight_scale)))
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode())
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    '''Optimal allocations kept in `directory`, which holds at most `max_bytes` of them.
+    `hits` and `misses` count the lookups of this instance.'''
+
+    def __init__(self, directory, max_bytes: int = MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}.pickle'
+
+    def get(self, key: str) -> Optional[Tuple[Allocation, Dict]]:
+        '''Returns the allocation and the potentials cached for `key`, or None'''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as infile:
+                entry = pickle.load(infile)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning('ignoring unreadable cache entry %s: %s', path, e)
+            return None
+        if entry.get('version') != VERSION:
+            return None
+        allocation = Allocation()
+        for s, t, count in entry['pairs']:
+            allocation.add(s, t, count)
+        return allocation, entry['potentials']
+
+    def put(self, key: str, allocation: Allocation, potentials: Dict) -> None:
+        '''Caches `allocation` and its `potentials` for `key`, then evicts the least recently used entries'''
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = {'version': VERSION, 'pairs': list(allocation.pairs()), 'potentials': potentials}
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as outfile:
+                pickle.dump(entry, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self) -> int:
+        '''Removes the least recently used entries beyond `max_bytes`. Returns how many were removed'''
+        entries = []
+        for path in self.directory.glob('*.pickle'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def get_best(self, allocator: Allocator, trust: bool = False, solve: Callable = Allocator.get_best,
+                 **kwargs) -> Allocation:
+        '''Returns the cached allocation of the problem of `allocator`, verified unless `trust`,
+        or else solves it with `solve(allocator, **kwargs)`, `allocator.get_best` by default,
+        and caches the result if it is optimal.
+        On a hit, `allocator.stats` only holds the objective, and `stopped` is 'cached'.'''
+        key = problem_key(allocator)
+        entry = self.get(key)
+        if entry is not None:
+            allocation, potentials = entry
+            if trust or verify(allocator, allocation, potentials):
+                self.hits += 1
+                logger.info('cache hit %s', key)
+                allocator.stats = SolveStats(allocator.objective(allocation))
+                allocator.stats.optimal = True
+                allocator.stats.stopped = 'cached'
+                return allocation
+            logger.warning('cached allocation %s is not optimal, solving again', key)
+        self.misses += 1
+        logger.info('cache miss %s', key)
+        allocation, stats, potentials = solve(allocator, return_stats=True, return_potentials=True, **kwargs)
+        if stats.optimal:
+            self.put(key, allocation, potentials)
+        return allocation
+
+    def __str__(self):
+        return f'cache: {self.hits} hits, {self.misses} misses'
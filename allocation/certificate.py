@@ -0,0 +1,76 @@
+'''Checks that an allocation is optimal without solving the problem again.
+
+An allocation is optimal when no cycle of moves between targets lowers the
+total weight. Given a potential for each target, as returned by
+`Allocator.potentials` or `get_best(return_potentials=True)`, it is enough
+that every single move has a non negative reduced cost: for an object of
+source s allocated to t0 and a target t it could still be allocated to,
+
+    weight(s, t) - weight(s, t0) + potential[t0] - potential[t] >= 0
+
+since the potentials cancel out around any cycle. For each source, the worst
+move goes from the target minimizing potential[t0] - weight(s, t0) to the one
+minimizing weight(s, t) - potential[t], so the check reads each row of the
+weight map once, like the feasibility checks.
+'''
+from typing import Any, Dict, Iterator, Optional
+import logging
+
+from .allocating import Allocation, Allocator, TargetObject
+
+
+logger = logging.getLogger(__name__)
+
+
+def violations(allocator: Allocator, allocation: Allocation,
+               potentials: Dict[Optional[TargetObject], Any]) -> Iterator[str]:
+    '''Yields why `allocation` is not a feasible allocation of `allocator`, or why
+    `potentials` do not prove it optimal'''
+    instances = allocator.sources.instances
+    capacities = allocator.targets.capacities
+    for s, k in instances.items():
+        allocated = sum(allocation.by_source.get(s, {}).values())
+        if allocated != k:
+            yield f'source {s} has {allocated} slots instead of {k}'
+    for t, k in capacities.items():
+        allocated = sum(allocation.at(t).values())
+        if allocated != k:
+            yield f'target {t} has {allocated} slots instead of {k}'
+    for s in allocation.by_source.keys() - instances.keys():
+        yield f'unknown source {s}'
+    for t in allocation.by_target.keys() - capacities.keys():
+        yield f'unknown target {t}'
+    for t in capacities.keys() - potentials.keys():
+        yield f'no potential for target {t}'
+
+    tolerance = allocator.tolerance()
+    for s, targets in allocation.by_source.items():
+        if s not in instances:
+            continue
+        row: dict = dict()
+        for stw in allocator.sources.wmap[s]:
+            if stw['to'] in capacities:
+                row.setdefault(stw['to'], stw['weight'])
+        leaving = None
+        for t0, count in targets.items():
+            if t0 not in row:
+                yield f'({s}, {t0}) has no weight'
+                continue
+            if s is not None and t0 is not None and count > allocator.pair_limit(s, t0):
+                yield f'({s}, {t0}) is allocated {count} times'
+            if t0 in potentials and (leaving is None or potentials[t0] - row[t0] < leaving):
+                leaving = potentials[t0] - row[t0]
+        # unallocated slots and targets can be used any number of times
+        entering = min((weight - potentials[t] for t, weight in row.items() if t in potentials and (
+                            s is None or t is None or targets.get(t, 0) < allocator.pair_limit(s, t))),
+                       default=None)
+        if leaving is not None and entering is not None and leaving + entering < -tolerance:
+            yield f'moving {s} has a negative reduced cost {leaving + entering}'
+
+
+def verify(allocator: Allocator, allocation: Allocation, potentials: Dict[Optional[TargetObject], Any]) -> bool:
+    '''Returns whether `allocation` is a feasible allocation of `allocator`, proven optimal by `potentials`'''
+    for violation in violations(allocator, allocation, potentials):
+        logger.info('allocation not verified: %s', violation)
+        return False
+    return True
@@ -0,0 +1,72 @@
+'''Command line arguments of the allocate script.
+
+They are parsed apart from `main`, which imports the solver, so that the
+client of a server started with --serve only imports the standard library.
+'''
+from argparse import ArgumentParser
+from pathlib import Path
+
+
+def parse(argv=None):
+    parser = ArgumentParser()
+    problem = parser.add_mutually_exclusive_group(required=True)
+    problem.add_argument('-a', '--allocate',
+                         help='yaml file, or directory saved with --save-problem, with resources to allocate')
+    problem.add_argument('--batch',
+                         help='directory or glob of yaml files to allocate')
+    problem.add_argument('--serve', action='store_true',
+                         help='solve the problems sent to --socket until interrupted')
+    problem.add_argument('--server-stats', action='store_true',
+                         help='print the statistics of the server listening on --socket')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='number of processes for --batch, --serve or --components (default: number of CPUs)')
+    parser.add_argument('--timeout', type=float,
+                        help='seconds allowed to solve each problem of --batch or --serve')
+    parser.add_argument('--socket', type=Path,
+                        help='unix socket of --serve; with --allocate, the problem is sent to the server '
+                             'listening there')
+    parser.add_argument('--max-pending', type=int,
+                        help='problems --serve accepts at once, solving or waiting (default: 4 per process)')
+    parser.add_argument('--out-dir', type=Path,
+                        help='directory for the --batch results (default: next to each problem)')
+    parser.add_argument('-w', '--weights',
+                        help='source,target,weight edge list to use instead of the weights in the yaml file')
+    parser.add_argument('--weights-format', choices=('csv', 'tsv'),
+                        help='format of --weights (default: by file extension)')
+    parser.add_argument('--save-problem', type=Path,
+                        help='directory where to save the --allocate problem in binary format')
+    parser.add_argument('--deadline', type=float,
+                        help='seconds after which --allocate returns the best allocation found so far')
+    parser.add_argument('--max-iterations', type=int,
+                        help='maximum number of rotations for --allocate')
+    parser.add_argument('--prune', type=int,
+                        help='start --allocate with this number of cheapest targets per source')
+    parser.add_argument('--init', choices=('empty', 'greedy', 'regret'), default='empty',
+                        help='initial allocation of --allocate')
+    parser.add_argument('--cycle-finder', choices=('floyd_warshall', 'blocked_floyd_warshall', 'spfa'),
+                        default='floyd_warshall', help='negative cycle search of --allocate')
+    parser.add_argument('--workers', type=int,
+                        help='number of processes of --cycle-finder blocked_floyd_warshall (default: number of CPUs)')
+    parser.add_argument('--symmetry', action='store_true',
+                        help='merge interchangeable sources and targets of --allocate before solving')
+    parser.add_argument('--components', action='store_true',
+                        help='solve the independent parts of the --allocate problem apart, in --jobs processes')
+    parser.add_argument('--cache', action='store_true',
+                        help='read and write the optimal allocations in a cache directory, '
+                             'by default $XDG_CACHE_HOME/allocation or ~/.cache/allocation')
+    parser.add_argument('--cache-dir', type=Path,
+                        help='directory of the cached allocations, which implies --cache')
+    parser.add_argument('--cache-size', type=float, default=256,
+                        help='megabytes of cached allocations kept in --cache-dir')
+    parser.add_argument('--trust-cache', action='store_true',
+                        help='use cached allocations without verifying that they are still optimal')
+    parser.add_argument('--stats', action='store_true',
+                        help='print statistics of the solve')
+    parser.add_argument('--out', choices=('empty', 'term'), default='term',
+                        help='type of output')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='be (more) verbose')
+    args = parser.parse_args(argv)
+    if (args.serve or args.server_stats) and args.socket is None:
+        parser.error('--serve and --server-stats need a --socket')
+    return args
@@ -0,0 +1,51 @@
+'''Sends the --allocate problem to a server started with --serve.
+
+Only the standard library is imported, so that a call does not pay for
+importing the solver; the server reads the problem files itself.
+'''
+from pathlib import Path
+import json
+import socket
+import sys
+
+
+def request(path, message: dict, timeout=None) -> dict:
+    '''Sends `message` to the server listening on the unix socket `path` and returns its answer'''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(str(path))
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        with connection.makefile('rb') as answers:
+            line = answers.readline()
+    if not line:
+        raise ConnectionError(f'no answer from {path}')
+    return json.loads(line)
+
+
+def solve_message(args) -> dict:
+    '''Returns the request solving the --allocate problem with the options of `args`'''
+    options = {'deadline': args.deadline, 'max_iterations': args.max_iterations, 'prune': args.prune,
+               'init': args.init, 'cycle_finder': args.cycle_finder, 'workers': args.workers,
+               'symmetry': args.symmetry}
+    message = {'op': 'solve', 'path': str(Path(args.allocate).resolve()), 'options': options}
+    if args.weights:
+        message.update(weights=str(Path(args.weights).resolve()), weights_format=args.weights_format)
+    return message
+
+
+def main(args) -> int:
+    if args.server_stats:
+        print(json.dumps(request(args.socket, {'op': 'stats'}), indent=1))
+        return 0
+    answer = request(args.socket, solve_message(args))
+    if answer['status'] != 'ok':
+        print(f"{answer['status']}: {answer.get('error')}", file=sys.stderr)
+        return 1
+    if args.out == 'term':
+        print(', '.join(f'{s} -> {t}' for s, t, count in answer['allocation'] for _ in range(count)))
+    if args.stats:
+        stats = answer['stats']
+        print(f"stopped: {stats['stopped']}, optimal: {stats['optimal']}, iterations: {stats['iterations']}\n"
+              f"weight: {answer['weight']}, cache: {answer['cache']}\n"
+              + ', '.join(f'{k}: {v:.3f}s' for k, v in answer['seconds'].items()))
+    return 0
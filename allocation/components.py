@@ -0,0 +1,130 @@
+'''Splits an allocation problem into independent sub-problems.
+
+Two sources are in the same component if they are linked by a chain of
+real (source, target) weights; the None source and target, which link
+everything, are not taken into account. Each component is solved by its
+own Allocator, possibly in parallel, and the results are merged.
+'''
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import logging
+
+from .allocating import (Allocation, Allocator, ArrayWeightedMap, SolveStats,
+                         SourceObject, TargetObject)
+
+
+logger = logging.getLogger(__name__)
+
+Component = Tuple[Dict[Optional[SourceObject], int],
+                  Tuple[list, list, list],
+                  Dict[Optional[TargetObject], int]]
+
+
+class _DisjointSets:
+
+    def __init__(self):
+        self.parent: Dict = dict()
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y) -> None:
+        self.parent[self.find(x)] = self.find(y)
+
+
+def split(allocator: Allocator) -> Tuple[List[Component], Allocation]:
+    '''Returns the components of the problem with at least one weight,
+    and the allocation of the sources and targets that have none,
+    which can only be left unallocated.
+    '''
+    instances = {s: k for s, k in allocator.sources.instances.items() if s is not None and k > 0}
+    capacities = {t: k for t, k in allocator.targets.capacities.items() if t is not None and k > 0}
+
+    sets = _DisjointSets()
+    edges = []
+    for s in instances:
+        for stw in allocator.sources.wmap[s]:
+            if stw['to'] in capacities:
+                sets.union(('source', s), ('target', stw['to']))
+                edges.append((s, stw['to'], stw['weight']))
+
+    components: Dict = dict()
+    for s, t, w in edges:
+        _, nodes, _ = components.setdefault(sets.find(('source', s)), ({}, ([], [], []), {}))
+        nodes[0].append(s)
+        nodes[1].append(t)
+        nodes[2].append(w)
+
+    isolated = Allocation()
+    for s, k in instances.items():
+        if ('source', s) in sets.parent:
+            components[sets.find(('source', s))][0][s] = k
+        else:
+            isolated.add(s, None, k)
+    for t, k in capacities.items():
+        if ('target', t) in sets.parent:
+            components[sets.find(('target', t))][2][t] = k
+        else:
+            isolated.add(None, t, k)
+
+    return sorted(components.values(), key=lambda c: len(c[2]), reverse=True), isolated
+
+
+def _solve(component: Component, conversion: Tuple, kwargs) -> Tuple[Allocation, SolveStats]:
+    sources, nodes, targets = component
+    allocator = Allocator(sources, ArrayWeightedMap.from_arrays(*nodes), targets)
+    # the weights were already converted by the original allocator
+    allocator.limit_denominator, allocator.weight_scale = conversion
+    return allocator.get_best(return_stats=True, **kwargs)
+
+
+def _merge_stats(results: List[Tuple[Allocation, SolveStats]]) -> SolveStats:
+    '''Returns the stats of the components as if they were solved one after the other'''
+    stats = SolveStats(sum(s.objectives[0] for _, s in results))
+    stats.optimal = all(s.optimal for _, s in results)
+    stats.stopped = next((s.stopped for _, s in results if s.stopped != 'optimal'), 'optimal')
+    for _, component in results:
+        start = stats.objective
+        stats.iterations += component.iterations
+        stats.cycle_lengths += component.cycle_lengths
+        stats.diffs += component.diffs
+        stats.objectives += [start + objective - component.objectives[0] for objective in component.objectives[1:]]
+        for step, seconds in component.seconds.items():
+            stats.seconds[step] += seconds
+        stats.pruned += component.pruned
+        stats.restored += component.restored
+        stats.merged_sources += component.merged_sources
+        stats.merged_targets += component.merged_targets
+    return stats
+
+
+def solve_by_components(allocator: Allocator, max_workers: Optional[int] = None,
+                        return_stats: bool = False, return_potentials: bool = False, **kwargs):
+    '''Returns an optimal allocation for `allocator`, solving each connected
+    component of the problem separately. Components are solved in a pool of
+    `max_workers` processes (as many as CPUs if None), or in this process
+    if max_workers is 1. Other arguments are passed to `Allocator.get_best`,
+    and the stats and potentials are returned as it does, for the whole problem;
+    the stats merge those of the components, as if they were solved in turn.
+    '''
+    components, allocation = split(allocator)
+    logger.info('solving %d components', len(components))
+
+    conversion = (allocator.limit_denominator, allocator.weight_scale)
+    if max_workers == 1 or len(components) <= 1:
+        results = [_solve(component, conversion, kwargs) for component in components]
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = list(executor.map(_solve, components, [conversion] * len(components),
+                                        [kwargs] * len(components)))
+
+    for result, _ in results:
+        for source, targets in result.by_source.items():
+            for target, count in targets.items():
+                allocation.add(source, target, count)
+    allocator.stats = _merge_stats(results)
+    return allocator._result(allocation, return_stats, return_potentials)
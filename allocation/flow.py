@@ -0,0 +1,123 @@
+'''Solves the allocation problem as a min-cost flow.
+
+The network has a super source feeding each source with its instances,
+an edge of capacity 1 (or `Allocator.pair_limit` for merged classes) from each
+source to each of its targets and an edge from each target to a sink with
+the target capacity. Since leaving a slot
+unallocated costs more than all the weights together, the optimal allocation
+is a maximum flow of minimum cost, which is found by successive shortest paths
+(Dijkstra with node potentials).
+'''
+from typing import Dict, List, Optional, Tuple
+import heapq
+import logging
+
+from .allocating import Allocation, Allocator, SourceObject, TargetObject
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Network:
+
+    def __init__(self, size: int):
+        # residual edges: [to, capacity, cost, index of the reverse edge]
+        self.edges: List[List[list]] = [[] for _ in range(size)]
+
+    def add_edge(self, frm: int, to: int, capacity: int, cost) -> None:
+        self.edges[frm].append([to, capacity, cost, len(self.edges[to])])
+        self.edges[to].append([frm, 0, -cost, len(self.edges[frm]) - 1])
+
+    def shortest_paths(self, root: int, potentials: list) -> Tuple[list, list]:
+        '''Dijkstra over reduced costs. Returns distances and, for each node,
+        the (node, edge index) it was reached from.
+        '''
+        inf = float('inf')
+        dist = [inf] * len(self.edges)
+        parent: List[Optional[Tuple[int, int]]] = [None] * len(self.edges)
+        dist[root] = 0
+        heap = [(0, root)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for idx, (to, capacity, cost, _) in enumerate(self.edges[node]):
+                if capacity <= 0:
+                    continue
+                nd = d + cost + potentials[node] - potentials[to]
+                if nd < dist[to]:
+                    dist[to] = nd
+                    parent[to] = (node, idx)
+                    heapq.heappush(heap, (nd, to))
+        return dist, parent
+
+
+def successive_shortest_paths(allocator: Allocator) -> Allocation:
+    '''Returns an optimal allocation for `allocator`, computed as a min-cost flow'''
+    instances = {s: k for s, k in allocator.sources.instances.items() if s is not None}
+    capacities = {t: k for t, k in allocator.targets.capacities.items() if t is not None}
+    sources: List[SourceObject] = list(instances)
+    targets: List[TargetObject] = list(capacities)
+    target_index = {t: len(sources) + 1 + i for i, t in enumerate(targets)}
+    root, sink = 0, len(sources) + len(targets) + 1
+
+    network = _Network(sink + 1)
+    potentials: list = [0] * (sink + 1)
+    inf = float('inf')
+    for t in targets:
+        potentials[target_index[t]] = inf
+
+    for i, s in enumerate(sources, 1):
+        network.add_edge(root, i, instances[s], 0)
+        seen = set()
+        for stw in allocator.sources.wmap[s]:
+            t = stw['to']
+            if t is None or t in seen or t not in capacities:
+                continue
+            seen.add(t)
+            network.add_edge(i, target_index[t], allocator.pair_limit(s, t), stw['weight'])
+            potentials[target_index[t]] = min(potentials[target_index[t]], stw['weight'])
+    for t in targets:
+        network.add_edge(target_index[t], sink, capacities[t], 0)
+    potentials[sink] = min((potentials[target_index[t]] for t in targets), default=0)
+    # nodes not reachable from the root never will be
+    potentials = [p if p < inf else 0 for p in potentials]
+
+    flow = 0
+    while True:
+        dist, parent = network.shortest_paths(root, potentials)
+        if dist[sink] == inf:
+            break
+        for node, d in enumerate(dist):
+            if d < inf:
+                potentials[node] += d
+
+        node = sink
+        while node != root:
+            frm, idx = parent[node]
+            edge = network.edges[frm][idx]
+            edge[1] -= 1
+            network.edges[node][edge[3]][1] += 1
+            node = frm
+        flow += 1
+        logger.debug('augmented flow to %d', flow)
+
+    allocation = Allocation()
+    allocated: Dict[Optional[TargetObject], int] = {t: 0 for t in targets}
+    for i, s in enumerate(sources, 1):
+        count = 0
+        for to, capacity, _, _ in network.edges[i]:
+            if to == root:
+                continue
+            # the flow through source -> target edges is the capacity they lost
+            t = targets[to - len(sources) - 1]
+            used = allocator.pair_limit(s, t) - capacity
+            allocation.add(s, t, used)
+            allocated[t] += used
+            count += used
+        allocation.extend([(s, None)] * (instances[s] - count))
+    for t in targets:
+        allocation.extend([(None, t)] * (capacities[t] - allocated[t]))
+    allocation.extend([(None, None)] * flow)
+
+    return allocation
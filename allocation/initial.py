@@ -0,0 +1,110 @@
+'''Builds feasible initial allocations for the cycles engine.
+
+Starting from the empty allocation, the cycles engine needs at least one
+rotation per allocated instance. These heuristics allocate most instances
+up front in O(E log E), E being the number of weights, so that the rotations
+only polish the allocation:
+
+- greedy takes the (source, target) pairs by increasing weight,
+- regret allocates first the sources that would lose the most by not getting
+  their best target, the loss being the difference with their second best
+  option, which may be to stay unallocated.
+
+Each (source, target) pair is allocated at most once, as in the cycles engine.
+'''
+from typing import Dict, List, Tuple
+import heapq
+
+from .allocating import Allocation, Allocator, SourceObject, TargetObject
+
+
+def _options(allocator: Allocator, source: SourceObject, capacities: Dict) -> List[Tuple]:
+    '''Returns the (weight, target) options of `source` by increasing weight,
+    ending with the option of staying unallocated'''
+    row: dict = dict()
+    for stw in allocator.sources.wmap[source]:
+        row.setdefault(stw['to'], stw['weight'])
+    unallocated = row.pop(None)
+    options = sorted(((w, t) for t, w in row.items() if capacities.get(t, 0) > 0), key=lambda wt: wt[0])
+    return [wt for wt in options if wt[0] < unallocated] + [(unallocated, None)]
+
+
+def _allocation(allocator: Allocator, allocated: List[Tuple[SourceObject, TargetObject]]) -> Allocation:
+    '''Completes the real `allocated` pairs with the unallocated slots'''
+    allocation = Allocation(allocated)
+    for s, k in allocator.sources.instances.items():
+        if s is not None:
+            allocation.add(s, None, k - sum(allocation.by_source.get(s, {}).values()))
+    for t, k in allocator.targets.capacities.items():
+        if t is not None:
+            allocation.add(None, t, k - sum(allocation.at(t).values()))
+    allocation.add(None, None, len(allocated))
+    return allocation
+
+
+def greedy(allocator: Allocator) -> Allocation:
+    '''Allocates the (source, target) pairs by increasing weight, while there are
+    instances of the source and capacity of the target left'''
+    instances = {s: k for s, k in allocator.sources.instances.items() if s is not None and k > 0}
+    capacities = {t: k for t, k in allocator.targets.capacities.items() if t is not None}
+    pairs = sorted(((w, s, t) for s in instances for w, t in _options(allocator, s, capacities) if t is not None),
+                   key=lambda wst: wst[0])
+
+    allocated = []
+    for _, s, t in pairs:
+        if instances[s] > 0 and capacities[t] > 0:
+            allocated.append((s, t))
+            instances[s] -= 1
+            capacities[t] -= 1
+    return _allocation(allocator, allocated)
+
+
+def regret(allocator: Allocator) -> Allocation:
+    '''Allocates first the sources with the largest difference between their best
+    and second best options that are still available, to their best one'''
+    instances = {s: k for s, k in allocator.sources.instances.items() if s is not None and k > 0}
+    capacities = {t: k for t, k in allocator.targets.capacities.items() if t is not None}
+    options = {s: _options(allocator, s, capacities) for s in instances}
+    # index of the first option of each source which may still be available
+    first = {s: 0 for s in instances}
+
+    def best_two(s):
+        opts = options[s]
+        while opts[first[s]][1] is not None and capacities[opts[first[s]][1]] == 0:
+            first[s] += 1
+        i = first[s]
+        if opts[i][1] is None:
+            return opts[i], None
+        j = i + 1
+        while opts[j][1] is not None and capacities[opts[j][1]] == 0:
+            j += 1
+        return opts[i], opts[j]
+
+    def push(heap, s):
+        best, second = best_two(s)
+        if second is not None:
+            heapq.heappush(heap, (best[0] - second[0], order[s], s))
+
+    order = {s: i for i, s in enumerate(instances)}
+    heap: List[Tuple] = []
+    for s in instances:
+        push(heap, s)
+
+    allocated = []
+    while heap:
+        loss, _, s = heapq.heappop(heap)
+        best, second = best_two(s)
+        if second is None:
+            continue
+        if best[0] - second[0] != loss:
+            # a target filled up since the regret was computed
+            push(heap, s)
+            continue
+        allocated.append((s, best[1]))
+        capacities[best[1]] -= 1
+        instances[s] -= 1
+        # the same pair can't be allocated twice
+        first[s] += 1
+        if instances[s] > 0:
+            push(heap, s)
+    return _allocation(allocator, allocated)
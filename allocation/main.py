@@ -1,41 +1,219 @@
-from argparse import ArgumentParser
+from typing import Optional
+from functools import lru_cache, partial
+from pathlib import Path
+import csv
 import logging
 import yaml
 
-from .allocating import ListWeightedMap, WeightedNode, Allocator, Allocation
+from .allocating import ArrayWeightedMap, Allocator, Allocation
+from .batch import find_problems, solve_files, summary
+from .cache import ResultCache, default_directory
+from .cli import parse
+from .components import solve_by_components
+from .storage import load_problem, save_problem
 
 logger = logging.getLogger(__name__)
 
 
-def parse():
-    parser = ArgumentParser()
-    parser.add_argument('-a', '--allocate', required=True,
-                        help='yaml file with resources to allocate')
-    parser.add_argument('--out', choices=('empty', 'term'), default='term',
-                        help='type of output')
-    parser.add_argument('-v', '--verbose', action='count', default=0,
-                        help='be (more) verbose')
-    args = parser.parse_args()
-    return args
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_resolver = yaml.resolver.Resolver()
+_constructor = yaml.constructor.SafeConstructor()
 
 
-def load_yaml(infile) -> Allocator:
-    # see https://github.com/yaml/pyyaml/issues/202
-    import warnings
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
+def _scalar(event):
+    return _construct(event.tag, event.value, event.implicit, event.style)
 
-        with open(infile) as yafile:
-            y = yaml.load(yafile)
 
-    wmap_list = [WeightedNode({'from': w[0], 'to': w[1], 'weight': w[2]})
-                 for w in y['weights']]
-    wmap = ListWeightedMap(wmap_list)
+@lru_cache(maxsize=2 ** 16)
+def _construct(tag, value, implicit, style):
+    # names are repeated all over the weights, so constructed scalars are cached
+    if tag is None or tag == '!':
+        tag = _resolver.resolve(yaml.ScalarNode, value, implicit)
+    node = yaml.ScalarNode(tag, value, style=style)
+    return _constructor.yaml_constructors[tag](_constructor, node)
+
+
+def _value(events, event, anchors: dict):
+    '''Builds the value that starts with `event`, resolving aliases with the values of `anchors`'''
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise ValueError(f'Unknown yaml anchor {event.anchor}')
+        return anchors[event.anchor]
+    if isinstance(event, yaml.ScalarEvent):
+        value = _scalar(event)
+    elif isinstance(event, yaml.SequenceStartEvent):
+        value = list(_records(events, anchors))
+    elif isinstance(event, yaml.MappingStartEvent):
+        value = {}
+        merged: dict = {}
+        for key in events:
+            if isinstance(key, yaml.MappingEndEvent):
+                break
+            if _is_merge(key):
+                merge = _value(events, next(events), anchors)
+                for other in reversed(merge) if isinstance(merge, list) else [merge]:
+                    merged.update(other)
+            else:
+                key = _value(events, key, anchors)
+                value[key] = _value(events, next(events), anchors)
+        value = {**merged, **value}
+    else:
+        raise ValueError(f'Unexpected yaml event {event}')
+    if event.anchor is not None:
+        anchors[event.anchor] = value
+    return value
+
+
+def _is_merge(event) -> bool:
+    '''Returns whether `event` is the plain << key of a merge'''
+    return isinstance(event, yaml.ScalarEvent) and event.value == '<<' and event.tag is None and event.implicit[0]
+
+
+def _records(events, anchors: dict):
+    '''Yields the values of a sequence, up to its end'''
+    for record in events:
+        if isinstance(record, yaml.SequenceEndEvent):
+            return
+        yield _value(events, record, anchors)
+
+
+def _weights(events, event, anchors: dict, sources: list, targets: list, weights: list) -> None:
+    '''Appends the [source, target, weight] records of the sequence that starts with `event`'''
+    if isinstance(event, yaml.SequenceStartEvent) and event.anchor is None:
+        records = _records(events, anchors)
+    else:
+        # an alias, or an anchored sequence which must be kept whole
+        records = _value(events, event, anchors)
+        if not isinstance(records, list):
+            raise ValueError(f'weights must be a sequence, got {event}')
+    for source, target, weight in records:
+        sources.append(source)
+        targets.append(target)
+        weights.append(weight)
+
+
+def _number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def load_weights(infile, sources, targets, delimiter=',') -> ArrayWeightedMap:
+    '''Loads a map from a source,target,weight edge list.
+    Names are matched to the (possibly non string) keys of `sources` and `targets`.
+    A header line is skipped.
+    '''
+    source_names = {str(s): s for s in sources}
+    target_names = {str(t): t for t in targets}
+    froms: list = []
+    tos: list = []
+    weights: list = []
+    with open(infile, newline='') as edges:
+        for i, (source, target, weight) in enumerate(csv.reader(edges, delimiter=delimiter)):
+            try:
+                weights.append(_number(weight))
+            except ValueError:
+                if i == 0:
+                    continue
+                raise
+            froms.append(source_names.get(source, source))
+            tos.append(target_names.get(target, target))
+    return ArrayWeightedMap.from_arrays(froms, tos, weights)
+
+
+def load_yaml(infile, weights=None, delimiter=None) -> Allocator:
+    '''Loads a problem from a yaml file with sources, targets and weights.
+    The weights are read as a stream of events, straight into an ArrayWeightedMap.
+    If `weights` is given, the weights are loaded from that edge list file instead,
+    with `delimiter` or, by default, tabs for .tsv files and commas otherwise.
+    '''
+    y = {}
+    anchors: dict = {}
+    froms: list = []
+    tos: list = []
+    values: list = []
+    with open(infile) as yafile:
+        events = yaml.parse(yafile, Loader=YamlLoader)
+        event = next(event for event in events
+                     if not isinstance(event, (yaml.StreamStartEvent, yaml.DocumentStartEvent)))
+        if not isinstance(event, yaml.MappingStartEvent):
+            raise ValueError(f'{infile} must hold a mapping of sources, targets and weights')
+        for key in events:
+            if isinstance(key, yaml.MappingEndEvent):
+                break
+            key = _value(events, key, anchors)
+            if key == 'weights' and weights is None:
+                _weights(events, next(events), anchors, froms, tos, values)
+            else:
+                y[key] = _value(events, next(events), anchors)
+
+    if weights is not None:
+        if delimiter is None:
+            delimiter = '\t' if Path(weights).suffix == '.tsv' else ','
+        wmap = load_weights(weights, y['sources'], y['targets'], delimiter)
+    else:
+        wmap = ArrayWeightedMap.from_arrays(froms, tos, values)
 
     return Allocator(y['sources'], wmap, y['targets'])
 
 
+def save_yaml(outfile, data) -> None:
+    with open(outfile, 'w') as out:
+        yaml.safe_dump(data, out)
+
+
+def load(infile, weights=None, delimiter=None) -> Allocator:
+    '''Loads a problem from a directory saved by `storage.save_problem`,
+    with its weights memory mapped, or else from a yaml file'''
+    if Path(infile).is_dir():
+        return Allocator(*load_problem(infile))
+    return load_yaml(infile, weights, delimiter)
+
+
+def result_cache(args) -> Optional[ResultCache]:
+    if not args.cache and args.cache_dir is None:
+        return None
+    return ResultCache(args.cache_dir or default_directory(), int(args.cache_size * 2 ** 20))
+
+
+def batch(args):
+    cache = result_cache(args)
+    reports = solve_files(find_problems(args.batch), args.jobs, args.timeout, args.out_dir,
+                          cache.directory if cache else None, cache.max_bytes if cache else None, args.trust_cache)
+    print(summary(reports))
+    return reports
+
+
+def serve(args):
+    from .server import serve
+    cache = result_cache(args)
+    serve(args.socket, workers=args.jobs, max_pending=args.max_pending, timeout=args.timeout,
+          cache_dir=cache.directory if cache else None, cache_bytes=cache.max_bytes if cache else None,
+          trust_cache=args.trust_cache)
+
+
 def main(args) -> Allocation:
-    allocator = load_yaml(args.allocate)
-    allocation = allocator.get_best()
+    if args.batch:
+        return batch(args)
+    if args.serve:
+        return serve(args)
+    delimiter = {'csv': ',', 'tsv': '\t', None: None}[args.weights_format]
+    allocator = load(args.allocate, args.weights, delimiter)
+    if args.save_problem:
+        save_problem(args.save_problem, allocator.sources.instances, allocator.sources.wmap,
+                     allocator.targets.capacities)
+    kwargs = dict(deadline=args.deadline, max_iterations=args.max_iterations, prune=args.prune, init=args.init,
+                  cycle_finder=args.cycle_finder, workers=args.workers, symmetry=args.symmetry)
+    solve = partial(solve_by_components, max_workers=args.jobs) if args.components else Allocator.get_best
+    cache = result_cache(args)
+    if cache is None:
+        allocation = solve(allocator, **kwargs)
+    else:
+        allocation = cache.get_best(allocator, trust=args.trust_cache, solve=solve, **kwargs)
+        logger.info('%s', cache)
+    if args.stats:
+        print(allocator.stats)
+        if cache is not None:
+            print(cache)
     return allocation
@@ -0,0 +1,249 @@
+'''Solves problems sent over a unix socket, in a pool of worker processes.
+
+Each line a client writes is a JSON request, answered by one JSON line:
+
+- {"op": "solve", "id": ..., "path": ..., "options": {...}} solves the problem
+  of a yaml file or of a directory saved with --save-problem, with the
+  edge list "weights" and "weights_format" if given. Instead of "path", a
+  "problem" can be sent inline as {"sources": [[name, instances], ...],
+  "targets": [[name, capacity], ...], "weights": [[source, target, weight], ...]},
+  pairs keeping the names that are not strings. The options are those of
+  `Allocator.get_best`: deadline, max_iterations, prune, init, cycle_finder,
+  workers and symmetry. The answer holds the "allocation" as
+  [source, target, count] lists, its "weight", the "stats" of the solve,
+  the "cache" lookup and the "seconds" spent waiting, solving and in total.
+- {"op": "stats"} returns the number of requests waiting for a worker and
+  being solved, the counts of answers by status, the latency percentiles
+  of the last LATENCY_WINDOW solves and the hits and misses of the cache.
+
+Requests of a connection are solved concurrently, and each answer repeats the
+"id" of its request. A deadline counts from the time the request is read, so
+the time spent waiting for a worker is taken from the solve. At most
+`max_pending` requests are accepted at once, the others are answered with the
+"busy" status. A solve taking longer than `timeout` seconds is answered with
+the "timeout" status, but it keeps its worker until it ends.
+'''
+from typing import Any, Deque, Dict, List, Optional, Set
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+
+from .allocating import Allocator, ArrayWeightedMap
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 1000
+# longest request line, for problems sent inline
+MAX_LINE = 2 ** 28
+PENDING_PER_WORKER = 4
+OPTIONS = ('deadline', 'max_iterations', 'prune', 'init', 'cycle_finder', 'workers', 'symmetry')
+
+
+def _problem(request: dict) -> Allocator:
+    if 'path' in request:
+        from .main import load
+        delimiter = {'csv': ',', 'tsv': '\t', None: None}[request.get('weights_format')]
+        return load(request['path'], request.get('weights'), delimiter)
+    problem = request['problem']
+    sources, targets = ({name: count for name, count in problem[key]} if isinstance(problem[key], list)
+                        else dict(problem[key]) for key in ('sources', 'targets'))
+    froms, tos, weights = zip(*problem['weights']) if problem['weights'] else ((), (), ())
+    return Allocator(sources, ArrayWeightedMap.from_arrays(froms, tos, weights), targets)
+
+
+def solve(request: dict, received: float, cache_dir: Optional[str] = None, cache_bytes: Optional[int] = None,
+          trust_cache: bool = False) -> dict:
+    '''Solves `request`, read at time.time() `received`, in a worker process'''
+    start = time.time()
+    options = {k: v for k, v in request.get('options', {}).items() if k in OPTIONS and v is not None}
+    if 'deadline' in options:
+        options['deadline'] = max(0., options['deadline'] - (start - received))
+    allocator = _problem(request)
+    answer: Dict[str, Any] = {'status': 'ok', 'cache': None}
+    if cache_dir is None:
+        allocation = allocator.get_best(**options)
+    else:
+        from .cache import MAX_BYTES, ResultCache
+        cache = ResultCache(cache_dir, cache_bytes or MAX_BYTES)
+        allocation = cache.get_best(allocator, trust=trust_cache, **options)
+        answer['cache'] = 'hit' if cache.hits else 'miss'
+    stats = allocator.stats
+    assert stats is not None
+    answer.update(allocation=[[s, t, count] for s, t, count in allocation.pairs() if s is not None and t is not None],
+                  weight=float(allocator.objective(allocation)),
+                  stats={'optimal': stats.optimal, 'stopped': stats.stopped, 'iterations': stats.iterations,
+                         'seconds': stats.seconds},
+                  seconds={'queue': start - received, 'solve': time.time() - start})
+    return answer
+
+
+def percentiles(values, qs=(50, 90, 99)) -> Dict[str, float]:
+    '''Returns the nearest rank percentiles `qs` of `values`, and their maximum'''
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    result = {f'p{q}': ordered[min(len(ordered) - 1, max(0, -(-q * len(ordered) // 100) - 1))] for q in qs}
+    result['max'] = ordered[-1]
+    return result
+
+
+class Server:
+    '''Listens on the unix socket `path`, solving with `workers` processes (as many as CPUs if None)'''
+
+    def __init__(self, path, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 timeout: Optional[float] = None, cache_dir=None, cache_bytes: Optional[int] = None,
+                 trust_cache: bool = False):
+        self.path = Path(path)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or PENDING_PER_WORKER * self.workers
+        self.timeout = timeout
+        self.cache_dir = str(cache_dir) if cache_dir is not None else None
+        self.cache_bytes = cache_bytes
+        self.trust_cache = trust_cache
+        self.waiting = 0
+        self.running = 0
+        self.answers: Dict[str, int] = dict()
+        self.cache = {'hits': 0, 'misses': 0}
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        # solves submitted to the executor and not done yet
+        self._futures: Set[asyncio.Future] = set()
+
+    async def start(self) -> None:
+        self._executor = ProcessPoolExecutor(self.workers)
+        self._slots = asyncio.Semaphore(self.workers)
+        if self.path.is_socket():
+            self.path.unlink()
+        self._server = await asyncio.start_unix_server(self._connection, path=str(self.path), limit=MAX_LINE)
+        logger.info('serving on %s with %d workers', self.path, self.workers)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        assert self._server is not None
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            # the solves which did not start are cancelled, the running ones end in their workers
+            for future in list(self._futures):
+                future.cancel()
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {'status': 'ok', 'waiting': self.waiting, 'running': self.running, 'workers': self.workers,
+                'answers': dict(self.answers), 'latency': percentiles(self.latencies), 'cache': dict(self.cache),
+                'uptime': time.time() - self.started}
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tasks: List[asyncio.Task] = []
+        lock = asyncio.Lock()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    tasks.append(asyncio.ensure_future(self._answer(line, writer, lock)))
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            # the server is closing; asyncio logs a cancelled connection task as an error
+            for task in tasks:
+                task.cancel()
+            logger.debug('connection closed with %d requests pending', sum(not task.done() for task in tasks))
+        finally:
+            writer.close()
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock) -> None:
+        received = time.time()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be an object')
+        except ValueError as e:
+            logger.error('invalid request: %s', e)
+            answer: Dict[str, Any] = self._count({'status': 'error', 'error': f'invalid request: {e}'})
+            request = {}
+        else:
+            answer = await self.handle(request, received)
+        if 'id' in request:
+            answer['id'] = request['id']
+        async with lock:
+            writer.write(json.dumps(answer, default=str).encode() + b'\n')
+            await writer.drain()
+
+    async def handle(self, request: dict, received: float) -> dict:
+        '''Returns the answer to `request`, read at time.time() `received`'''
+        op = request.get('op', 'solve')
+        if op == 'stats':
+            return self.stats()
+        if op != 'solve':
+            return self._count({'status': 'error', 'error': f'unknown op {op}'})
+        if self.waiting + self.running >= self.max_pending:
+            return self._count({'status': 'busy', 'error': f'{self.max_pending} problems pending'})
+
+        assert self._slots is not None
+        self.waiting += 1
+        await self._slots.acquire()
+        self.waiting -= 1
+        self.running += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, solve, request, received, self.cache_dir, self.cache_bytes,
+                                      self.trust_cache)
+        self._futures.add(future)
+        future.add_done_callback(self._release)
+        try:
+            answer = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            answer = {'status': 'timeout', 'error': f'took more than {self.timeout} seconds'}
+        except Exception as e:
+            logger.error('error solving request %s: %s: %s', request.get('id'), type(e).__name__, e)
+            answer = {'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+        if answer.get('cache') == 'hit':
+            self.cache['hits'] += 1
+        elif answer.get('cache') == 'miss':
+            self.cache['misses'] += 1
+        latency = time.time() - received
+        answer.setdefault('seconds', {})['total'] = latency
+        if answer['status'] == 'ok':
+            self.latencies.append(latency)
+        return self._count(answer)
+
+    def _release(self, future) -> None:
+        assert self._slots is not None
+        self._futures.discard(future)
+        self.running -= 1
+        self._slots.release()
+
+    def _count(self, answer: dict) -> dict:
+        self.answers[answer['status']] = self.answers.get(answer['status'], 0) + 1
+        return answer
+
+
+def serve(path, **kwargs) -> None:
+    '''Runs a Server on the unix socket `path` until interrupted'''
+    server = Server(path, **kwargs)
+    # stop on SIGTERM as on ctrl-C, removing the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,140 @@
+'''Saves problems and allocations in a compact binary format.
+
+A problem is a directory holding the name tables in `meta.json` and one
+`.npy` file per array: the instances of the sources, the capacities of the
+targets and the weights as CSR arrays (`offsets`, `target_ids`, `weights`).
+Arrays are loaded memory mapped, so that the processes solving the same
+problem share one copy of the weights; an ArrayWeightedMap pickled to a
+worker maps the files again instead of copying its arrays.
+
+An allocation is saved the same way, as source ids, target ids and counts.
+'''
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+import json
+
+import numpy as np
+
+from .allocating import Allocation, ArrayWeightedMap, SourceObject, TargetObject, WeightedMap
+
+
+FORMAT = 'allocation-problem'
+ALLOCATION_FORMAT = 'allocation-result'
+VERSION = 1
+
+PROBLEM_ARRAYS = ('instances', 'capacities', 'offsets', 'target_ids', 'weights')
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / 'meta.json', 'w') as outfile:
+        json.dump(meta, outfile)
+
+
+def _read_meta(path: Path, fmt: str) -> dict:
+    with open(path / 'meta.json') as infile:
+        meta = json.load(infile)
+    if meta.get('format') != fmt or meta.get('version') != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} {fmt}, got {meta.get('format')} {meta.get('version')}")
+    return meta
+
+
+def save_problem(path, sources: Dict[Optional[SourceObject], int], wmap: WeightedMap,
+                 targets: Dict[Optional[TargetObject], int]) -> None:
+    '''Saves the problem in directory `path`. Weights must be numbers.
+    Sources and targets of the weights which are not keys of `sources`
+    or `targets` are saved with -1 instances or capacity.
+    '''
+    path = Path(path)
+    source_names = [s for s in sources if s is not None]
+    target_names = [t for t in targets if t is not None]
+    source_ids = {s: i for i, s in enumerate(source_names)}
+    target_ids = {t: i for i, t in enumerate(target_names)}
+
+    def intern(ids, names, name) -> int:
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    rows: Dict[int, Dict[int, Any]] = dict()
+    for source in list(source_names) + [s for s in wmap.get_sources() if s not in source_ids and s is not None]:
+        sid = intern(source_ids, source_names, source)
+        for stw in wmap[source]:
+            if stw['to'] is None or stw['weight'] is None:
+                continue
+            if not isinstance(stw['weight'], (int, float, np.number)):
+                raise ValueError(f"Can't save weight {stw['weight']!r} of ({source}, {stw['to']}), must be a number")
+            rows.setdefault(sid, {}).setdefault(intern(target_ids, target_names, stw['to']), stw['weight'])
+
+    offsets = np.zeros(len(source_names) + 1, dtype=np.int64)
+    tids: List[int] = []
+    weights: list = []
+    for sid in range(len(source_names)):
+        row = sorted(rows.get(sid, {}).items())
+        tids.extend(t for t, _ in row)
+        weights.extend(w for _, w in row)
+        offsets[sid + 1] = len(tids)
+
+    arrays = {
+        'instances': np.array([sources.get(s, -1) for s in source_names], dtype=np.int64),
+        'capacities': np.array([targets.get(t, -1) for t in target_names], dtype=np.int64),
+        'offsets': offsets,
+        'target_ids': np.array(tids, dtype=np.int64),
+        'weights': np.array(weights, dtype=np.float64),
+    }
+    _write_meta(path, {'format': FORMAT, 'version': VERSION, 'sources': source_names, 'targets': target_names})
+    for name, array in arrays.items():
+        np.save(path / f'{name}.npy', array)
+
+
+def load_problem(path, mmap: bool = True) -> Tuple[Dict, ArrayWeightedMap, Dict]:
+    '''Returns the sources, the weighted map and the targets saved in `path`.
+    With `mmap`, the arrays of the map are memory mapped read only.
+    '''
+    path = Path(path)
+    meta = _read_meta(path, FORMAT)
+    arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r' if mmap else None) for name in PROBLEM_ARRAYS}
+
+    sources = {s: k for s, k in zip(meta['sources'], arrays['instances'].tolist()) if k >= 0}
+    targets = {t: k for t, k in zip(meta['targets'], arrays['capacities'].tolist()) if k >= 0}
+    files = {attr: str(path / f'{name}.npy')
+             for attr, name in (('offsets', 'offsets'), ('target_ids_array', 'target_ids'), ('weights', 'weights'))
+             } if mmap else None
+    wmap = ArrayWeightedMap.from_csr(meta['sources'], meta['targets'], arrays['offsets'],
+                                     arrays['target_ids'], arrays['weights'], files)
+    return sources, wmap, targets
+
+
+def save_allocation(path, allocation: Allocation) -> None:
+    '''Saves `allocation` in directory `path`, as (source, target, count) arrays'''
+    path = Path(path)
+    source_ids: Dict = dict()
+    target_ids: Dict = dict()
+    sids, tids, counts = [], [], []
+    for source, row in allocation.by_source.items():
+        for target, count in row.items():
+            if count <= 0:
+                continue
+            sids.append(source_ids.setdefault(source, len(source_ids)))
+            tids.append(target_ids.setdefault(target, len(target_ids)))
+            counts.append(count)
+    sources = list(source_ids)
+    targets = list(target_ids)
+
+    _write_meta(path, {'format': ALLOCATION_FORMAT, 'version': VERSION, 'sources': sources, 'targets': targets})
+    np.save(path / 'source_ids.npy', np.array(sids, dtype=np.int64))
+    np.save(path / 'target_ids.npy', np.array(tids, dtype=np.int64))
+    np.save(path / 'counts.npy', np.array(counts, dtype=np.int64))
+
+
+def load_allocation(path) -> Allocation:
+    '''Returns the allocation saved in `path`'''
+    path = Path(path)
+    meta = _read_meta(path, ALLOCATION_FORMAT)
+    sids, tids, counts = (np.load(path / f'{name}.npy', mmap_mode='r').tolist()
+                          for name in ('source_ids', 'target_ids', 'counts'))
+    allocation = Allocation()
+    for sid, tid, count in zip(sids, tids, counts):
+        allocation.add(meta['sources'][sid], meta['targets'][tid], count)
+    return allocation
@@ -0,0 +1,125 @@
+'''Merges interchangeable sources and targets before solving.
+
+Sources with the same number of instances and the same weight for each target,
+such as several seats of the same type, are interchangeable, and so are targets
+with the same capacity and the same weight from each source. Each class of
+them is replaced by one of its members, its representative, with the instances
+or capacity of the whole class, so that the engines scan one row and keep one
+set of slots per class.
+
+As each (source, target) pair is allocated at most once, the pair of a class of
+`m` sources and a class of `n` targets can be allocated up to `m * n` times,
+which the engines read from `Allocator.pair_limit`. Any allocation of the
+reduced problem is then dealt back to the members, target classes first, each
+member taking the next unit in turn: since a class gets at most `m * n` units of
+a pair and all its members have the same instances or capacity, no member gets
+a pair twice or more than its instances or capacity, and the objective is kept.
+'''
+from typing import Dict, Hashable, List, Optional, Tuple
+import itertools
+
+from .allocating import (Allocation, Allocator, ArrayWeightedMap, DictWeightedMap, ListWeightedMap,
+                         SourceObject, TargetObject, WeightedNode)
+
+
+def _classes(keys: Dict) -> Dict:
+    '''Groups the objects of `keys` by key. Returns the members of each class by representative'''
+    classes: Dict[Hashable, List] = dict()
+    for obj, key in keys.items():
+        classes.setdefault(key, []).append(obj)
+    return {members[0]: members for members in classes.values()}
+
+
+def _deal(units: List, members: List) -> List[Tuple]:
+    '''Deals `units` to `members` in turn, returning (member, unit) pairs'''
+    return list(zip(itertools.cycle(members), units))
+
+
+class Reduction:
+    '''The reduced problem of an Allocator, with the members of its source and target classes'''
+
+    def __init__(self, allocator: Allocator, sources: Dict[SourceObject, List[SourceObject]],
+                 targets: Dict[TargetObject, List[TargetObject]]):
+        self.original = allocator
+        self.sources = sources
+        self.targets = targets
+        self.allocator = self._reduced()
+
+    @property
+    def merged_sources(self) -> int:
+        return sum(len(members) - 1 for members in self.sources.values())
+
+    @property
+    def merged_targets(self) -> int:
+        return sum(len(members) - 1 for members in self.targets.values())
+
+    def _reduced(self) -> Allocator:
+        original = self.original
+        wmap = original.sources.wmap
+        nodes: List[WeightedNode] = [{'from': s, 'to': stw['to'], 'weight': stw['weight']}
+                                     for s in self.sources for stw in wmap[s] if stw['to'] in self.targets]
+        wmclass = type(wmap) if isinstance(wmap, (ListWeightedMap, DictWeightedMap, ArrayWeightedMap)) \
+            else DictWeightedMap
+        reduced = Allocator({s: original.sources.instances[s] * len(members) for s, members in self.sources.items()},
+                            wmclass(nodes),
+                            {t: original.targets.capacities[t] * len(members) for t, members in self.targets.items()})
+        # weights were already converted, and leaving a slot unallocated must cost as much as in
+        # the original problem, which can allocate the same weights more times than the reduced map holds
+        reduced.weight_scale = original.weight_scale
+        reduced.limit_denominator = original.limit_denominator
+        for t in self.targets:
+            reduced.sources.wmap.set_weight({'from': None, 'to': t, 'weight': wmap[None, t]})
+        for s in self.sources:
+            reduced.sources.wmap.set_weight({'from': s, 'to': None, 'weight': wmap[s, None]})
+        reduced.source_sizes = {s: len(members) for s, members in self.sources.items() if len(members) > 1}
+        reduced.target_sizes = {t: len(members) for t, members in self.targets.items() if len(members) > 1}
+        return reduced
+
+    def expand(self, reduced: Allocation) -> Allocation:
+        '''Returns the allocation of the original problem matching `reduced`'''
+        # real units of each source class at each member of the target classes
+        units_at: Dict[SourceObject, Dict[TargetObject, int]] = {s: dict() for s in self.sources}
+        for t, targets in self.targets.items():
+            units = [s for s, count in reduced.at(t).items() if s is not None for _ in range(count)]
+            for target, s in _deal(units, targets):
+                units_at[s][target] = units_at[s].get(target, 0) + 1
+
+        allocation = Allocation()
+        for s, members in self.sources.items():
+            units = [t for t, count in units_at[s].items() for _ in range(count)]
+            for member, t in _deal(units, members):
+                allocation.add(member, t)
+        instances = self.original.sources.instances
+        for members in self.sources.values():
+            for member in members:
+                allocation.add(member, None, instances[member] - sum(allocation.by_source.get(member, {}).values()))
+        capacities = self.original.targets.capacities
+        for targets in self.targets.values():
+            for target in targets:
+                allocation.add(None, target, capacities[target] - sum(allocation.at(target).values()))
+        allocation.add(None, None, len(allocation))
+        return allocation
+
+
+def reduce(allocator: Allocator) -> Optional[Reduction]:
+    '''Returns the Reduction of `allocator` merging its interchangeable sources and
+    targets, or None if there are none'''
+    wmap = allocator.sources.wmap
+    capacities = {t: k for t, k in allocator.targets.capacities.items() if t is not None}
+    rows: Dict[SourceObject, Dict[TargetObject, object]] = dict()
+    columns: Dict[TargetObject, Dict[SourceObject, object]] = {t: dict() for t in capacities}
+    for s, k in allocator.sources.instances.items():
+        if s is None:
+            continue
+        row = rows[s] = dict()
+        for stw in wmap[s]:
+            t = stw['to']
+            if t in capacities and t not in row:
+                row[t] = stw['weight']
+                columns[t][s] = stw['weight']
+
+    targets = _classes({t: (k, frozenset(columns[t].items())) for t, k in capacities.items()})
+    sources = _classes({s: (allocator.sources.instances[s], frozenset(row.items())) for s, row in rows.items()})
+    if len(targets) == len(capacities) and len(sources) == len(rows):
+        return None
+    return Reduction(allocator, sources, targets)
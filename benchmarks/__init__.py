@@ -0,0 +1,5 @@
+'''Scaling benchmarks for the allocation package.
+
+Run them with `python -m benchmarks run --out results.json` and compare
+two runs with `python -m benchmarks compare results.json baseline.json`.
+'''
@@ -0,0 +1,68 @@
+from argparse import ArgumentParser
+import sys
+
+from . import runner
+
+
+def _ints(text: str):
+    return [int(x) for x in text.split(',')]
+
+
+def _strs(text: str):
+    return text.split(',')
+
+
+def parse(argv=None):
+    parser = ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run a sweep and save its results as json')
+    run.add_argument('--out', required=True, help='json file for the results')
+    run.add_argument('--generators', type=_strs, default=['large_random', 'skewed', 'ring'],
+                     help='comma separated generators (large_random, skewed, high_capacity, ring)')
+    run.add_argument('--sources', type=_ints, default=[20, 40], help='comma separated numbers of sources')
+    run.add_argument('--targets', type=_ints, default=[25, 50], help='comma separated numbers of targets')
+    run.add_argument('--choices', type=_ints, default=[3, 5], help='comma separated choices per source')
+    run.add_argument('--limit-denominators', type=_ints, default=[0, 100],
+                     help='comma separated limit_denominator values, 0 for floats')
+    run.add_argument('--wmaps', type=_strs, default=list(runner.WEIGHTED_MAPS),
+                     help='comma separated weighted maps (list, dict, array)')
+    run.add_argument('--engines', type=_strs, default=list(runner.ENGINES), help='comma separated engines')
+    run.add_argument('--workers', type=_ints, default=[1],
+                     help='comma separated numbers of worker processes of the parallel engines, e.g. 1,2,4,8')
+    run.add_argument('--no-memory', action='store_true', help='do not measure the peak memory')
+
+    compare = commands.add_parser('compare', help='compare results against a baseline')
+    compare.add_argument('results', help='json file with the results')
+    compare.add_argument('baseline', help='json file with the baseline results')
+    compare.add_argument('--tolerance', type=float, default=0.2,
+                         help='relative slowdown allowed before reporting a regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse(argv)
+    if args.command == 'run':
+        cases = runner.sweep(args.generators, args.sources, args.targets, args.choices,
+                             args.limit_denominators, args.wmaps, args.engines, args.workers)
+        results = runner.run(cases, memory=not args.no_memory,
+                             progress=lambda r: print(f"{runner.describe(r)}: {r['seconds']:.3f}s, "
+                                                      f"{r['rotations']} rotations", file=sys.stderr))
+        runner.save(results, args.out)
+        for saved in runner.rotations_saved(results):
+            print(f"{runner.describe(saved['case'])}: {saved['reference_rotations']} -> {saved['rotations']} "
+                  f"rotations ({saved['saved']} saved)")
+        return 0
+
+    comparison = runner.compare(runner.load(args.results), runner.load(args.baseline), args.tolerance)
+    for c in comparison:
+        flags = ' REGRESSION' * c['regression'] + ' OBJECTIVE CHANGED' * c['objective_changed']
+        print(f"{runner.describe(c['case'])}: {c['baseline_seconds']:.3f}s -> {c['seconds']:.3f}s "
+              f"(x{c['ratio']:.2f}){flags}")
+    failed = [c for c in comparison if c['regression'] or c['objective_changed']]
+    print(f'{len(comparison)} compared, {len(failed)} regressions')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+'''Problem generators for the benchmarks.
+
+Each generator takes a weighted map class and returns an Allocator.
+'''
+import random
+from typing import Optional
+
+from allocation.allocating import Allocator
+
+
+def large_random(sources_number: int, targets_number: int, choices: int, limit_denominator: Optional[int],
+                 wmclass, seed: Optional[int] = None) -> Allocator:
+    '''Sources and targets with one instance each; every source has up to
+    `choices` random targets with uniform weights in [0, 1)'''
+    rnd = random.Random(seed)
+    sources = {str(s): 1 for s in range(sources_number)}
+    targets = {str(t): 1 for t in range(targets_number)}
+
+    wmap_list = []
+    for source in sources:
+        for t in sorted(set(rnd.choices(list(targets), k=choices))):
+            wmap_list.append({'from': source, 'to': t, 'weight': rnd.uniform(0, 1)})
+
+    return Allocator(sources, wmclass(wmap_list), targets, limit_denominator)
+
+
+def ring(size: int, wmclass, alternate: bool = False) -> Allocator:
+    '''Source n can go to targets n - 1, n and n + 1 (modulo `size`).
+    The weights are 1, 0, 1 or, if `alternate`, 2.5, 1 and 3 * (n % 2)'''
+    sources = {str(e): 1 for e in range(size)}
+    targets = {str(e): 1 for e in range(size)}
+    wmap_list = []
+    for e in range(size):
+        same, nxt, prev = (1, 3 * (e % 2), 2.5) if alternate else (0, 1, 1)
+        wmap_list.append({'from': str(e), 'to': str(e), 'weight': same})
+        wmap_list.append({'from': str(e), 'to': str((e + 1) % size), 'weight': nxt})
+        wmap_list.append({'from': str(e), 'to': str((e - 1) % size), 'weight': prev})
+
+    return Allocator(sources, wmclass(wmap_list), targets)
+
+
+def skewed(sources_number: int, targets_number: int, choices: int, limit_denominator: Optional[int],
+           wmclass, seed: Optional[int] = None, exponent: float = 1.5) -> Allocator:
+    '''Like `large_random`, but the capacity of target k is proportional to 1 / (k + 1) ** exponent,
+    the instances of the sources are 1 to 3 and popular targets are chosen more often'''
+    rnd = random.Random(seed)
+    sources = {str(s): rnd.randint(1, 3) for s in range(sources_number)}
+    total = sum(sources.values())
+    shares = [1 / (k + 1) ** exponent for k in range(targets_number)]
+    targets = {str(t): max(1, round(total * share / sum(shares))) for t, share in enumerate(shares)}
+
+    wmap_list = []
+    for source in sources:
+        for t in sorted(set(rnd.choices(list(targets), weights=shares, k=choices))):
+            wmap_list.append({'from': source, 'to': t, 'weight': rnd.uniform(0, 1)})
+
+    return Allocator(sources, wmclass(wmap_list), targets, limit_denominator)
+
+
+def high_capacity(sources_number: int, targets_number: int, choices: int, limit_denominator: Optional[int],
+                  wmclass, seed: Optional[int] = None, instances: int = 50) -> Allocator:
+    '''Like `large_random`, but the sources have 1 to `instances` instances and the targets
+    share their total, so that few distinct pairs stand for many allocated slots'''
+    rnd = random.Random(seed)
+    sources = {str(s): rnd.randint(1, instances) for s in range(sources_number)}
+    capacity = -(-sum(sources.values()) // targets_number)
+    targets = {str(t): capacity for t in range(targets_number)}
+
+    wmap_list = []
+    for source in sources:
+        for t in sorted(set(rnd.choices(list(targets), k=choices))):
+            wmap_list.append({'from': source, 'to': t, 'weight': rnd.uniform(0, 1)})
+
+    return Allocator(sources, wmclass(wmap_list), targets, limit_denominator)
@@ -0,0 +1,167 @@
+'''Runs the benchmark sweeps and compares their results.
+
+Each run records the wall time, the number of rotations, the time per
+cycle search (the Floyd-Warshall pass of `get_first_cycle`), the time
+spent building the initial allocation, computing first differences and
+rotating, taken from the SolveStats of the solve, and the peak memory
+traced while solving.
+
+Engines running worker processes are swept over their numbers of workers,
+e.g. 1, 2, 4 and 8, to measure how they scale.
+'''
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import itertools
+import json
+import time
+import tracemalloc
+
+from allocation.allocating import Allocator, ArrayWeightedMap, DictWeightedMap, ListWeightedMap
+
+from . import generators
+
+
+WEIGHTED_MAPS = {'list': ListWeightedMap, 'dict': DictWeightedMap, 'array': ArrayWeightedMap}
+# benchmark engine names and their get_best arguments
+ENGINES = {
+    'cycles': {'engine': 'cycles'},
+    'most_negative': {'engine': 'cycles', 'policy': 'most_negative'},
+    'min_mean': {'engine': 'cycles', 'policy': 'min_mean'},
+    'spfa': {'engine': 'cycles', 'cycle_finder': 'spfa'},
+    'blocked': {'engine': 'cycles', 'cycle_finder': 'blocked_floyd_warshall'},
+    'greedy': {'engine': 'cycles', 'init': 'greedy'},
+    'regret': {'engine': 'cycles', 'init': 'regret'},
+    'ssp': {'engine': 'ssp'},
+}
+# engines taking a number of worker processes
+PARALLEL_ENGINES = ('blocked',)
+
+# fields identifying a run, used to match a run with its baseline
+KEY = ('generator', 'sources', 'targets', 'choices', 'limit_denominator', 'wmap', 'engine', 'workers')
+
+
+def build(case: dict) -> Allocator:
+    wmclass = WEIGHTED_MAPS[case['wmap']]
+    if case['generator'] == 'ring':
+        return generators.ring(case['sources'], wmclass, alternate=case.get('alternate', False))
+    generator = getattr(generators, case['generator'])
+    kwargs = {'instances': case['instances']} if 'instances' in case else {}
+    return generator(case['sources'], case['targets'], case['choices'], case['limit_denominator'],
+                     wmclass, seed=case.get('seed', 0), **kwargs)
+
+
+def run_case(case: dict, memory: bool = True) -> dict:
+    '''Solves `case` and returns it together with its measures.
+    With `memory`, the case is solved a second time under tracemalloc,
+    which is too slow to be timed, to get the peak memory.
+    '''
+    kwargs: dict = dict(ENGINES[case['engine']])
+    if 'workers' in case:
+        kwargs['workers'] = case['workers']
+    allocator = build(case)
+    start = time.perf_counter()
+    allocation, stats = allocator.get_best(return_stats=True, **kwargs)
+    seconds = time.perf_counter() - start
+
+    result = dict(case)
+    # the cycles engine searches once more than it rotates, the ssp one does not search cycles
+    searches = stats.iterations + 1 if ENGINES[case['engine']]['engine'] == 'cycles' else 0
+    result.update(seconds=seconds,
+                  rotations=stats.iterations,
+                  cycle_searches=searches,
+                  seconds_per_cycle_search=stats.seconds['cycle_search'] / searches if searches else None,
+                  first_differences_seconds=stats.seconds['first_differences'],
+                  rotate_seconds=stats.seconds['rotate'],
+                  init_seconds=stats.seconds['init'],
+                  objective=float(allocator.objective(allocation)),
+                  allocated=len(allocation))
+
+    if memory:
+        allocator = build(case)
+        tracemalloc.start()
+        try:
+            allocator.get_best(**kwargs)
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def sweep(generators_: Iterable[str] = ('large_random', 'skewed', 'ring'),
+          sources: Iterable[int] = (20, 40), targets: Iterable[int] = (25, 50),
+          choices: Iterable[int] = (3, 5), limit_denominators: Iterable[int] = (0, 100),
+          wmaps: Iterable[str] = ('list', 'dict', 'array'), engines: Iterable[str] = tuple(ENGINES),
+          workers: Iterable[int] = (1,)) -> Iterator[dict]:
+    '''Yields the cases of the cartesian product of the parameters.
+    Ring cases only depend on the number of sources, and only the
+    PARALLEL_ENGINES are run with each number of workers.'''
+    sources, targets, choices, limit_denominators, workers = map(
+        list, (sources, targets, choices, limit_denominators, workers))
+    for generator, wmap, engine in itertools.product(generators_, wmaps, engines):
+        runs = [{'workers': w} for w in workers] if engine in PARALLEL_ENGINES else [{}]
+        if generator == 'ring':
+            for size, alternate, extra in itertools.product(sources, (False, True), runs):
+                yield {'generator': 'ring', 'sources': size, 'targets': size, 'choices': 3,
+                       'limit_denominator': 0, 'wmap': wmap, 'engine': engine, 'alternate': alternate, **extra}
+            continue
+        for s, t, c, ld, extra in itertools.product(sources, targets, choices, limit_denominators, runs):
+            yield {'generator': generator, 'sources': s, 'targets': t, 'choices': c,
+                   'limit_denominator': ld, 'wmap': wmap, 'engine': engine, 'seed': 0, **extra}
+
+
+def run(cases: Iterable[dict], memory: bool = True, progress=None) -> List[dict]:
+    results = []
+    for case in cases:
+        results.append(run_case(case, memory))
+        if progress:
+            progress(results[-1])
+    return results
+
+
+def save(results: List[dict], path) -> None:
+    with open(path, 'w') as outfile:
+        json.dump({'results': results}, outfile, indent=1)
+
+
+def load(path) -> List[dict]:
+    with open(path) as infile:
+        return json.load(infile)['results']
+
+
+def _key(result: dict) -> Tuple:
+    return tuple(result.get(k) for k in KEY) + (result.get('alternate'),)
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float = 0.2) -> List[dict]:
+    '''Returns, for each result with a baseline, the ratio of their times, whether it is a
+    regression (slower by more than `tolerance`) and whether the objectives differ'''
+    baselines: Dict[Tuple, dict] = {_key(b): b for b in baseline}
+    comparison = []
+    for result in results:
+        base: Optional[dict] = baselines.get(_key(result))
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        comparison.append({'case': {k: result[k] for k in KEY + ('alternate',) if k in result},
+                           'seconds': result['seconds'], 'baseline_seconds': base['seconds'],
+                           'ratio': ratio, 'regression': ratio > 1 + tolerance,
+                           'objective_changed': abs(result['objective'] - base['objective']) > 1e-9})
+    return comparison
+
+
+def describe(result: dict) -> str:
+    return ' '.join(f'{k}={result[k]}' for k in KEY + ('alternate',) if k in result)
+
+
+def rotations_saved(results: List[dict], reference: str = 'cycles') -> List[dict]:
+    '''Returns, for each result of an engine starting from an initial allocation, the
+    rotations of the `reference` engine on the same case and how many it saved'''
+    references = {_key(dict(r, engine=None)): r for r in results if r['engine'] == reference}
+    saved = []
+    for result in results:
+        ref = references.get(_key(dict(result, engine=None)))
+        if ref is None or 'init' not in ENGINES.get(result['engine'], {}):
+            continue
+        saved.append({'case': {k: result[k] for k in KEY + ('alternate',) if k in result},
+                      'rotations': result['rotations'], 'reference_rotations': ref['rotations'],
+                      'saved': ref['rotations'] - result['rotations']})
+    return saved
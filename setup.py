@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
+from setuptools import setup
 
 setup(name='allocation',
       version='0.11',
@@ -8,4 +8,5 @@ setup(name='allocation',
       author='Matías Graña',
       author_email='matias.alejo@gmail.com',
       py_modules=['allocation'],
+      python_requires='>=3.8',
       )
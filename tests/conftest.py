@@ -0,0 +1,79 @@
+'''Problem factories and checks shared by the test modules, as fixtures.'''
+import pytest
+
+import random
+from collections import Counter
+
+from allocation import allocating
+
+
+def _random_problem(seed, wmclass, sources_number=8, targets_number=9, choices=3, **kwargs):
+    random.seed(seed)
+    sources = {str(s): random.randint(0, 3) for s in range(sources_number)}
+    targets = {str(t): random.randint(0, 3) for t in range(targets_number)}
+    wmap_list = []
+    for source in sources:
+        for t in set(random.choices(list(targets), k=choices)):
+            wmap_list.append({'from': source, 'to': t,
+                              'weight': random.choice([random.uniform(0, 1), random.randint(0, 3)])})
+    return allocating.Allocator(sources, wmclass(wmap_list), targets, limit_denominator=100, **kwargs)
+
+
+def _dense_problem(seed, weight_scale=None):
+    random.seed(seed)
+    sources = {str(s): random.randint(0, 3) for s in range(random.randint(1, 8))}
+    targets = {'t' + str(t): random.randint(0, 3) for t in range(random.randint(1, 8))}
+    wmap_list = [{'from': s, 'to': t, 'weight': random.choice([random.uniform(0, 1), random.randint(0, 3)])}
+                 for s in sources for t in targets]
+    return allocating.Allocator(sources, allocating.DictWeightedMap(wmap_list), targets,
+                                limit_denominator=100, weight_scale=weight_scale)
+
+
+def _symmetric_problem(seed, wmclass=allocating.DictWeightedMap, **kwargs):
+    '''Copies of a few source and target types, each copy with the same weights'''
+    random.seed(seed)
+    target_types = {f't{t}': (random.randint(1, 4), random.randint(1, 3)) for t in range(random.randint(1, 5))}
+    source_types = {f's{s}': (random.randint(1, 4), random.randint(1, 3)) for s in range(random.randint(1, 5))}
+    weights = {(s, t): random.choice([random.uniform(0, 1), random.randint(0, 3)])
+               for s in source_types for t in target_types if random.random() < 0.7}
+    targets = {f'{t}.{i}': capacity for t, (copies, capacity) in target_types.items() for i in range(copies)}
+    sources = {f'{s}.{i}': instances for s, (copies, instances) in source_types.items() for i in range(copies)}
+    wmap_list = [{'from': s, 'to': t, 'weight': weights[s.split('.')[0], t.split('.')[0]]}
+                 for s in sources for t in targets if (s.split('.')[0], t.split('.')[0]) in weights]
+    return allocating.Allocator(sources, wmclass(wmap_list), targets, **kwargs)
+
+
+def _check_feasible(allocator, allocation):
+    '''Checks that `allocation` uses every instance and capacity of `allocator` exactly,
+    each real (source, target) pair at most once'''
+    for s, k in allocator.sources.instances.items():
+        if s is not None:
+            assert sum(allocation.by_source.get(s, Counter()).values()) == k
+    for t, k in allocator.targets.capacities.items():
+        if t is not None:
+            assert sum(allocation.at(t).values()) == k
+    assert all(count == 1 for s, t, count in allocation.pairs() if s is not None and t is not None)
+    assert allocation.count(None, None) == len(allocation)
+
+
+@pytest.fixture
+def random_problem():
+    '''Returns a factory of problems with random sources, targets and a few weights per source'''
+    return _random_problem
+
+
+@pytest.fixture
+def dense_problem():
+    '''Returns a factory of small problems with a weight for every (source, target) pair'''
+    return _dense_problem
+
+
+@pytest.fixture
+def symmetric_problem():
+    '''Returns a factory of problems with interchangeable sources and targets'''
+    return _symmetric_problem
+
+
+@pytest.fixture
+def check_feasible():
+    return _check_feasible
@@ -0,0 +1,47 @@
+import pytest
+
+from allocation import allocating
+
+
+def test_optimal_without_limits(random_problem):
+    allocator = random_problem(0, allocating.DictWeightedMap)
+    _, stats = allocator.get_best(return_stats=True)
+    assert stats.optimal
+    assert stats.stopped == 'optimal'
+
+
+@pytest.mark.parametrize('max_iterations', [0, 1, 3])
+def test_max_iterations(max_iterations, random_problem, check_feasible):
+    allocator = random_problem(4, allocating.DictWeightedMap, sources_number=15, targets_number=15)
+    optimal = allocator.get_best()
+    assert allocator.stats.iterations > 3
+
+    allocation, stats = allocator.get_best(max_iterations=max_iterations, return_stats=True)
+    assert stats.iterations == max_iterations
+    assert not stats.optimal and stats.stopped == 'max_iterations'
+    assert stats.objective == allocator.objective(allocation)
+    assert len(allocation) <= len(optimal)
+    check_feasible(allocator, allocation)
+
+
+def test_zero_deadline(random_problem):
+    allocator = random_problem(5, allocating.ListWeightedMap)
+    allocation, stats = allocator.get_best(deadline=0, return_stats=True)
+    assert stats.stopped == 'deadline'
+    assert stats.iterations == 0
+    assert allocation == allocator.init_allocation()
+
+
+def test_deadline_keeps_the_best_allocation(random_problem, check_feasible):
+    allocator = random_problem(6, allocating.ArrayWeightedMap, sources_number=60, targets_number=60, choices=5)
+    allocation, stats = allocator.get_best(deadline=0.05, return_stats=True)
+    assert stats.stopped in ('deadline', 'optimal')
+    assert stats.objective == allocator.objective(allocation)
+    check_feasible(allocator, allocation)
+
+
+def test_min_improvement(random_problem):
+    allocator = random_problem(7, allocating.DictWeightedMap, sources_number=15, targets_number=15)
+    _, stats = allocator.get_best(min_improvement=float('inf'), return_stats=True)
+    assert stats.iterations == 1
+    assert stats.stopped == 'min_improvement'
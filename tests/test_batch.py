@@ -0,0 +1,61 @@
+from pathlib import Path
+import shutil
+import time
+import pytest
+import yaml
+
+from allocation.batch import exit_status, find_problems, solve_files, summary, time_limit, SolveTimeout
+
+
+@pytest.fixture
+def problems_dir(tmp_path):
+    example = Path(__file__).parent / 'example.yml'
+    for name in ('first', 'second', 'third'):
+        shutil.copy(example, tmp_path / f'{name}.yml')
+    (tmp_path / 'broken.yml').write_text('sources: [')
+    yield tmp_path
+
+
+def test_find_problems(problems_dir):
+    assert len(find_problems(str(problems_dir))) == 4
+    assert [p.name for p in find_problems(str(problems_dir / 's*.yml'))] == ['second.yml']
+
+
+def test_solve_files(problems_dir, tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp('out')
+    reports = solve_files(find_problems(str(problems_dir)), jobs=2, timeout=10, out_dir=out_dir)
+
+    statuses = {Path(r['problem']).stem: r['status'] for r in reports}
+    assert statuses == {'broken': 'error', 'first': 'ok', 'second': 'ok', 'third': 'ok'}
+    with open(out_dir / 'first.allocation.yml') as result:
+        assert sorted(yaml.safe_load(result)['allocation']) == [['a', 0], ['a', 1], ['b', 0]]
+    assert '3 solved, 1 failed' in summary(reports)
+    assert exit_status(reports) == 1
+    assert exit_status([r for r in reports if r['status'] == 'ok']) == 0
+
+
+def test_time_limit():
+    with pytest.raises(SolveTimeout):
+        with time_limit(0.1):
+            time.sleep(1)
+
+
+def test_solve_saved_problems(problems_dir):
+    from allocation.main import load_yaml
+    from allocation.storage import save_problem
+
+    allocator = load_yaml(problems_dir / 'first.yml')
+    save_problem(problems_dir / 'saved', allocator.sources.instances, allocator.sources.wmap,
+                 allocator.targets.capacities)
+    reports = solve_files(find_problems(str(problems_dir)), jobs=1, timeout=10)
+
+    assert {Path(r['problem']).name: r['status'] for r in reports}['saved'] == 'ok'
+    with open(problems_dir / 'saved.allocation.yml') as result:
+        assert sorted(yaml.safe_load(result)['allocation']) == [['a', 0], ['a', 1], ['b', 0]]
+
+
+def test_results_are_not_problems(problems_dir):
+    solve_files(find_problems(str(problems_dir)), jobs=1, timeout=10)
+    assert (problems_dir / 'first.allocation.yml').is_file()
+    assert len(find_problems(str(problems_dir))) == 4
+    assert [p.name for p in find_problems(str(problems_dir / 'f*.yml'))] == ['first.yml']
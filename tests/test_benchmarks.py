@@ -0,0 +1,47 @@
+import json
+
+from benchmarks import runner
+from benchmarks.__main__ import main
+
+
+def test_run_case_measures():
+    case = {'generator': 'ring', 'sources': 6, 'targets': 6, 'choices': 3, 'limit_denominator': 0,
+            'wmap': 'dict', 'engine': 'cycles', 'alternate': True}
+    result = runner.run_case(case)
+    assert result['rotations'] > 0
+    assert result['cycle_searches'] == result['rotations'] + 1
+    assert result['peak_memory'] > 0
+    assert result['objective'] == 6
+
+
+def test_sweep_covers_the_parameters():
+    cases = list(runner.sweep(('large_random', 'ring'), sources=(5,), targets=(6, 7), choices=(2,),
+                              limit_denominators=(0, 10), wmaps=('list', 'array'), engines=('cycles',)))
+    assert len([c for c in cases if c['generator'] == 'large_random']) == 2 * 2 * 2
+    assert len([c for c in cases if c['generator'] == 'ring']) == 2 * 2
+
+    cases = list(runner.sweep(('skewed',), sources=(5,), targets=(6,), choices=(2,), limit_denominators=(0,),
+                              wmaps=('list',), engines=('cycles', 'blocked'), workers=(1, 2, 4)))
+    assert [c.get('workers') for c in cases] == [None, 1, 2, 4]
+
+
+def test_run_and_compare(tmp_path, capsys):
+    out = str(tmp_path / 'results.json')
+    assert main(['run', '--out', out, '--generators', 'skewed', '--sources', '8', '--targets', '5',
+                 '--choices', '2', '--limit-denominators', '0', '--no-memory']) == 0
+    results = runner.load(out)
+    assert len(results) == len(runner.WEIGHTED_MAPS) * len(runner.ENGINES)
+    assert len({round(r['objective'], 9) for r in results}) == 1
+
+    assert 'saved' in capsys.readouterr().out
+    saved = runner.rotations_saved(results)
+    assert {s['case']['engine'] for s in saved} == {'greedy', 'regret'}
+    assert all(s['saved'] == s['reference_rotations'] - s['rotations'] for s in saved)
+
+    assert main(['compare', out, out]) == 0
+    for r in results:
+        r['seconds'] *= 2
+    with open(tmp_path / 'slower.json', 'w') as outfile:
+        json.dump({'results': results}, outfile)
+    assert main(['compare', str(tmp_path / 'slower.json'), out]) == 1
+    assert f'{len(results)} regressions' in capsys.readouterr().out
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from allocation import allocating, blocked
+from benchmarks.generators import large_random, skewed
+
+
+def floyd_warshall(diff):
+    dist = diff.copy()
+    for m in range(len(dist)):
+        dist = np.minimum(dist, dist[:, m, None] + dist[None, m, :])
+    return dist
+
+
+@pytest.mark.parametrize('size,block_size', [(7, 3), (50, 16), (70, 32)])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_blocked_distances(size, block_size, workers):
+    rnd = np.random.default_rng(size)
+    diff = rnd.uniform(0, 1, (size, size))
+    diff[rnd.uniform(size=(size, size)) < 0.7] = np.inf
+    np.fill_diagonal(diff, np.inf)
+    expected = floyd_warshall(diff)
+    with blocked.BlockedFloydWarshall(workers, block_size) as finder:
+        finder.load(diff)
+        for _ in finder.rounds():
+            pass
+        assert np.array_equal(np.isinf(finder.diff), np.isinf(expected))
+        finite = np.isfinite(expected)
+        assert np.allclose(finder.diff[finite], expected[finite])
+
+
+def test_search_returns_a_negative_cycle():
+    diff = np.full((5, 5), np.inf)
+    for i, j, w in ((0, 1, 1.), (1, 2, -3.), (2, 0, 1.), (3, 4, 2.), (4, 3, 2.)):
+        diff[i, j] = w
+    with blocked.BlockedFloydWarshall(1, 2) as finder:
+        cycle = finder.search(diff)
+        assert sorted(cycle) == [0, 1, 2]
+        diff[1, 2] = 0.
+        assert finder.search(diff) is None
+
+
+def test_bellman_ford_cycle():
+    diff = np.full((6, 6), np.inf)
+    for i, j, w in ((0, 1, 1.), (1, 2, 0.), (2, 1, 0.), (2, 3, 1.), (3, 4, -3.), (4, 2, 1.), (5, 0, 1.)):
+        diff[i, j] = w
+    assert sorted(blocked.bellman_ford_cycle(diff, 5)) == [2, 3, 4]
+    diff[3, 4] = -2.
+    assert blocked.bellman_ford_cycle(diff, 5) == []
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('generator', [large_random, skewed])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_blocked_and_floyd_warshall_have_same_weight(monkeypatch, seed, generator, workers):
+    monkeypatch.setattr(blocked, 'BLOCK_SIZE', 8)
+    a = generator(20, 30, 4, 0, allocating.DictWeightedMap, seed=seed)
+    expected = a.get_best()
+    b = generator(20, 30, 4, 0, allocating.DictWeightedMap, seed=seed)
+    allocation = b.get_best(cycle_finder='blocked_floyd_warshall', workers=workers)
+    assert len(allocation) == len(expected)
+    assert b.objective(allocation) == pytest.approx(a.objective(expected))
+    assert b._blocked is None
+
+
+def test_blocked_search_always_finds_the_cycle(monkeypatch):
+    monkeypatch.setattr(blocked, 'BLOCK_SIZE', 8)
+    found = []
+    search = blocked.BlockedFloydWarshall.search
+
+    def recorded(self, *args, **kwargs):
+        found.append(search(self, *args, **kwargs))
+        return found[-1]
+    monkeypatch.setattr(blocked.BlockedFloydWarshall, 'search', recorded)
+    for seed in range(4):
+        skewed(20, 30, 4, 0, allocating.DictWeightedMap, seed=seed).get_best(
+            cycle_finder='blocked_floyd_warshall', workers=2)
+    assert found and [] not in found
+
+
+def test_single_worker_uses_floyd_warshall(monkeypatch):
+    monkeypatch.setattr(blocked, 'BLOCK_SIZE', 8)
+    monkeypatch.setattr(blocked.BlockedFloydWarshall, 'search', None)
+    allocator = skewed(20, 30, 4, 0, allocating.DictWeightedMap, seed=0)
+    expected = skewed(20, 30, 4, 0, allocating.DictWeightedMap, seed=0).get_best()
+    allocation = allocator.get_best(cycle_finder='blocked_floyd_warshall', workers=1)
+    assert allocator.objective(allocation) == pytest.approx(allocator.objective(expected))
+
+
+def test_blocked_exact_weights_use_floyd_warshall():
+    a = large_random(10, 12, 3, 100, allocating.DictWeightedMap, seed=1)
+    expected = a.get_best()
+    b = large_random(10, 12, 3, 100, allocating.DictWeightedMap, seed=1)
+    assert b.objective(b.get_best(cycle_finder='blocked_floyd_warshall', workers=1)) == a.objective(expected)
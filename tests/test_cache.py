@@ -0,0 +1,104 @@
+from pathlib import Path
+import os
+import random
+import shutil
+
+from allocation import allocating
+from allocation.batch import find_problems, solve_files, summary
+from allocation.cache import ResultCache, default_directory, problem_key
+from allocation.cli import parse
+from allocation.main import result_cache
+
+
+def shuffled_problem(random_problem, seed, order, **kwargs):
+    allocator = random_problem(seed, allocating.ListWeightedMap)
+    instances = {s: k for s, k in allocator.sources.instances.items() if s is not None}
+    capacities = {t: k for t, k in allocator.targets.capacities.items() if t is not None}
+    nodes = [stw for stw in allocator.sources.wmap if stw['from'] is not None and stw['to'] is not None]
+    rnd = random.Random(order)
+    rnd.shuffle(nodes)
+    sources = dict(rnd.sample(list(instances.items()), len(instances)))
+    targets = dict(rnd.sample(list(capacities.items()), len(capacities)))
+    return allocating.Allocator(sources, allocating.ListWeightedMap(nodes), targets, **kwargs)
+
+
+def test_problem_key_does_not_depend_on_order(random_problem):
+    keys = {problem_key(shuffled_problem(random_problem, 1, order)) for order in range(5)}
+    assert len(keys) == 1
+    assert problem_key(shuffled_problem(random_problem, 2, 0)) not in keys
+    assert problem_key(shuffled_problem(random_problem, 1, 0, limit_denominator=10)) not in keys
+
+    allocator = shuffled_problem(random_problem, 1, 0)
+    stw = next(iter(allocator.sources.wmap))
+    stw['weight'] += 1
+    assert problem_key(allocator) not in keys
+
+
+def test_hits_and_misses(tmp_path, random_problem):
+    cache = ResultCache(tmp_path)
+    expected = random_problem(3, allocating.DictWeightedMap).get_best()
+    allocation = cache.get_best(random_problem(3, allocating.DictWeightedMap))
+    assert allocation == expected
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    allocator = random_problem(3, allocating.ListWeightedMap)
+    assert cache.get_best(allocator) == expected
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert allocator.stats.stopped == 'cached' and allocator.stats.objective == allocator.objective(expected)
+    assert str(cache) == 'cache: 1 hits, 1 misses'
+
+    # stopped solves are not cached
+    cache.get_best(random_problem(4, allocating.DictWeightedMap), max_iterations=0)
+    cache.get_best(random_problem(4, allocating.DictWeightedMap), max_iterations=0)
+    assert cache.misses == 3
+
+
+def test_hits_are_verified(tmp_path, random_problem):
+    cache = ResultCache(tmp_path)
+    allocator = random_problem(3, allocating.DictWeightedMap)
+    expected = cache.get_best(allocator)
+    key = problem_key(allocator)
+    _, potentials = cache.get(key)
+    cache.put(key, allocator.init_allocation(), potentials)
+
+    assert cache.get_best(random_problem(3, allocating.DictWeightedMap), trust=True) != expected
+    assert cache.get_best(random_problem(3, allocating.DictWeightedMap)) == expected
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.get(key)[0] == expected
+
+
+def test_least_recently_used_are_evicted(tmp_path, random_problem):
+    cache = ResultCache(tmp_path)
+    for seed in range(3):
+        cache.get_best(random_problem(seed, allocating.DictWeightedMap))
+    paths = {seed: tmp_path / f'{problem_key(random_problem(seed, allocating.DictWeightedMap))}.pickle'
+             for seed in range(3)}
+    for age, seed in enumerate((1, 0, 2)):
+        os.utime(paths[seed], (1000 + age, 1000 + age))
+    cache.get_best(random_problem(1, allocating.DictWeightedMap))
+    assert cache.hits == 1
+
+    cache.max_bytes = paths[1].stat().st_size + paths[2].stat().st_size
+    assert cache.evict() == 1
+    assert not paths[0].exists() and paths[1].exists() and paths[2].exists()
+
+
+def test_batch_uses_the_cache(tmp_path_factory):
+    problems = tmp_path_factory.mktemp('problems')
+    for name in ('first', 'second'):
+        shutil.copy(Path(__file__).parent / 'example.yml', problems / f'{name}.yml')
+    cache_dir, out_dir = tmp_path_factory.mktemp('cache'), tmp_path_factory.mktemp('out')
+
+    reports = solve_files(find_problems(str(problems)), jobs=1, out_dir=out_dir, cache_dir=cache_dir)
+    assert sorted(r['cache'] for r in reports) == ['hit', 'miss']
+    reports = solve_files(find_problems(str(problems)), jobs=1, out_dir=out_dir, cache_dir=cache_dir)
+    assert [r['cache'] for r in reports] == ['hit', 'hit']
+    assert 'cache: 2 hits, 0 misses' in summary(reports)
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_cache_is_opt_in(tmp_path):
+    assert result_cache(parse(['-a', 'problem.yml'])) is None
+    assert result_cache(parse(['-a', 'problem.yml', '--cache'])).directory == default_directory()
+    cache = result_cache(parse(['-a', 'problem.yml', '--cache-dir', str(tmp_path), '--cache-size', '1']))
+    assert cache.directory == tmp_path and cache.max_bytes == 2 ** 20
@@ -0,0 +1,52 @@
+import pytest
+
+from allocation import allocating
+from allocation.certificate import verify, violations
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('kwargs', [{}, {'engine': 'ssp'}, {'cycle_finder': 'spfa', 'prune': 1}])
+def test_optimal_allocations_are_verified(seed, kwargs, random_problem):
+    allocator = random_problem(seed, allocating.DictWeightedMap)
+    allocation, potentials = allocator.get_best(return_potentials=True, **kwargs)
+    assert list(violations(allocator, allocation, potentials)) == []
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_float_and_merged_allocations_are_verified(seed, symmetric_problem):
+    allocator = symmetric_problem(seed, allocating.ArrayWeightedMap)
+    allocation, stats, potentials = allocator.get_best(return_stats=True, return_potentials=True, symmetry=True,
+                                                       cycle_finder='spfa')
+    assert stats.optimal
+    assert verify(allocator, allocation, potentials)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_stopped_allocations_are_not_verified(seed, dense_problem):
+    allocator = dense_problem(seed)
+    expected = allocator.get_best()
+    allocation, stats = allocator.get_best(max_iterations=1, return_stats=True)
+    optimal = len(allocation) == len(expected) and allocator.objective(allocation) == allocator.objective(expected)
+    assert verify(allocator, allocation, allocator.potentials(allocation)) == optimal
+
+
+def test_infeasible_allocations_are_not_verified():
+    allocator = allocating.Allocator({'a': 1, 'b': 1}, allocating.DictWeightedMap([
+        {'from': 'a', 'to': 0, 'weight': 0}, {'from': 'a', 'to': 1, 'weight': 5},
+        {'from': 'b', 'to': 0, 'weight': 1}, {'from': 'b', 'to': 1, 'weight': 2}]), {0: 1, 1: 1})
+    allocation, potentials = allocator.get_best(return_potentials=True)
+    assert verify(allocator, allocation, potentials)
+
+    swapped = allocating.Allocation([('a', 1), ('b', 0), (None, None), (None, None)])
+    assert not verify(allocator, swapped, potentials)
+    assert [v for v in violations(allocator, swapped, potentials) if 'reduced cost' in v]
+
+    allocation.move('a', 0, 1)
+    assert [v for v in violations(allocator, allocation, potentials) if 'slots' in v]
+    assert not verify(allocator, allocation, {})
+
+
+def test_tolerance(symmetric_problem):
+    assert symmetric_problem(1, limit_denominator=100).tolerance() == 0
+    assert symmetric_problem(1, weight_scale='auto', limit_denominator=100).tolerance() == 0
+    assert 0 < symmetric_problem(1).tolerance() < 1e-6
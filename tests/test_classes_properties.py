@@ -1,8 +1,70 @@
 import pytest
 
-from allocation.allocating import Allocation
+from allocation.allocating import Allocation, Allocator, DictWeightedMap, DifferenceGraph
 
 
 def test_Allocation():
     allocation = Allocation([('a', '1'), ('b', '2'), (None, '3'), ('c', None)])
     assert len(allocation) == 2
+
+
+def test_Allocation_counts():
+    allocation = Allocation([('a', '1'), ('a', None), ('a', None), (None, '1')])
+    assert allocation.count('a', None) == 2
+    assert allocation.at('1') == {'a': 1, None: 1}
+    assert sorted(allocation, key=str) == [('a', '1'), ('a', None), ('a', None), (None, '1')]
+
+    allocation.move('a', None, '2')
+    assert allocation.count('a', None) == 1
+    assert allocation['a'] == {'1', '2', None}
+    assert len(allocation) == 2
+
+    allocation.move('a', None, '3')
+    assert allocation['a'] == {'1', '2', '3'}
+    assert ('a', None) not in allocation
+    with pytest.raises(ValueError):
+        allocation.move('a', None, '4')
+
+
+def test_Allocation_pairs():
+    allocation = Allocation([('a', '1'), ('a', '1'), ('a', None), (None, None)])
+    assert sorted(allocation.pairs(), key=str) == [('a', '1', 2), ('a', None, 1), (None, None, 1)]
+    assert allocation.count('b', '1') == 0
+    assert allocation.at('2') == {}
+
+
+def test_init_allocation_counts():
+    allocator = Allocator({'a': 3, 'b': 1}, DictWeightedMap([{'from': 'a', 'to': '1', 'weight': 1}]), {'1': 5000})
+    allocation = allocator.init_allocation()
+    assert allocation.at(None) == {'a': 3, 'b': 1}
+    assert allocation.at('1') == {None: 5000}
+    assert sum(1 for _ in allocation.pairs()) == 3
+
+
+def test_Allocation_equality():
+    assert Allocation([('a', '1'), ('b', '2')]) == Allocation([('b', '2'), ('a', '1')])
+    assert Allocation([('a', '1'), ('a', '1')]) != Allocation([('a', '1')])
+
+
+def test_DifferenceGraph():
+    graph = DifferenceGraph(['a', 'b', None])
+    graph.update('a', 'b', 's', 2)
+    graph.update('a', 'b', 'r', 1)
+    graph.to_hub('b', 5)
+    graph.from_hub('a', 5)
+    graph.from_hub(None, -1)
+
+    assert graph.edges[0] == {1: (1, 'r')}
+    assert graph.path([0, 1, graph.hub]) == [{'object': None, 'to': 'a'}, {'object': 'r', 'to': 'b'}]
+    matrix = graph.to_matrix()
+    assert matrix.diff[1, 0] == 0 and matrix.diff[1, 2] == -6
+    assert matrix.objects[1, 0] is None
+
+    graph.clear({'a'})
+    assert graph.edges[0] == {}
+
+
+def test_parents_cycles():
+    assert Allocator._parents_cycles([-1, 0, 1]) == []
+    # edges 1 -> 2 -> 3 -> 1 and 4 <-> 5
+    assert Allocator._parents_cycles([-1, 3, 1, 2, 5, 4]) == [[2, 3, 1], [5, 4]]
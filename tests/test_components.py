@@ -0,0 +1,90 @@
+import pytest
+
+import random
+
+from pathlib import Path
+
+from allocation import allocating
+from allocation.certificate import verify
+from allocation.cli import parse
+from allocation.components import split, solve_by_components
+from allocation.main import load_yaml, main
+
+
+def two_markets(wmclass=allocating.DictWeightedMap):
+    random.seed(4321)
+    sources = {}
+    targets = {'isolated': 2}
+    wmap_list = []
+    for market in 'ab':
+        for s in range(6):
+            sources[f'{market}{s}'] = random.randint(1, 2)
+        for t in range(5):
+            targets[f'{market}{t}'] = random.randint(1, 2)
+        for s in range(6):
+            for t in random.sample(range(5), 3):
+                wmap_list.append({'from': f'{market}{s}', 'to': f'{market}{t}',
+                                  'weight': random.randint(0, 9)})
+    sources['lonely'] = 1
+    return allocating.Allocator(sources, wmclass(wmap_list), targets)
+
+
+def test_split():
+    components, isolated = split(two_markets())
+    assert len(components) == 2
+    assert {s[0] for sources, _, _ in components for s in sources} == {'a', 'b'}
+    assert isolated.count('lonely', None) == 1
+    assert isolated.count(None, 'isolated') == 2
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_solve_by_components(max_workers):
+    expected_allocator = two_markets()
+    expected = expected_allocator.get_best()
+    allocator = two_markets()
+    allocation = solve_by_components(allocator, max_workers=max_workers)
+
+    assert len(allocation) == len(expected)
+    assert allocator.objective(allocation) == expected_allocator.objective(expected)
+    assert allocation.count(None, None) == len(allocation)
+    for s, k in allocator.sources.instances.items():
+        if s is not None:
+            assert sum(allocation.by_source[s].values()) == k
+
+
+def test_solve_by_components_returns_stats_and_potentials():
+    expected_allocator = two_markets()
+    expected_allocator.get_best()
+    allocator = two_markets()
+    allocation, stats, potentials = solve_by_components(allocator, max_workers=1, return_stats=True,
+                                                        return_potentials=True)
+
+    assert stats is allocator.stats and stats.optimal and stats.stopped == 'optimal'
+    assert stats.objective == allocator.objective(allocation) == expected_allocator.stats.objective
+    assert len(stats.objectives) == stats.iterations + 1
+    assert verify(allocator, allocation, potentials)
+
+
+def test_solve_by_components_keeps_the_conversion():
+    def allocator(**kwargs):
+        return allocating.Allocator({'a': 1, 'b': 1, 'c': 1},
+                                    allocating.DictWeightedMap([{'from': 'a', 'to': 0, 'weight': 0.5},
+                                                                {'from': 'a', 'to': 1, 'weight': 0.25},
+                                                                {'from': 'b', 'to': 0, 'weight': 0.125},
+                                                                {'from': 'c', 'to': 2, 'weight': 1 / 3}]),
+                                    {0: 1, 1: 1, 2: 1}, **kwargs)
+
+    for kwargs in [dict(weight_scale='auto'), dict(limit_denominator=10, weight_scale=10)]:
+        expected_allocator = allocator(**kwargs)
+        expected = expected_allocator.objective(expected_allocator.get_best())
+        components_allocator = allocator(**kwargs)
+        allocation, stats = solve_by_components(components_allocator, max_workers=1, return_stats=True)
+        assert components_allocator.objective(allocation) == stats.objective == expected
+
+
+def test_components_option():
+    example = str(Path(__file__).parent / 'example.yml')
+    expected_allocator = load_yaml(example)
+    expected = expected_allocator.objective(expected_allocator.get_best())
+    allocation = main(parse(['-a', example, '--components', '-j', '1']))
+    assert expected_allocator.objective(allocation) == expected
@@ -0,0 +1,143 @@
+import pytest
+
+from allocation import allocating
+from benchmarks.generators import high_capacity
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('wmclass', [allocating.ListWeightedMap, allocating.DictWeightedMap,
+                                     allocating.ArrayWeightedMap])
+def test_ssp_and_cycles_have_same_weight(seed, wmclass, random_problem):
+    cycles_allocator = random_problem(seed, wmclass)
+    cycles = cycles_allocator.get_best(engine='cycles')
+    ssp_allocator = random_problem(seed, wmclass)
+    ssp = ssp_allocator.get_best(engine='ssp')
+
+    assert len(cycles) == len(ssp)
+    assert cycles_allocator.sources.get_weight(cycles) == ssp_allocator.sources.get_weight(ssp)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('engine', ['cycles', 'ssp'])
+def test_integer_weights_have_same_objective(seed, engine, random_problem):
+    fractions_allocator = random_problem(seed, allocating.DictWeightedMap)
+    expected = fractions_allocator.objective(fractions_allocator.get_best(engine=engine))
+    integer_allocator = random_problem(seed, allocating.DictWeightedMap, weight_scale='auto')
+    assert integer_allocator.objective(integer_allocator.get_best(engine=engine)) == expected
+
+
+def test_ssp_small_case():
+    wmap = allocating.ListWeightedMap([
+            {'from': 'a', 'to': 0, 'weight': 1},
+            {'from': 'a', 'to': 1, 'weight': 0},
+            {'from': 'b', 'to': 0, 'weight': 2}
+            ])
+    allocation = allocating.Allocator({'a': 2, 'b': 1}, wmap, {0: 3, 1: 1}).get_best(engine='ssp')
+    assert allocation['a'] == {0, 1}
+    assert allocation['b'] == {0}
+    assert allocation[None] == {0, None}
+
+
+def test_unknown_engine(random_problem):
+    allocator = random_problem(0, allocating.ListWeightedMap)
+    with pytest.raises(ValueError):
+        allocator.get_best(engine='simplex')
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('wmclass', [allocating.ListWeightedMap, allocating.ArrayWeightedMap])
+@pytest.mark.parametrize('weight_scale', [None, 'auto'])
+def test_spfa_and_floyd_warshall_have_same_weight(seed, wmclass, weight_scale, random_problem):
+    floyd_warshall = random_problem(seed, wmclass, weight_scale=weight_scale)
+    expected = floyd_warshall.get_best()
+    spfa = random_problem(seed, wmclass, weight_scale=weight_scale)
+    allocation = spfa.get_best(cycle_finder='spfa')
+
+    assert len(allocation) == len(expected)
+    assert spfa.objective(allocation) == floyd_warshall.objective(expected)
+    assert spfa.stats.optimal
+
+
+def test_spfa_float_weights(random_problem):
+    def problem():
+        return random_problem(11, allocating.DictWeightedMap, sources_number=30, targets_number=30)
+    expected = problem()
+    allocator = problem()
+    allocator.sources.wmap.apply(float)
+    expected.sources.wmap.apply(float)
+    assert allocator.objective(allocator.get_best(cycle_finder='spfa')) == \
+        pytest.approx(expected.objective(expected.get_best()))
+
+
+def test_unknown_cycle_finder(random_problem):
+    with pytest.raises(ValueError):
+        random_problem(0, allocating.DictWeightedMap).get_best(cycle_finder='dijkstra')
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('cycle_finder', ['floyd_warshall', 'spfa'])
+@pytest.mark.parametrize('policy', ['most_negative', 'min_mean'])
+def test_policies_have_same_weight(seed, cycle_finder, policy, random_problem):
+    first = random_problem(seed, allocating.DictWeightedMap)
+    expected = first.get_best()
+    allocator = random_problem(seed, allocating.DictWeightedMap)
+    allocation = allocator.get_best(cycle_finder=cycle_finder, policy=policy)
+
+    assert len(allocation) == len(expected)
+    assert allocator.objective(allocation) == first.objective(expected)
+    assert all(d < 0 for d in allocator.stats.diffs)
+
+
+def test_min_mean_cycle(random_problem):
+    allocator = random_problem(0, allocating.DictWeightedMap)
+    differences = allocating.DifferenceMatrix(['a', 'b', 'c'])
+    for (i, j), d in {(0, 1): 1, (1, 0): -3, (1, 2): -2, (2, 1): 1}.items():
+        differences.diff[i, j] = d
+        differences.objects[i, j] = f'{i}{j}'
+    # a <-> b has mean -1, b <-> c has mean -1 / 2
+    assert allocator._min_mean_cycle(differences)['diff'] == -2
+    assert allocator._floyd_warshall(differences, most_negative=True)['diff'] == -2
+
+
+def test_unknown_policy(random_problem):
+    with pytest.raises(ValueError):
+        random_problem(0, allocating.DictWeightedMap).get_best(policy='last')
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('cycle_finder', ['floyd_warshall', 'spfa'])
+def test_high_capacity_has_same_weight(seed, cycle_finder):
+    cycles_allocator = high_capacity(12, 4, 2, 100, allocating.DictWeightedMap, seed=seed, instances=30)
+    cycles = cycles_allocator.get_best(cycle_finder=cycle_finder)
+    ssp_allocator = high_capacity(12, 4, 2, 100, allocating.DictWeightedMap, seed=seed, instances=30)
+    ssp = ssp_allocator.get_best(engine='ssp')
+
+    assert len(cycles) == len(ssp)
+    assert cycles_allocator.objective(cycles) == ssp_allocator.objective(ssp)
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('cycle_finder', ['floyd_warshall', 'spfa'])
+@pytest.mark.parametrize('prune', [1, 2])
+def test_pruned_solve_has_same_weight(seed, cycle_finder, prune, dense_problem):
+    full = dense_problem(seed)
+    expected = full.get_best(cycle_finder=cycle_finder)
+    pruned = dense_problem(seed, weight_scale='auto' if seed % 2 else None)
+    allocation, stats = pruned.get_best(cycle_finder=cycle_finder, prune=prune, return_stats=True)
+
+    assert len(allocation) == len(expected)
+    assert pruned.objective(allocation) == full.objective(expected)
+    assert stats.optimal and stats.restored <= stats.pruned
+
+
+def test_pruned_targets_are_restored():
+    # the cheapest target of both sources is 0, so one of them needs its second target
+    allocator = allocating.Allocator({'a': 1, 'b': 1}, allocating.DictWeightedMap([
+        {'from': 'a', 'to': 0, 'weight': 0}, {'from': 'a', 'to': 1, 'weight': 5},
+        {'from': 'b', 'to': 0, 'weight': 1}, {'from': 'b', 'to': 1, 'weight': 2}]), {0: 1, 1: 1})
+    allocation, stats = allocator.get_best(prune=1, return_stats=True)
+    assert allocation == allocating.Allocation([('a', 0), ('b', 1), (None, None), (None, None)])
+    assert stats.pruned == 2 and stats.restored >= 1
+
+    with pytest.raises(ValueError):
+        allocator.get_best(prune=0)
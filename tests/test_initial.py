@@ -0,0 +1,55 @@
+import pytest
+
+from allocation import allocating, initial
+from benchmarks.generators import skewed
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('init', ['greedy', 'regret'])
+def test_initial_allocation_is_feasible(seed, init, random_problem, check_feasible):
+    allocator = random_problem(seed, allocating.DictWeightedMap)
+    check_feasible(allocator, getattr(initial, init)(allocator))
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('init', ['greedy', 'regret'])
+@pytest.mark.parametrize('cycle_finder', ['floyd_warshall', 'spfa'])
+def test_initial_allocation_has_same_weight(seed, init, cycle_finder, dense_problem):
+    expected = dense_problem(seed)
+    allocator = dense_problem(seed)
+    allocation = allocator.get_best(init=init, cycle_finder=cycle_finder)
+    assert len(allocation) == len(expected.get_best())
+    assert allocator.objective(allocation) == expected.objective(expected.get_best())
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('init', ['empty', 'greedy', 'regret'])
+@pytest.mark.parametrize('prune', [1, 2])
+def test_initial_allocation_with_pruning(seed, init, prune, dense_problem, check_feasible):
+    # the initial allocations may use targets which pruning leaves out
+    expected = dense_problem(seed)
+    allocator = dense_problem(seed)
+    allocation = allocator.get_best(init=init, prune=prune)
+    check_feasible(allocator, allocation)
+    assert allocator.objective(allocation) == expected.objective(expected.get_best())
+
+
+def test_regret():
+    # greedy gives 0 to a, which leaves b with 10; b has more to lose
+    wmap = allocating.DictWeightedMap([{'from': 'a', 'to': 0, 'weight': 1}, {'from': 'a', 'to': 1, 'weight': 2},
+                                       {'from': 'b', 'to': 0, 'weight': 1.5}, {'from': 'b', 'to': 1, 'weight': 10}])
+    allocator = allocating.Allocator({'a': 1, 'b': 1}, wmap, {0: 1, 1: 1})
+    assert allocator.objective(initial.greedy(allocator)) == 11
+    assert allocator.objective(initial.regret(allocator)) == 3.5
+
+
+def test_initial_allocation_saves_rotations():
+    _, empty = skewed(40, 25, 5, 0, allocating.DictWeightedMap, seed=0).get_best(return_stats=True)
+    for init in ('greedy', 'regret'):
+        allocator = skewed(40, 25, 5, 0, allocating.DictWeightedMap, seed=0)
+        allocation, stats = allocator.get_best(init=init, return_stats=True)
+        assert stats.iterations < empty.iterations
+        assert stats.objective == pytest.approx(empty.objective)
+
+    with pytest.raises(ValueError):
+        allocator.get_best(init='full')
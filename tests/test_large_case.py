@@ -19,7 +19,7 @@ WeightedMap: n --> n   (weight 1)
 '''
 
 
-weighted_map_classes = [allocating.ListWeightedMap, allocating.DictWeightedMap]
+weighted_map_classes = [allocating.ListWeightedMap, allocating.DictWeightedMap, allocating.ArrayWeightedMap]
 
 @pytest.fixture(params=weighted_map_classes)
 def large_one_to_one(request):
@@ -63,3 +63,8 @@ def test_finishes_alternate(large_one_to_one_alternate):
     for e in large_one_to_one_alternate.sources.collection:
         if e is not None:
             assert allocation[e] == {str(e)}
+
+
+def test_incremental_is_the_same_as_full_rebuild(large_one_to_one_alternate):
+    allocation = large_one_to_one_alternate.get_best(incremental=True)
+    assert allocation == large_one_to_one_alternate.get_best(incremental=False)
@@ -38,7 +38,8 @@ else:
 
 
 @pytest.mark.parametrize('sources_number,targets_number,choices,limit_denominator,expected_time', testdata)
-@pytest.mark.parametrize('wmclass', [allocating.ListWeightedMap, allocating.DictWeightedMap])
+@pytest.mark.parametrize('wmclass', [allocating.ListWeightedMap, allocating.DictWeightedMap,
+                                     allocating.ArrayWeightedMap])
 def test_finishes_random(sources_number, targets_number, choices, limit_denominator, expected_time, wmclass):
     random.seed(1234)
     allocator = large_random(sources_number, targets_number, choices, limit_denominator, wmclass)
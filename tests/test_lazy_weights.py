@@ -0,0 +1,79 @@
+import pytest
+
+from allocation import allocating
+from allocation.allocating import Allocator, DictWeightedMap, LazyWeightedMap
+
+
+def lazy_copy(wmap, maxsize=None, total=None):
+    '''Returns a LazyWeightedMap with the weights of `wmap` and the weight calls it makes'''
+    calls = []
+    sources = set(wmap.get_sources())
+
+    def weight(source, target):
+        calls.append((source, target))
+        return wmap[source, target]
+    return LazyWeightedMap(sources, lambda s: [stw['to'] for stw in wmap[s]], weight, maxsize, total), calls
+
+
+def test_weights_are_computed_once():
+    lazy, calls = lazy_copy(DictWeightedMap([{'from': 'a', 'to': '1', 'weight': 2},
+                                             {'from': 'a', 'to': '2', 'weight': 3}]))
+    assert lazy['a', '1'] == 2
+    assert lazy['a', '1'] == 2
+    assert lazy['a', '3'] is None
+    assert sorted(stw['weight'] for stw in lazy['a']) == [2, 3]
+    assert calls == [('a', '1'), ('a', '2')]
+    assert (lazy.hits, lazy.misses) == (2, 2)
+
+
+def test_bounded_cache():
+    lazy, calls = lazy_copy(DictWeightedMap([{'from': 'a', 'to': t, 'weight': 1} for t in '123']), maxsize=2)
+    for t in '1231':
+        lazy['a', t]
+    assert len(lazy.cache) == 2
+    assert calls == [('a', '1'), ('a', '2'), ('a', '3'), ('a', '1')]
+
+
+@pytest.mark.parametrize('maxsize', [None, 50])
+def test_solve_computes_each_weight_once(maxsize):
+    n = 40
+    wmap = DictWeightedMap([{'from': f's{s}', 'to': t, 'weight': (7 * s + 3 * t) % 100 + 1}
+                            for s in range(n) for t in range(n)])
+    lazy, calls = lazy_copy(wmap, maxsize, total=100 * n * n)
+    allocator = Allocator({f's{s}': 1 for s in range(n)}, lazy, {t: 1 for t in range(n)})
+    expected = Allocator({f's{s}': 1 for s in range(n)}, wmap, {t: 1 for t in range(n)})
+    assert allocator.objective(allocator.get_best()) == expected.objective(expected.get_best())
+    if maxsize is None:
+        assert len(calls) == n * n
+    else:
+        # evicted weights are computed again when the rows are read, after the pass over the weights
+        assert len(calls) < 2.5 * n * n
+
+
+def test_total_is_converted():
+    lazy, calls = lazy_copy(DictWeightedMap([{'from': 'a', 'to': '1', 'weight': 2}]), total=2.5)
+    Allocator({'a': 1}, lazy, {'1': 1}, weight_scale=10)
+    assert lazy.total == 25 and lazy[None, '1'] == 26 and not calls
+
+
+def test_sentinels_and_changes():
+    lazy, _ = lazy_copy(DictWeightedMap([{'from': 'a', 'to': '1', 'weight': 2}]))
+    allocator = Allocator({'a': 1}, lazy, {'1': 1, '2': 1}, weight_scale=10)
+    assert lazy.total_weight() == 20 + 3 * 21 - 1
+    assert lazy[None, '2'] == 21 and lazy.get_sources() == {'a', None}
+    assert allocator.objective(allocator.get_best()) == 2
+
+    lazy.set_weight({'from': 'a', 'to': '1', 'weight': 5})
+    lazy.remove_weight('a', None)
+    assert lazy['a', '1'] == 5
+    assert [stw['to'] for stw in lazy['a']] == ['1']
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('maxsize', [None, 5])
+def test_lazy_map_has_same_weight(seed, maxsize, random_problem):
+    expected = random_problem(seed, allocating.DictWeightedMap)
+    lazy = random_problem(seed, lambda nodes: lazy_copy(allocating.DictWeightedMap(nodes), maxsize)[0])
+
+    assert lazy.objective(lazy.get_best()) == expected.objective(expected.get_best())
+    assert lazy.sources.wmap.hits + lazy.sources.wmap.misses > 0
@@ -10,3 +10,71 @@ def test_load_yaml():
     allocation = allocator.get_best()
     assert allocation['a'] == {0, 1}
     assert allocation['b'] == {0}
+
+
+def test_load_yaml_weights():
+    path = Path(__file__).parent / 'example.yml'
+    allocator = load_yaml(path)
+    wmap = allocator.sources.wmap
+    assert wmap[('a', 0)] == 2
+    assert wmap[('b', 0)] == 1
+    assert allocator.sources.instances['a'] == 2
+    assert allocator.targets.capacities[1] == 1
+
+
+def test_load_yaml_quoted_and_flow_style(tmp_path):
+    path = tmp_path / 'problem.yml'
+    path.write_text('weights: [[a, "0", 0.5], [b, "0", 0.1]]\n'
+                    'sources: {a: 1, b: 1}\n'
+                    'targets: {"0": 1}\n')
+    allocator = load_yaml(path)
+    assert allocator.sources.wmap[('b', '0')] == 0.1
+    allocation = allocator.get_best()
+    assert allocation['b'] == {'0'}
+
+
+def test_load_yaml_anchors_and_aliases(tmp_path):
+    path = tmp_path / 'problem.yml'
+    path.write_text('sources: &sources {a: &two 2, b: 1}\n'
+                    'targets:\n'
+                    '  <<: {1: 1, 2: 5}\n'
+                    '  0: *two\n'
+                    '  2: 1\n'
+                    'copy: *sources\n'
+                    'weights:\n'
+                    '  - &a0 [a, 0, *two]\n'
+                    '  - [a, 1, 3]\n'
+                    '  - [b, 0, 1]\n'
+                    '  - [b, 2, 1]\n')
+    allocator = load_yaml(path)
+    assert allocator.sources.instances['a'] == 2
+    assert {t: k for t, k in allocator.targets.capacities.items() if t is not None} == {0: 2, 1: 1, 2: 1}
+    assert allocator.sources.wmap[('a', 0)] == 2
+
+    path.write_text('sources: {a: 1}\n'
+                    'targets: {0: 1}\n'
+                    'all: &weights [[a, 0, 4]]\n'
+                    'weights: *weights\n')
+    assert load_yaml(path).sources.wmap[('a', 0)] == 4
+
+
+@pytest.mark.parametrize('text', ['- sources\n- targets\n', 'just text\n', ''])
+def test_load_yaml_needs_a_mapping(tmp_path, text):
+    path = tmp_path / 'problem.yml'
+    path.write_text(text)
+    with pytest.raises(ValueError, match='must hold a mapping'):
+        load_yaml(path)
+
+
+@pytest.mark.parametrize('suffix,delimiter', [('.csv', ','), ('.tsv', '\t')])
+def test_load_weights_from_edge_list(tmp_path, suffix, delimiter):
+    weights = tmp_path / f'weights{suffix}'
+    weights.write_text('\n'.join(delimiter.join(row) for row in [
+        ('source', 'target', 'weight'), ('a', '0', '2'), ('a', '1', '1'), ('b', '0', '1.5')]))
+    allocator = load_yaml(Path(__file__).parent / 'example.yml', weights=weights)
+    wmap = allocator.sources.wmap
+    assert wmap[('a', 0)] == 2
+    assert wmap[('b', 0)] == 1.5
+    allocation = allocator.get_best()
+    assert allocation['a'] == {0, 1}
+    assert allocation['b'] == {0}
@@ -51,6 +51,37 @@ def get_allocation(queue, allocator):
     queue.put(allocation)
 
 
+def floating_point_weights():
+    return ListWeightedMap([
+        {'from': s, 'to': t, 'weight': w}
+        for s in 'abc'
+        for t, w in (('1', 1/14), ('2', 2/7), ('3', 0.5))
+    ])
+
+
+@pytest.mark.parametrize('weight_scale', [10**6, 'auto'])
+def test_real_case_floating_point_integer_weights(weight_scale):
+    # same as below, but solved in integer arithmetic
+    weights = floating_point_weights()
+    sources = {'a': 1, 'b': 1, 'c': 1}
+    targets = {'1': 1, '2': 1, '3': 1}
+
+    allocator = Allocator(sources, weights, targets, weight_scale=weight_scale)
+    assert all(isinstance(w['weight'], int) for w in weights)
+
+    queue = Queue()
+    process = Process(target=get_allocation, args=(queue, allocator))
+    process.start()
+    process.join(3)
+    if process.is_alive():
+        process.terminate()
+        raise AssertionError('computation did not finish in time')
+
+    allocation = queue.get()
+    assert len(allocation) == 3
+    assert float(allocator.objective(allocation)) == pytest.approx(1/14 + 2/7 + 0.5)
+
+
 def test_real_case_floating_point():
     # In this test, if limit_denominator is not set, the method
     # allocator.get_best does not finish. This is because of the following
@@ -0,0 +1,81 @@
+import pytest
+
+import random
+
+from allocation import allocating
+
+
+def random_input(seed):
+    random.seed(seed)
+    sources = {str(s): random.randint(1, 2) for s in range(8)}
+    targets = {str(t): random.randint(1, 2) for t in range(9)}
+    weights = {}
+    for source in sources:
+        for t in random.sample(list(targets), 3):
+            weights[source, t] = random.randint(0, 20) / 7
+    return sources, weights, targets
+
+
+def build(sources, weights, targets, wmclass):
+    wmap = wmclass([{'from': s, 'to': t, 'weight': w} for (s, t), w in weights.items()])
+    return allocating.Allocator(dict(sources), wmap, dict(targets), limit_denominator=100)
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('wmclass', [allocating.ListWeightedMap, allocating.DictWeightedMap,
+                                     allocating.ArrayWeightedMap])
+def test_reoptimize_is_optimal(seed, wmclass):
+    sources, weights, targets = random_input(seed)
+    allocator = build(sources, weights, targets, wmclass)
+    previous = allocator.get_best()
+
+    changed = random.sample(sorted(weights), 3)
+    removed = [pair for pair in previous if None not in pair][0]
+    changes = {
+        'weights': [{'from': s, 'to': t, 'weight': random.randint(0, 20) / 7} for s, t in changed] +
+                   [{'from': 'new', 'to': '0', 'weight': 0}, {'from': '1', 'to': 'new', 'weight': 0.5}],
+        'removed_weights': [removed],
+        'sources': {'new': 1, '2': 0},
+        'targets': {'new': 2, '3': 3},
+    }
+    allocation = allocator.reoptimize(previous, changes)
+
+    for w in changes['weights']:
+        weights[w['from'], w['to']] = w['weight']
+    del weights[removed]
+    sources.update(changes['sources'])
+    targets.update(changes['targets'])
+    expected_allocator = build(sources, weights, targets, wmclass)
+    expected = expected_allocator.get_best()
+
+    assert len(allocation) == len(expected)
+    assert allocator.objective(allocation) == expected_allocator.objective(expected)
+    assert removed not in allocation
+    assert '2' not in allocation.by_source
+
+
+def test_reoptimize_removing_target():
+    weights = allocating.ListWeightedMap([
+        {'from': str(s), 'to': str(t), 'weight': abs(s - t)} for s in range(5) for t in range(5)])
+    allocator = allocating.Allocator({str(s): 1 for s in range(5)}, weights, {str(t): 1 for t in range(5)})
+    allocation = allocator.get_best()
+    assert len(allocation) == 5
+    assert allocator.objective(allocation) == 0
+
+    allocation = allocator.reoptimize(allocation, {'targets': {'4': 0}})
+    assert len(allocation) == 4
+    assert allocator.objective(allocation) == 0
+    assert allocation['4'] == {None}
+
+
+def test_reoptimize_lazy_weights_above_total():
+    weights = {('a', 0): 1, ('a', 1): 1, ('b', 1): 1}
+    lazy = allocating.LazyWeightedMap(['a', 'b'], lambda s: [t for u, t in weights if u == s],
+                                      lambda s, t: weights[s, t], total=3)
+    allocator = allocating.Allocator({'a': 1, 'b': 1}, lazy, {0: 1, 1: 1})
+    previous = allocator.get_best()
+
+    # the new weight is above the bound given for the computed ones
+    allocation = allocator.reoptimize(previous, {'weights': [{'from': 'b', 'to': 1, 'weight': 100}]})
+    assert sorted(pair for pair in allocation if None not in pair) == [('a', 0), ('b', 1)]
+    assert allocator.objective(allocation) == 101
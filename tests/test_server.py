@@ -0,0 +1,93 @@
+from pathlib import Path
+import asyncio
+import json
+
+import pytest
+
+from allocation import client
+from allocation.cli import parse
+from allocation.main import load_yaml
+from allocation.server import Server, percentiles
+
+EXAMPLE = Path(__file__).parent / 'example.yml'
+
+
+def run_server(tmp_path, requests, **kwargs):
+    '''Sends each list of `requests` on its own connection, with the blocking client
+    for single requests, and returns the answers and the final stats of the server'''
+    async def scenario():
+        server = Server(tmp_path / 'allocate.sock', workers=1, **kwargs)
+        await server.start()
+        loop = asyncio.get_running_loop()
+        try:
+            answers = []
+            for batch in requests:
+                if len(batch) == 1:
+                    answers.append([await loop.run_in_executor(None, client.request, server.path, batch[0], 30)])
+                    continue
+                reader, writer = await asyncio.open_unix_connection(str(server.path))
+                writer.write(b''.join(json.dumps(r).encode() + b'\n' for r in batch))
+                await writer.drain()
+                answers.append([json.loads(await reader.readline()) for _ in batch])
+                writer.close()
+            return answers, server.stats()
+        finally:
+            await server.close()
+    return asyncio.run(scenario())
+
+
+def test_solve_path_and_inline(tmp_path):
+    expected = load_yaml(EXAMPLE)
+    weight = float(expected.objective(expected.get_best()))
+    inline = {'sources': [['a', 2], ['b', 1]], 'targets': [[0, 2], [1, 1]],
+              'weights': [['a', 0, 1], ['a', 1, 2], ['b', 0, 1]]}
+    answers, stats = run_server(tmp_path, [
+        [{'op': 'solve', 'id': 1, 'path': str(EXAMPLE), 'options': {'init': 'greedy', 'deadline': 10}}],
+        [{'id': 'x', 'problem': inline}, {'op': 'stats'}, 'not an object', {'op': 'nope'}],
+    ])
+    answer = answers[0][0]
+    assert answer['status'] == 'ok' and answer['id'] == 1
+    assert answer['weight'] == weight
+    assert sorted(map(tuple, answer['allocation'])) == [('a', 0, 1), ('a', 1, 1), ('b', 0, 1)]
+    assert answer['stats']['optimal'] and answer['cache'] is None
+    assert set(answer['seconds']) == {'queue', 'solve', 'total'}
+
+    by_id = {a.get('id'): a for a in answers[1]}
+    assert by_id['x']['weight'] == 4
+    assert sorted(a['status'] for a in answers[1]) == ['error', 'error', 'ok', 'ok']
+    assert stats['answers'] == {'ok': 2, 'error': 2}
+    assert stats['waiting'] == stats['running'] == 0
+    assert set(stats['latency']) == {'p50', 'p90', 'p99', 'max'}
+
+
+def test_cache_busy_and_timeout(tmp_path):
+    request = {'path': str(EXAMPLE)}
+    answers, stats = run_server(tmp_path, [[request], [request]], cache_dir=tmp_path / 'cache')
+    assert [a[0]['cache'] for a in answers] == ['miss', 'hit']
+    assert stats['cache'] == {'hits': 1, 'misses': 1}
+
+    answers, stats = run_server(tmp_path, [[request] * 3], max_pending=1, timeout=1e-6)
+    assert sorted(a['status'] for a in answers[0]) == ['busy', 'busy', 'timeout']
+
+
+def test_malformed_requests_are_logged_in_one_line(tmp_path, caplog):
+    answers, stats = run_server(tmp_path, [[{'id': 1, 'options': {}}, {'id': 2, 'problem': {'sources': []}}]])
+    assert [a['status'] for a in answers[0]] == ['error', 'error']
+    errors = [r for r in caplog.records if r.levelname == 'ERROR']
+    assert len(errors) == 2 and not any(r.exc_info for r in errors)
+    assert all('\n' not in r.getMessage() for r in errors)
+
+
+def test_percentiles():
+    assert percentiles(range(1, 101)) == {'p50': 50, 'p90': 90, 'p99': 99, 'max': 100}
+    assert percentiles([3.]) == {'p50': 3., 'p90': 3., 'p99': 3., 'max': 3.}
+    assert percentiles([]) == {}
+
+
+def test_client_arguments(tmp_path):
+    args = parse(['-a', str(EXAMPLE), '--socket', str(tmp_path / 's'), '--deadline', '2', '--symmetry'])
+    message = client.solve_message(args)
+    assert message['path'] == str(EXAMPLE.resolve())
+    assert message['options']['deadline'] == 2 and message['options']['symmetry']
+    with pytest.raises(SystemExit):
+        parse(['--serve'])
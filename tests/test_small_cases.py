@@ -112,6 +112,42 @@ def test_wmap_iterator(small_allocator):
     assert any(ftw['from'] is None and ftw['to'] is None for ftw in wmap)
 
 
+@pytest.fixture(params=[allocating.ListWeightedMap, allocating.DictWeightedMap, allocating.ArrayWeightedMap])
+def small_wmap_any(request):
+    the_list = [
+            {'from': 'a', 'to': 0, 'weight': 1},
+            {'from': 'a', 'to': 1, 'weight': 0},
+            {'from': 'b', 'to': 0, 'weight': 2}
+            ]
+    yield request.param(the_list)
+
+
+def test_wmap_getitem_any(small_wmap_any):
+    assert {'from': 'a', 'to': 0, 'weight': 1} in small_wmap_any['a']
+    assert len(small_wmap_any['a']) == 2
+    assert small_wmap_any[('a', 1)] == 0
+    assert small_wmap_any[('b', 0)] == 2
+    assert small_wmap_any['c'] == []
+    assert small_wmap_any[('a', 2)] is None
+    assert small_wmap_any.total_weight() == 3
+    assert small_wmap_any.get_sources() == {'a', 'b'}
+    small_wmap_any.add_weight({'from': 'b', 'to': 0, 'weight': 4})
+    small_wmap_any.add_weight({'from': None, 'to': 1, 'weight': 5})
+    assert small_wmap_any[None] == [{'from': None, 'to': 1, 'weight': 5}]
+    small_wmap_any.apply(lambda w: 2 * w)
+    assert small_wmap_any[('a', 0)] == 2
+    assert small_wmap_any[(None, 1)] == 10
+
+
+def test_array_wmap_from_arrays():
+    wmap = allocating.ArrayWeightedMap.from_arrays(['b', 'a', 'a', 'a'], [0, 1, 0, 1], [2., 0., 1., 3.])
+    assert wmap[('a', 0)] == 1
+    # repeated pairs keep the first weight
+    assert wmap[('a', 1)] == 0
+    assert sorted(n['to'] for n in wmap['a']) == [0, 1]
+    assert wmap.total_weight() == 3
+
+
 def test_wmap_getitem(small_wmap):
     assert {'from': 'a', 'to': 0, 'weight': 1} in small_wmap['a']
     assert len(small_wmap['a']) == 2
@@ -143,6 +179,16 @@ def test_allocator_rotate(small_allocator):
     assert allocation['b'] == {None}
 
 
+def test_first_cycle_is_negative(small_allocator):
+    allocation = small_allocator.init_allocation()
+    cycle = small_allocator.get_first_cycle(allocation)
+    assert cycle['diff'] < 0
+    assert cycle['path'][-1]['to'] in allocation[cycle['path'][0]['object']]
+    small_allocator.rotate(allocation, cycle['path'])
+    assert small_allocator.sources.get_weight(allocation) == \
+        small_allocator.sources.get_weight(small_allocator.init_allocation()) + cycle['diff']
+
+
 def test_allocator(small_allocator):
     allocation = small_allocator.get_best()
     assert allocation['a'] == {0, 1}
@@ -0,0 +1,50 @@
+import logging
+
+import pytest
+
+from allocation import allocating
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('weight_scale', [None, 'auto'])
+def test_stats_objectives(seed, weight_scale, random_problem):
+    allocator = random_problem(seed, allocating.DictWeightedMap, weight_scale=weight_scale)
+    initial = allocator.objective(allocator.init_allocation())
+    allocation, stats = allocator.get_best(return_stats=True)
+
+    assert stats is allocator.stats
+    assert stats.objectives[0] == initial
+    assert stats.objective == allocator.objective(allocation)
+    assert stats.iterations == len(stats.diffs) == len(stats.cycle_lengths) == len(stats.objectives) - 1
+    assert all(d < 0 for d in stats.diffs)
+    assert all(k > 0 for k in stats.cycle_lengths)
+    assert set(stats.seconds) == {'init', 'first_differences', 'cycle_search', 'rotate'}
+
+
+def test_on_iteration(random_problem):
+    allocator = random_problem(3, allocating.ListWeightedMap)
+    seen = []
+
+    def on_iteration(allocation, stats):
+        seen.append((stats.iterations, allocator.objective(allocation), stats.objective))
+
+    allocator.get_best(on_iteration=on_iteration)
+    assert [i for i, _, _ in seen] == list(range(1, allocator.stats.iterations + 1))
+    assert all(objective == expected for _, objective, expected in seen)
+
+
+def test_ssp_stats(random_problem):
+    allocator = random_problem(1, allocating.DictWeightedMap)
+    allocation, stats = allocator.get_best(engine='ssp', return_stats=True)
+    assert stats.iterations == 0
+    assert stats.objective == allocator.objective(allocation)
+
+
+def test_trace_logging(caplog, random_problem):
+    allocator = random_problem(2, allocating.DictWeightedMap)
+    with caplog.at_level(logging.DEBUG, logger='allocation.allocating'):
+        allocator.get_best()
+    assert not any(r.message.startswith('middle') for r in caplog.records)
+    with caplog.at_level(allocating.TRACE, logger='allocation.allocating'):
+        allocator.get_best()
+    assert any(r.message.startswith('middle') for r in caplog.records)
@@ -0,0 +1,71 @@
+from pathlib import Path
+import pickle
+
+import numpy as np
+import pytest
+
+from allocation.allocating import Allocation, Allocator, ArrayWeightedMap, DictWeightedMap
+from allocation.main import load, load_yaml
+from allocation.storage import load_allocation, load_problem, save_allocation, save_problem
+
+
+EXAMPLE = Path(__file__).parent / 'example.yml'
+
+
+@pytest.fixture
+def saved_example(tmp_path):
+    allocator = load_yaml(EXAMPLE)
+    save_problem(tmp_path / 'example', allocator.sources.instances, allocator.sources.wmap,
+                 allocator.targets.capacities)
+    yield tmp_path / 'example'
+
+
+def test_problem_round_trip(saved_example):
+    allocator = load_yaml(EXAMPLE)
+    sources, wmap, targets = load_problem(saved_example)
+
+    assert sources == {s: k for s, k in allocator.sources.instances.items() if s is not None}
+    assert targets == {t: k for t, k in allocator.targets.capacities.items() if t is not None}
+    for s in sources:
+        for t in targets:
+            assert wmap[s, t] == allocator.sources.wmap[s, t]
+    assert isinstance(wmap.weights, np.memmap)
+
+
+def test_loaded_problem_has_the_same_allocation(saved_example):
+    allocator = load(saved_example)
+    expected = load_yaml(EXAMPLE)
+    assert allocator.objective(allocator.get_best()) == expected.objective(expected.get_best())
+
+
+def test_pickled_map_is_memory_mapped(saved_example):
+    _, wmap, _ = load_problem(saved_example)
+    _, copied, _ = load_problem(saved_example, mmap=False)
+    wmap.add_weight({'from': 'new', 'to': 'target', 'weight': 1})
+
+    unpickled = pickle.loads(pickle.dumps(wmap))
+    assert isinstance(unpickled.weights, np.memmap)
+    assert unpickled['new', 'target'] == 1
+    assert len(pickle.dumps(wmap)) < len(pickle.dumps(copied)) + len(pickle.dumps(wmap.extra))
+    assert not isinstance(pickle.loads(pickle.dumps(copied)).weights, np.memmap)
+
+
+def test_problem_weights_must_be_numbers(tmp_path):
+    wmap = DictWeightedMap([{'from': 'a', 'to': 0, 'weight': 'heavy'}])
+    with pytest.raises(ValueError):
+        save_problem(tmp_path / 'bad', {'a': 1}, wmap, {0: 1})
+
+
+def test_allocation_round_trip(tmp_path):
+    allocation = Allocation([('a', 0), ('a', 0), ('b', 1), (None, 1), ('b', None), (None, None)])
+    save_allocation(tmp_path / 'result', allocation)
+    assert load_allocation(tmp_path / 'result') == allocation
+
+
+def test_from_csr():
+    wmap = ArrayWeightedMap.from_csr(['a', 'b'], [0, 1], np.array([0, 2, 3]),
+                                     np.array([0, 1, 1]), np.array([1., 2., 3.]))
+    assert wmap['a', 1] == 2
+    assert wmap['b', 0] is None
+    allocator = Allocator({'a': 1, 'b': 1}, wmap, {0: 1, 1: 1})
+    assert allocator.objective(allocator.get_best()) == 4
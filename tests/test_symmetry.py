@@ -0,0 +1,50 @@
+import pytest
+
+from allocation import allocating, symmetry
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('engine,init', [('cycles', 'empty'), ('cycles', 'greedy'), ('ssp', 'empty')])
+def test_merged_solve_has_same_weight(seed, engine, init, symmetric_problem, check_feasible):
+    full = symmetric_problem(seed, limit_denominator=100)
+    expected = full.get_best(engine=engine, init=init)
+    merged = symmetric_problem(seed, limit_denominator=100)
+    allocation, stats = merged.get_best(engine=engine, init=init, symmetry=True, return_stats=True)
+
+    check_feasible(merged, allocation)
+    assert len(allocation) == len(expected)
+    assert merged.objective(allocation) == full.objective(expected)
+    assert stats.optimal
+
+
+@pytest.mark.parametrize('wmclass', [allocating.ListWeightedMap, allocating.ArrayWeightedMap])
+def test_merged_float_weights(wmclass, symmetric_problem, check_feasible):
+    full = symmetric_problem(3, wmclass)
+    expected = full.get_best()
+    merged = symmetric_problem(3, wmclass)
+    allocation = merged.get_best(symmetry=True, cycle_finder='spfa')
+    check_feasible(merged, allocation)
+    assert merged.objective(allocation) == pytest.approx(full.objective(expected))
+
+
+def test_reduce_merges_identical_rows_and_columns(check_feasible):
+    allocator = allocating.Allocator({'a': 2, 'b': 2, 'c': 1}, allocating.DictWeightedMap([
+        {'from': s, 'to': t, 'weight': 1} for s in 'abc' for t in (0, 1)]), {0: 3, 1: 3})
+    reduction = symmetry.reduce(allocator)
+    assert reduction.sources == {'a': ['a', 'b'], 'c': ['c']}
+    assert reduction.targets == {0: [0, 1]}
+    assert reduction.allocator.sources.instances == {'a': 4, 'c': 1, None: 6}
+    assert reduction.allocator.pair_limit('a', 0) == 4
+    assert reduction.allocator.pair_limit('c', 0) == 2
+
+    allocation, stats = allocator.get_best(symmetry=True, return_stats=True)
+    check_feasible(allocator, allocation)
+    assert len(allocation) == 5
+    assert (stats.merged_sources, stats.merged_targets) == (1, 1)
+
+
+def test_nothing_to_merge():
+    allocator = allocating.Allocator({'a': 1, 'b': 1}, allocating.DictWeightedMap([
+        {'from': 'a', 'to': 0, 'weight': 0}, {'from': 'b', 'to': 0, 'weight': 1}]), {0: 1})
+    assert symmetry.reduce(allocator) is None
+    assert len(allocator.get_best(symmetry=True)) == 1